@@ -0,0 +1,144 @@
+"""PACER command line
+Example usage:
+    $ pacer-cli usage --project "My Project" --days 7
+    $ pacer-cli migrate-blobs
+    $ pacer-cli bench-queries --projects 1000 --files 100
+    $ pacer-cli worker --workers 4
+    $ pacer-cli ingest "My Project" ~/courses/algorithms --dry-run
+"""
+
+import argparse
+import time
+from datetime import datetime as dt
+from datetime import timedelta, timezone
+from pathlib import Path
+
+
+def _print_table(rows: list[dict]) -> None:
+    if not rows:
+        print("(no records)")
+        return
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    print("  ".join("-" * widths[c] for c in columns))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(widths[c]) for c in columns))
+
+
+def usage_report(args: argparse.Namespace) -> None:
+    """LLM latency (p50/p95) per operation and token/cost totals"""
+    from pacer.llms import usage
+
+    since = dt.now(timezone.utc) - timedelta(days=args.days) if args.days else None
+    print("Latency per operation (seconds):")
+    _print_table(usage.latency_report(project_name=args.project, since=since))
+    print("\nTotals per project:")
+    _print_table(usage.project_totals(project_name=args.project))
+
+
+def migrate_blobs(args: argparse.Namespace) -> None:
+    """Move file payloads stored in the DB to the blob store"""
+    from pacer import services
+    from pacer.orm import base
+    from pacer.orm.blob_store import get_blob_store
+
+    before = base.DB_PATH.stat().st_size if base.DB_PATH.exists() else 0
+    moved = services.move_contents_to_blobs()
+    after = base.DB_PATH.stat().st_size if base.DB_PATH.exists() else 0
+    print(f"Moved {moved} files, DB: {before:,} -> {after:,} bytes")
+    print(f"Blob store: {get_blob_store().disk_usage():,} bytes")
+
+
+def bench_queries(args: argparse.Namespace) -> None:
+    """Query count and latency of the service calls on a scratch database"""
+    from pacer.tools import query_benchmark
+
+    _print_table(query_benchmark.run(args.projects, args.files, args.repeat))
+
+
+def run_worker(args: argparse.Namespace) -> None:
+    """Run background jobs (summaries, quizzes, notebooks) until interrupted"""
+    from pacer import services
+
+    services.JOBS.workers = args.workers
+    services.JOBS.start()
+    print(f"[worker] {services.JOBS.name}: {args.workers} workers, Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        services.JOBS.stop()
+
+
+def list_jobs(args: argparse.Namespace) -> None:
+    """Recent background jobs and their status"""
+    from pacer import services
+
+    columns = ("kind", "key", "status", "attempts", "progress", "message", "error")
+    jobs = services.JOBS.jobs(project_name=args.project, limit=args.limit)
+    _print_table([job.model_dump(include=set(columns)) for job in jobs])
+
+
+def ingest_files(args: argparse.Namespace) -> None:
+    """Ingest files and directories into a project (resumes an interrupted run)"""
+    from pacer.tools import ingest
+
+    stats = ingest.ingest(
+        args.project,
+        args.paths,
+        workers=args.workers,
+        batch_size=args.batch_size or ingest.BATCH_SIZE,
+        dry_run=args.dry_run,
+    )
+    if stats.failed:
+        print(f"{len(stats.failed)} files failed:", *stats.failed, sep="\n  ")
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="pacer-cli", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    usage_cmd = commands.add_parser("usage", help=usage_report.__doc__)
+    usage_cmd.add_argument("--project", help="Only this project")
+    usage_cmd.add_argument("--days", type=float, help="Only the last N days")
+    usage_cmd.set_defaults(func=usage_report)
+
+    blobs_cmd = commands.add_parser("migrate-blobs", help=migrate_blobs.__doc__)
+    blobs_cmd.set_defaults(func=migrate_blobs)
+
+    bench_cmd = commands.add_parser("bench-queries", help=bench_queries.__doc__)
+    bench_cmd.add_argument("--projects", type=int, default=1000)
+    bench_cmd.add_argument("--files", type=int, default=100, help="Per project")
+    bench_cmd.add_argument("--repeat", type=int, default=5)
+    bench_cmd.set_defaults(func=bench_queries)
+
+    worker_cmd = commands.add_parser("worker", help=run_worker.__doc__)
+    worker_cmd.add_argument("--workers", type=int, default=2)
+    worker_cmd.set_defaults(func=run_worker)
+
+    jobs_cmd = commands.add_parser("jobs", help=list_jobs.__doc__)
+    jobs_cmd.add_argument("--project", help="Only this project")
+    jobs_cmd.add_argument("--limit", type=int, default=20)
+    jobs_cmd.set_defaults(func=list_jobs)
+
+    ingest_cmd = commands.add_parser("ingest", help=ingest_files.__doc__)
+    ingest_cmd.add_argument("project")
+    ingest_cmd.add_argument("paths", nargs="+", type=Path)
+    ingest_cmd.add_argument("--workers", type=int, help="Parsing processes")
+    ingest_cmd.add_argument("--batch-size", type=int, help="Files per transaction")
+    ingest_cmd.add_argument(
+        "--dry-run", action="store_true", help="Only estimate the embedding cost"
+    )
+    ingest_cmd.set_defaults(func=ingest_files)
+
+    return parser
+
+
+def cli(argv: list[str] = None) -> None:
+    args = make_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -9,8 +10,27 @@ ENV = ROOT_DIR / ".env"
 assert ENV.exists(), f"Missing .env file: {ENV}"
 assert load_dotenv(ENV)
 
+CASSETTE_DIR = ROOT_DIR / ".cassettes"
+
+# Offline runs: PACER_REPLAY_MODE=record|replay|fake (see pacer.llms.replay)
+REPLAY_MODE = os.getenv("PACER_REPLAY_MODE")
+
 # DEFAULT_LLM = ChatOpenAI(model="gpt-4o")
-DEFAULT_EMBEDDING = OpenAIEmbeddings(model="text-embedding-3-large")
+if REPLAY_MODE:
+    from pacer.llms.replay import ReplayEmbeddings, ReplayMode
+
+    DEFAULT_EMBEDDING = ReplayEmbeddings(
+        mode=REPLAY_MODE,
+        cassette_path=CASSETTE_DIR / "embeddings.json",
+        inner=(
+            OpenAIEmbeddings(model="text-embedding-3-large")
+            if REPLAY_MODE == ReplayMode.RECORD
+            else None
+        ),
+        latency=float(os.getenv("PACER_FAKE_LATENCY", 0)),
+    )
+else:
+    DEFAULT_EMBEDDING = OpenAIEmbeddings(model="text-embedding-3-large")
 
 
 iframe = """
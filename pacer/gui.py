@@ -5,32 +5,47 @@ from typing import Any
 
 import streamlit as st
 from audio_recorder_streamlit import audio_recorder as st_audiorec
-from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from langchain.schema import AIMessage, SystemMessage
 
 from pacer import services
 from pacer.config import consts
+from pacer.llms import llm_cache, usage
+from pacer.llms.hedging import HEDGER
 from pacer.llms.llm_adapter import LLMSwitch
-from pacer.models.code_cell_model import JupyterCells
+from pacer.llms.scheduler import SCHEDULER
+from pacer.models.code_cell_model import Cell, CellType, JupyterCells
 from pacer.models.file_model import FileEntry
 from pacer.models.project_model import ProjectData
 from pacer.orm.file_orm import FileType
+from pacer.orm.job_orm import JobStatus
+from pacer.quiz.practice import Grade, Practice, question_key
 from pacer.tools.jupyter_handler import JupyterHandler
 from pacer.tools.streamlit_utils import confirm_popup
 
+FILES_PAGE_SIZE = 50
+CHAT_PAGE_SIZE = 20  # messages shown; older ones stay in the database
+JOB_POLL_SECONDS = 2
+USAGE_TTL_SECONDS = 10  # the sidebar's LLM usage totals
+
 st.set_page_config(layout="wide", page_icon=":material/school:", page_title="PACER")
 
+services.JOBS.start()  # resumes the jobs queued before a restart
+
 if "edit_toggles" not in st.session_state:
     st.session_state["edit_toggles"] = {}
 
-if "messages" not in st.session_state:
-    st.session_state.messages = defaultdict(list)
-
 if "audios" not in st.session_state:
     st.session_state.audios = defaultdict(set)
 
+if "practices" not in st.session_state:
+    st.session_state.practices = {}
+
 if "jupyter_handles" not in st.session_state:
     st.session_state.jupyter_handles = {}
 
+if "hedge" not in st.session_state:  # this session's "Hedge slow answers" toggle
+    st.session_state.hedge = bool(LLMSwitch.hedged_tasks)
+
 _edit_toggles = st.session_state["edit_toggles"]
 
 
@@ -40,9 +55,41 @@ def list_projects() -> list[str]:
 
 
 @st.cache_data
-def list_files(project: str) -> list[FileEntry]:
-    files = services.list_files(project)
-    return files
+def list_files(project: str, page: int = None) -> list[FileEntry]:
+    """All the project's files, or the `page`-th `FILES_PAGE_SIZE` of them"""
+    if page is None:
+        return services.list_files(project)
+    return services.list_files(
+        project, offset=page * FILES_PAGE_SIZE, limit=FILES_PAGE_SIZE
+    )
+
+
+@st.cache_data
+def count_files(project: str) -> int:
+    return services.count_files(project)
+
+
+@st.cache_data(ttl=USAGE_TTL_SECONDS)
+def usage_totals(project: str) -> list[dict]:
+    return usage.project_totals(project)
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def _job_progress(job_id: str):
+    """Progress of a background job, polled until it finished"""
+    job = services.get_job(job_id)
+    if job and job.active:
+        text = job.message or f"{job.kind.title()} job {job.status}.."
+        st.progress(job.progress or 0.0, text=text)
+        return
+    st.cache_data.clear()  # e.g. a summary was added to a listed file
+    st.rerun()
+
+
+def _job_failed(job) -> bool:
+    if failed := job is not None and job.status == JobStatus.FAILED:
+        st.warning(f"{job.kind.title()} failed: {job.error}")
+    return failed
 
 
 @st.fragment
@@ -87,19 +134,61 @@ def _render_notes(project: str):
                     st.rerun(scope="fragment")
 
 
+def _get_practice(project: str, quiz) -> Practice:
+    if project not in st.session_state.practices:
+        st.session_state.practices[project] = services.get_practice(project, quiz)
+    practice = st.session_state.practices[project]
+    questions = quiz.questions
+    version = (len(questions), questions[-1].question if questions else None)
+    if practice.version != version:  # more questions, or a new quiz
+        practice.sync([q.question for q in questions], version=version)
+    return practice
+
+
+def _drop_practice(project: str) -> None:
+    if practice := st.session_state.practices.pop(project, None):
+        practice.flush()
+
+
+def _review(practice: Practice, q, key: str) -> None:
+    correct = st.session_state[key] == q.answer
+    practice.review(question_key(q.question), Grade.GOOD if correct else Grade.AGAIN)
+    st.toast(":white_check_mark:" if correct else f":exclamation: Answer: {q.answer}")
+
+
 @st.fragment
 def _render_quiz(project: str):
-    if not (quiz := services.get_quiz(project)):
+    job, quiz = services.latest_job(f"quiz:{project}"), services.get_quiz(project)
+    if job and job.active:
+        _job_progress(job.id)  # the quiz, or more questions, are being written
+    elif not quiz:
+        _job_failed(job)
         if st.button(":arrows_counterclockwise:", key=f"{project}_add_quiz_button"):
-            with st.spinner("Adding Quiz.."):
-                quiz = services.create_quiz(project_name=project)
+            services.submit_quiz(project_name=project)
             st.rerun(scope="fragment")
     if quiz:
         friendly_mode = st.checkbox("Show Answers")
+        practice, questions = None, quiz.questions
+        if st.toggle("Practice (due only)", key=f"{project}_practice"):
+            # -1- Only the due slice, answers are reviews
+            practice = _get_practice(project, quiz)
+            by_question = {q.question: q for q in quiz.questions}
+            due = practice.due(n=10)
+            questions = [by_question[practice.question(s.key)] for s in due]
+            st.caption(f"{practice.count_due()} due of {len(practice.queue)}")
+            if not due:
+                st.success("Nothing due, come back later!")
+        else:
+            _drop_practice(project)  # saves its pending reviews
         choices = []
-        for i, q in enumerate(quiz.questions):
+        for i, q in enumerate(questions):
+            key, review = f"qestion_{i}", {}
+            if practice:
+                state = due[i]
+                key = f"practice_{state.key}_{state.attempts}"
+                review = dict(on_change=_review, args=(practice, q, key))
             if choice := st.radio(
-                f"**{q.question}**", q.options, index=None, key=f"qestion_{i}"
+                f"**{q.question}**", q.options, index=None, key=key, **review
             ):
                 if friendly_mode:
                     if choice == (ans := q.answer):
@@ -110,13 +199,16 @@ def _render_quiz(project: str):
         _c1, _c2, _c3 = st.columns(3)
         with _c1:
             if st.button("Make More"):
-                with st.spinner("Adding Questions.."):
+                if services.buffered_questions(project):  # instant
                     services.create_quiz(project_name=project)
+                else:
+                    services.submit_quiz(project_name=project)
                 st.rerun(scope="fragment")
+            st.caption(f"{services.buffered_questions(project)} questions ready")
         right, total = sum(
-            1 for q, a in zip(quiz.questions, choices) if q.answer == a
-        ), len(quiz.questions)
-        score = right / total
+            1 for q, a in zip(questions, choices) if q.answer == a
+        ), len(questions)
+        score = right / (total or 1)
 
         with _c2:
             see_score = st.button("See Score")
@@ -137,6 +229,30 @@ def _render_quiz(project: str):
     st.divider()
 
 
+def _validate(handler: JupyterHandler) -> None:
+    with st.spinner("Running the Notebook..", show_time=True):
+        reports = handler.validate()
+    for report in reports:
+        if not report.ok:
+            st.warning(f"Cell {report.index} failed: {report.error}")
+
+
+def _stream_cells(handler: JupyterHandler, cells) -> list[Cell]:
+    """Add (and show) every cell as soon as the LLM has written it"""
+    added = []
+    with st.status("Generating Notebook..", expanded=True) as status:
+        for cell in cells:
+            if cell.type == CellType.MARKDOWN:
+                st.markdown(cell.content)
+            else:
+                st.code(cell.content, language="python")
+            handler.add_cell(cell).save_changes()  # appends one row
+            added.append(cell)
+            status.update(label=f"Generating Notebook.. ({len(added)} cells)")
+        status.update(label=f"Generated {len(added)} cells", state="complete")
+    return added
+
+
 @st.fragment
 def _render_jupyter(project: str):
     if project not in st.session_state.jupyter_handles:
@@ -144,27 +260,35 @@ def _render_jupyter(project: str):
 
     handler: JupyterHandler = st.session_state.jupyter_handles[project]
 
-    if handler.is_empty() and st.button("Generate", key=f"{project}_jupyter-generate"):
-        with st.spinner("Generating Notebook..", show_time=True):
-            jup: JupyterCells = services.create_jupyter_cells(project_name=project)
-            for cell in jup.cells:
-                handler.add_cell(cell)
-        handler.save_changes()
+    job = services.latest_job(f"notebook:{project}")
+    if job and job.active:
+        _job_progress(job.id)
+        return
+    if handler.is_empty() and job and job.status == JobStatus.SUCCEEDED:
+        handler.reload()  # written by the notebook job
+    if handler.is_empty():
+        _job_failed(job)
+        if st.button("Generate", key=f"{project}_jupyter-generate"):
+            services.submit_notebook(project)
+            st.rerun(scope="fragment")
 
     if not handler.is_empty():
         st.divider()
         if user_input := st.chat_input("Type changes to make to the Notebook..."):
-            with st.spinner("Generating Notebook..", show_time=True):
-                jup: JupyterCells = services.update_jupyter_cells(
-                    project_name=project,
-                    cells=JupyterCells.from_nodes(nodes=handler.cells),
-                    update=user_input,
+            handler.import_edits()  # the changes apply to the edited notebook
+            with LLMSwitch.hedging(st.session_state.hedge):
+                added = _stream_cells(
+                    handler,
+                    services.stream_jupyter_cells(
+                        project_name=project,
+                        cells=JupyterCells.from_nodes(nodes=handler.cells),
+                        update=user_input,
+                    ),
                 )
-                for cell in jup.cells:
-                    handler.add_cell(cell)
-                handler.save_changes()
+            _validate(handler)
+            handler.save_changes()
             st.info("Added cells:")
-            st.json(jup.model_dump_json(indent=2), expanded=False)
+            st.json(JupyterCells(cells=added).model_dump_json(indent=2), expanded=False)
             st.rerun(scope="fragment")
         st.divider()
 
@@ -176,14 +300,19 @@ def _render_jupyter(project: str):
 @st.fragment
 def _render_summary(fl: FileEntry):
     st.subheader(fl.title)
+    job = services.latest_job(f"summary:{fl.id}")
+    if job and job.status == JobStatus.SUCCEEDED and not (fl.data or {}).get("summary"):
+        fl = services.get_file(str(fl.id)) or fl  # the listing is cached
     if fl.data and (summary := fl.data.get("summary")):
         st.markdown(summary)
-    elif st.button(":arrows_counterclockwise:", key=f"{fl.id}_add_button"):
-        with st.container():
-            with st.spinner("Adding summary..", show_time=True):
-                services.add_summary_to_file(fl)
-                st.toast("Added summary to file")
-                st.rerun(scope="fragment")
+    elif job and job.active:
+        _job_progress(job.id)
+    else:
+        _job_failed(job)
+        if st.button(":arrows_counterclockwise:", key=f"{fl.id}_add_button"):
+            services.submit_summary(fl)
+            st.toast("Summarizing in the background")
+            st.rerun(scope="fragment")
 
 
 @st.fragment
@@ -196,29 +325,28 @@ def _render_chat(project: str):
         if st.checkbox(label=file.title, key=f"{project}_{file}_chat-choice")
     ]
 
-    messages = st.session_state.messages[project]
+    messages = services.recent_messages(project, CHAT_PAGE_SIZE)
     if not messages:
-        messages.append(AIMessage("Ask some questions about your docs."))
+        messages = [AIMessage("Ask some questions about your docs.")]
     for message in messages:
         with st.chat_message(message.type):
             st.markdown(message.content)
     c1, c2 = st.columns([0.8, 0.2])
     with c1:
         if user_input := st.chat_input("Type your message..."):
-            messages.append(HumanMessage(user_input))
-            with st.spinner("Thinking...", show_time=True):
-                bot_response = services.ask(
-                    messages=messages, context_files=context_files
-                )
-                messages.append(bot_response)
+            with st.chat_message("human"):
+                st.markdown(user_input)
+            with st.spinner("Thinking...", show_time=True), LLMSwitch.hedging(
+                st.session_state.hedge
+            ):
+                services.chat(project, user_input, context_files=context_files)
             st.rerun(scope="fragment")
     with c2:
         if st.button(
             "Clear Chat", key=f"{project}_clear_chat", icon=":material/delete_forever:"
         ):
-            st.session_state.messages[project] = []
+            services.clear_chat(project)
             st.rerun(scope="fragment")
-    st.json(messages, expanded=False)
 
 
 def display_project_files(project: str = None) -> Any:
@@ -228,7 +356,12 @@ def display_project_files(project: str = None) -> Any:
         return st.warning("Please Choose a project in the sidebar")
     st.subheader(project)
 
-    files = list_files(project)
+    page = 0
+    if (n_files := count_files(project)) > FILES_PAGE_SIZE:
+        pages = -(-n_files // FILES_PAGE_SIZE)
+        page = st.number_input(f"Page (of {pages})", 1, pages, key=f"{project}_page")
+        page -= 1
+    files = list_files(project, page=page)
 
     c1, c2 = st.columns([0.8, 0.1])
     for fl in files:
@@ -274,7 +407,8 @@ def display_project_files(project: str = None) -> Any:
             elif fl.type_ == FileType.PDF:
                 st.subheader(fl.title)
                 with st.expander("PDF Preview"):
-                    pdf_iframe = consts.pdf_iframe.format(fl.content)
+                    pdf = base64.b64encode(fl.read_bytes()).decode("utf-8")
+                    pdf_iframe = consts.pdf_iframe.format(pdf)
                     st.markdown(pdf_iframe, unsafe_allow_html=True)
             else:
                 st.subheader(fl.title)
@@ -397,6 +531,22 @@ def _render_sidebar():
     if choice:
         LLMSwitch.switch(choice)
         # st.info(f"Current: {LLMSwitch.get_current()}")
+    with st.expander(f"LLM Queue ({SCHEDULER.queue_depth()})"):
+        st.json(SCHEDULER.metrics(), expanded=False)
+    with st.expander("LLM Routing"):
+        st.json(LLMSwitch.latency_report(), expanded=False)
+        st.toggle("Hedge slow answers", key="hedge", help="For this session")
+        st.json(HEDGER.stats(), expanded=False)
+    with st.expander("LLM Cache"):
+        st.json(llm_cache.get_llm_cache().stats(), expanded=False)
+    with st.expander("LLM Usage"):
+        totals = usage_totals(selected_project)
+        st.metric("Cost ($)", round(sum(t["cost"] for t in totals), 4))
+        st.metric(
+            "Tokens",
+            sum(t["prompt_tokens"] + t["completion_tokens"] for t in totals),
+        )
+        st.dataframe(totals, hide_index=True)
     st.divider()
     if audio_data := st_audiorec(
         text="",
@@ -0,0 +1,189 @@
+"""Hedged requests across registered LLM services (opt-in, see
+`LLMSwitch.enable_hedging`)
+
+If the primary service has not answered within its p-th percentile latency,
+the same request is sent to a secondary service. The first valid response wins.
+The losing request is cancelled if it has not started yet, otherwise its
+result is discarded (a running HTTP call cannot be interrupted from a thread).
+Extra spend is capped by a hedge ratio and an extra-token budget per
+`budget_window` (a rolling window, so hedging resumes once it has passed).
+"""
+
+import contextvars
+import statistics
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable
+from pydantic import Field
+
+from pacer.llms.scheduler import estimate_tokens
+
+
+@dataclass
+class HedgePolicy:
+    percentile: float = 95  # hedge after the primary's p95 latency
+    min_samples: int = 20  # until then use `initial_delay`
+    initial_delay: float = 5.0
+    min_delay: float = 0.05
+    max_hedge_ratio: float = 0.1  # at most 10% of calls send a second request
+    max_extra_tokens: Optional[int] = 50_000  # estimated extra tokens per window
+    budget_window: float = 60.0  # seconds
+
+
+class HedgeController:
+    """Latency tracking, hedge delay, budget and the hedged call itself"""
+
+    def __init__(self, policy: HedgePolicy = None, max_workers: int = 16):
+        self.policy = policy or HedgePolicy()
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+        self._latencies: dict[str, deque] = defaultdict(lambda: deque(maxlen=1000))
+        self._spent: deque[tuple[float, int]] = deque()  # (time, extra tokens)
+        self._window_tokens = 0
+        self._stats = dict(
+            calls=0, hedged=0, secondary_wins=0, budget_denied=0, extra_tokens=0
+        )
+
+    def record_latency(self, service: str, seconds: float) -> None:
+        with self._lock:
+            self._latencies[service].append(seconds)
+
+    def delay(self, service: str) -> float:
+        """Seconds to wait for `service` before hedging"""
+        with self._lock:
+            latencies = list(self._latencies[service])
+        if len(latencies) < max(2, self.policy.min_samples):
+            return self.policy.initial_delay
+        cut = statistics.quantiles(latencies, n=100, method="inclusive")
+        index = min(98, max(0, round(self.policy.percentile) - 1))
+        return max(self.policy.min_delay, cut[index])
+
+    def _allow_hedge(self, tokens: int) -> bool:
+        policy = self.policy
+        with self._lock:
+            now = time.monotonic()
+            while self._spent and self._spent[0][0] <= now - policy.budget_window:
+                self._window_tokens -= self._spent.popleft()[1]
+            stats = self._stats
+            within_ratio = (
+                stats["hedged"] + 1 <= policy.max_hedge_ratio * stats["calls"]
+            )
+            within_tokens = (
+                policy.max_extra_tokens is None
+                or self._window_tokens + tokens <= policy.max_extra_tokens
+            )
+            if ok := within_ratio and within_tokens:
+                self._stats["hedged"] += 1
+                self._stats["extra_tokens"] += tokens
+                self._spent.append((now, tokens))
+                self._window_tokens += tokens
+            else:
+                self._stats["budget_denied"] += 1
+            return ok
+
+    def _submit(self, service: str, fn: Callable[[], Any]) -> Future:
+        """Run `fn` in the pool (keeping context vars, e.g. priority and usage
+        tags) and record its latency"""
+
+        def run():
+            start = time.perf_counter()
+            result = fn()
+            self.record_latency(service, time.perf_counter() - start)
+            return result
+
+        return self._pool.submit(contextvars.copy_context().run, run)
+
+    def call(
+        self,
+        primary: Callable[[], Any],
+        secondary: Callable[[], Any],
+        primary_service: str = "primary",
+        secondary_service: str = "secondary",
+        tokens: int = 0,
+    ) -> Any:
+        """Run `primary`, hedge with `secondary` if it is slow, return the first
+        valid result (errors only propagate when every attempt failed)."""
+        with self._lock:
+            self._stats["calls"] += 1
+
+        first = self._submit(primary_service, primary)
+        done, _ = wait([first], timeout=self.delay(primary_service))
+        if done or not self._allow_hedge(tokens):
+            return first.result()
+
+        second = self._submit(secondary_service, secondary)
+        pending: set[Future] = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    if future is second:
+                        with self._lock:
+                            self._stats["secondary_wins"] += 1
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            services = list(self._latencies)
+        stats["delay"] = {
+            service: round(self.delay(service), 3) for service in services
+        }
+        return stats
+
+
+HEDGER = HedgeController()
+
+
+class HedgedChatModel(BaseChatModel):
+    """Chat model that hedges `primary` with `secondary` through `HEDGER`.
+    Both are runnables (models or bound models), so `bind_tools` and
+    `with_structured_output` bind each side with its own provider format."""
+
+    primary: Runnable
+    secondary: Runnable
+    primary_service: str = "primary"
+    secondary_service: str = "secondary"
+    controller: Any = Field(default=None, exclude=True)
+    cache: Any = False  # the inner models already use the LLM cache
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged-chat"
+
+    def _hedger(self) -> HedgeController:
+        return self.controller or HEDGER
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(
+            update=dict(
+                primary=self.primary.bind_tools(tools, **kwargs),
+                secondary=self.secondary.bind_tools(tools, **kwargs),
+            )
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        def invoker(runnable: Runnable):
+            return lambda: runnable.invoke(messages, stop=stop, **kwargs)
+
+        message: AIMessage = self._hedger().call(
+            invoker(self.primary),
+            invoker(self.secondary),
+            primary_service=self.primary_service,
+            secondary_service=self.secondary_service,
+            tokens=estimate_tokens(messages),
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
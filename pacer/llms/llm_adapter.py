@@ -1,44 +1,183 @@
 """Here we choose a LLM configuration
 """
 
+import contextlib
+import contextvars
+import os
 from enum import StrEnum, auto
-from typing import Any, Callable
+from typing import Any, Callable, Optional
 
 import dotenv
 from langchain_mistralai import ChatMistralAI
 from langchain_openai import ChatOpenAI
 
+from pacer.config import consts
+from pacer.llms.hedging import HEDGER, HedgedChatModel, HedgePolicy
+from pacer.llms.replay import ReplayChatModel, ReplayMode
+from pacer.llms.routing import LATENCY, RouteLatencyHandler, TaskClass
+from pacer.llms.scheduler import scheduled_model
+from pacer.llms.usage import UsageCallbackHandler
+
 dotenv.load_dotenv()
 
+# Hedged task classes of the current context (e.g. a GUI session), see `hedging`
+_hedged: contextvars.ContextVar[Optional[frozenset[str]]] = contextvars.ContextVar(
+    "llm_hedged_tasks", default=None
+)
+
 
 class LLMService(StrEnum):
     MISTRAL_LATEST = auto()
     OPENAI_4O = auto()
+    OPENAI_4O_MINI = auto()
+    MISTRAL_SMALL = auto()
+    REPLAY = auto()
 
 
 class LLMSwitch:
-    _services: dict[str, Callable[[], Any]] = {}
-    _current = None  # Removed Callable type hint from class attribute
+    _services: dict[str, Callable[..., Any]] = {}
+    _current: str = None  # name of the current service
+
+    # task -> {selected service: [service to use, *fallbacks]}
+    # A selected service without a rule is used as-is for that task.
+    routes: dict[str, dict[str, list[str]]] = {
+        TaskClass.ANSWER: {
+            LLMService.OPENAI_4O: [LLMService.OPENAI_4O, LLMService.MISTRAL_LATEST],
+            LLMService.MISTRAL_LATEST: [
+                LLMService.MISTRAL_LATEST,
+                LLMService.OPENAI_4O,
+            ],
+        },
+        TaskClass.AUXILIARY: {
+            LLMService.OPENAI_4O: [
+                LLMService.OPENAI_4O_MINI,
+                LLMService.MISTRAL_SMALL,
+            ],
+            LLMService.MISTRAL_LATEST: [
+                LLMService.MISTRAL_SMALL,
+                LLMService.OPENAI_4O_MINI,
+            ],
+        },
+    }
+    # task -> request timeout (seconds), after which the next service is tried
+    timeouts: dict[str, float] = {TaskClass.ANSWER: 120, TaskClass.AUXILIARY: 30}
+    # task classes whose primary is hedged with the first fallback (opt-in,
+    # process default; `hedging` overrides it for a context)
+    hedged_tasks: set[str] = set()
 
     @classmethod
-    def register(cls, name: str) -> Callable[[Callable[[], Any]], Callable[[], Any]]:
-        """Decorator to register a service function."""
+    def register(cls, name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        """Decorator to register a service function.
+        The function should accept (and pass on) model kwargs, e.g. `timeout`."""
 
-        def decorator(func: Callable[[], Any]) -> Callable[[], Any]:
+        def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
             cls._services[name] = func
             return func
 
         return decorator
 
     @classmethod
-    def get_current(cls) -> Any:
-        """Get the current service instance."""
+    def get_current(cls, task: TaskClass = TaskClass.ANSWER) -> Any:
+        """Get the current service instance for a task class.
+        Auxiliary tasks are routed to a small model, and every routed model
+        falls back to the next service on errors or timeouts."""
         if cls._current is None:
             if cls._services:
-                cls._current = list(cls._services.values())[0]
+                cls._current = list(cls._services.keys())[0]
             else:
                 raise ValueError("No services registered")
-        return cls._current()
+
+        models, error = [], None
+        for name in cls.route(task):
+            try:
+                models.append(cls.get(name, task=task, timeout=cls.timeouts.get(task)))
+            except Exception as e:  # e.g. missing API key for a fallback provider
+                print(f"Skipping LLM service `{name}` for {task}: {e}")
+                error = e
+        if not models:
+            raise error or ValueError(f"No services available for {task}")
+        primary, *fallbacks = models
+        hedged = _hedged.get()
+        if task in (cls.hedged_tasks if hedged is None else hedged) and fallbacks:
+            primary = HedgedChatModel(
+                primary=primary,
+                secondary=fallbacks[0],
+                primary_service=primary.scheduler_service,
+                secondary_service=fallbacks[0].scheduler_service,
+            )
+        return primary.with_fallbacks(fallbacks) if fallbacks else primary
+
+    @classmethod
+    def enable_hedging(
+        cls,
+        policy: HedgePolicy = None,
+        tasks: tuple[TaskClass, ...] = (TaskClass.ANSWER,),
+    ) -> None:
+        """Hedge slow calls of `tasks` with the next routed service."""
+        if policy is not None:
+            HEDGER.policy = policy
+        cls.hedged_tasks = {str(task) for task in tasks}
+
+    @classmethod
+    def disable_hedging(cls) -> None:
+        cls.hedged_tasks = set()
+
+    @classmethod
+    @contextlib.contextmanager
+    def hedging(
+        cls, enabled: bool = True, tasks: tuple[TaskClass, ...] = (TaskClass.ANSWER,)
+    ):
+        """Hedge (or not) the models got inside the block, whatever the process
+        default is (e.g. the choice of one GUI session)"""
+        token = _hedged.set(frozenset(map(str, tasks)) if enabled else frozenset())
+        try:
+            yield
+        finally:
+            _hedged.reset(token)
+
+    @classmethod
+    def build(cls, service_name: str, **kwargs) -> Any:
+        """A bare instance of a registered service (no scheduler, no callbacks)."""
+        service_str = str(service_name)
+        if service_str not in cls._services:
+            raise ValueError(f"Service {service_name} not registered")
+        return cls._services[service_str](**kwargs)
+
+    @classmethod
+    def get(
+        cls, service_name: str, task: TaskClass = TaskClass.ANSWER, **kwargs
+    ) -> Any:
+        """Get an instance of a registered service (routed through the LLM scheduler,
+        with latency and token/cost accounting callbacks attached)."""
+        service_str = str(service_name)
+        kwargs = {k: v for k, v in kwargs.items() if v is not None}
+        kwargs["callbacks"] = [
+            *kwargs.get("callbacks", []),
+            RouteLatencyHandler(task=task, service=service_str),
+            UsageCallbackHandler(service=service_str, task=task),
+        ]
+        return scheduled_model(cls.build(service_str, **kwargs), service=service_str)
+
+    @classmethod
+    def route(cls, task: TaskClass = TaskClass.ANSWER) -> list[str]:
+        """Services (primary first, then fallbacks) used for `task`."""
+        rule = cls.routes.get(str(task), {}).get(cls._current, [cls._current])
+        return [str(name) for name in rule if str(name) in cls._services]
+
+    @classmethod
+    def set_route(
+        cls, task: TaskClass, selected: LLMService, services: list[LLMService]
+    ) -> None:
+        """Configure which services handle `task` while `selected` is chosen."""
+        if unknown := [s for s in services if str(s) not in cls._services]:
+            raise ValueError(f"Services {unknown} not registered")
+        rules = cls.routes.setdefault(str(task), {})
+        rules[str(selected)] = [str(s) for s in services]
+
+    @classmethod
+    def latency_report(cls) -> dict[str, dict[str, dict]]:
+        """Per-task, per-service latency (count, errors, mean, p50, p95)."""
+        return LATENCY.report()
 
     @classmethod
     def services(cls) -> list[str]:
@@ -50,16 +189,49 @@ class LLMSwitch:
         """Switch to a different service."""
         service_str = str(service_name)
         if service_str in cls._services:
-            cls._current = cls._services[service_str]
+            cls._current = service_str
         else:
             raise ValueError(f"Service {service_name} not registered")
 
 
 @LLMSwitch.register(LLMService.OPENAI_4O)
-def openai_4o() -> ChatOpenAI:
-    return ChatOpenAI(model="gpt-4o")
+def openai_4o(**kwargs) -> ChatOpenAI:
+    return ChatOpenAI(model="gpt-4o", **kwargs)
 
 
 @LLMSwitch.register(LLMService.MISTRAL_LATEST)
-def mistral_large_latest() -> ChatMistralAI:
-    return ChatMistralAI(model="mistral-large-latest")
+def mistral_large_latest(**kwargs) -> ChatMistralAI:
+    return ChatMistralAI(model="mistral-large-latest", **kwargs)
+
+
+@LLMSwitch.register(LLMService.OPENAI_4O_MINI)
+def openai_4o_mini(**kwargs) -> ChatOpenAI:
+    return ChatOpenAI(model="gpt-4o-mini", **kwargs)
+
+
+@LLMSwitch.register(LLMService.MISTRAL_SMALL)
+def mistral_small_latest(**kwargs) -> ChatMistralAI:
+    return ChatMistralAI(model="mistral-small-latest", **kwargs)
+
+
+@LLMSwitch.register(LLMService.REPLAY)
+def replay(**kwargs) -> ReplayChatModel:
+    """Offline provider, configured by env:
+    PACER_REPLAY_MODE (record/replay/fake), PACER_RECORD_SERVICE (real service
+    used when recording), PACER_CASSETTE and PACER_FAKE_LATENCY (seconds)"""
+    kwargs.pop("timeout", None)
+    mode = ReplayMode(consts.REPLAY_MODE or ReplayMode.FAKE)
+    inner = None
+    if mode == ReplayMode.RECORD:  # the replay model itself is already scheduled
+        inner = LLMSwitch.build(os.getenv("PACER_RECORD_SERVICE", LLMService.OPENAI_4O))
+    return ReplayChatModel(
+        mode=mode,
+        cassette_path=os.getenv("PACER_CASSETTE", consts.CASSETTE_DIR / "llm.json"),
+        inner=inner,
+        latency=float(os.getenv("PACER_FAKE_LATENCY", 0)),
+        **kwargs,
+    )
+
+
+if consts.REPLAY_MODE:
+    LLMSwitch.switch(LLMService.REPLAY)
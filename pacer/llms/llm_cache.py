@@ -0,0 +1,285 @@
+"""Bounded, observable LLM response cache
+Replaces `set_llm_cache(SQLiteCache(".langchain.db"))`:
+    * keys are built from the (stripped) prompt, the model and its parameters
+    * size cap with LRU + TTL eviction
+    * WAL-mode SQLite (safe for concurrent Streamlit sessions) under `ROOT_DIR`
+    * in-memory hot tier in front of SQLite
+    * hit-rate and bytes-saved statistics (see `LLMCache.stats`)
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Optional
+
+from langchain.globals import set_llm_cache
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+from pacer.config import consts
+
+CACHE_PATH = consts.ROOT_DIR / ".llm_cache.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    llm TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed_at ON llm_cache (accessed_at);
+"""
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Strip surrounding whitespace (inner whitespace is kept: indentation
+    matters in code and notebook prompts)"""
+    return prompt.strip()
+
+
+# Connection settings that do not change the response
+_TRANSPORT_PARAMS = {"request_timeout", "timeout", "max_retries", "openai_proxy"}
+
+
+def normalize_llm_string(llm_string: str) -> str:
+    """Reduce langchain's `llm_string` (`<serialized model>---<sorted call params>`)
+    to the model class, its parameters and the call parameters."""
+    model, sep, params = llm_string.rpartition("---")
+    if not sep:
+        return llm_string.strip()
+    try:
+        serialized = json.loads(model)
+    except ValueError:
+        return llm_string.strip()
+    kwargs = {
+        k: v
+        for k, v in serialized.get("kwargs", {}).items()
+        if k not in _TRANSPORT_PARAMS
+        and v is not None
+        and not (isinstance(v, dict) and v.get("type") == "secret")
+    }
+    name = serialized.get("id", [""])[-1].removeprefix("Scheduled")
+    return f"{name}:{json.dumps(kwargs, sort_keys=True)}---{params.strip()}"
+
+
+def make_key(prompt: str, llm_string: str) -> str:
+    raw = f"{normalize_llm_string(llm_string)}\x00{normalize_prompt(prompt)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache(BaseCache):
+    """Two-tier (memory -> SQLite) langchain cache"""
+
+    def __init__(
+        self,
+        database_path: Path | str = CACHE_PATH,
+        max_entries: int = 20_000,
+        max_bytes: int = 256 * 1024**2,
+        ttl: Optional[float] = 30 * 24 * 3600,
+        hot_entries: int = 512,
+        evict_every: int = 100,
+    ):
+        self.database_path = str(database_path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hot_entries = hot_entries
+        self.evict_every = evict_every
+
+        self._hot: OrderedDict[str, tuple[float, int, RETURN_VAL_TYPE]] = OrderedDict()
+        self._touched: dict[str, float] = {}  # hot hits, not yet in `accessed_at`
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._stats = dict(
+            hits=0, hot_hits=0, misses=0, updates=0, evictions=0, bytes_saved=0
+        )
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread (Streamlit runs each session on its own thread)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.database_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def _remember(self, key: str, created_at: float, size: int, value) -> None:
+        with self._lock:
+            self._hot[key] = (created_at, size, value)
+            self._hot.move_to_end(key)
+            while len(self._hot) > self.hot_entries:
+                self._hot.popitem(last=False)
+
+    def _hit(self, size: int, hot: bool) -> None:
+        with self._lock:
+            self._stats["hits"] += 1
+            self._stats["hot_hits"] += hot
+            self._stats["bytes_saved"] += size
+
+    def last_lookup_hit(self, reset: bool = False) -> bool:
+        """Whether the latest lookup on this thread was a hit (for usage accounting)"""
+        hit = getattr(self._local, "hit", False)
+        if reset:
+            self._local.hit = False
+        return hit
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        value = self._lookup(prompt, llm_string)
+        self._local.hit = value is not None
+        return value
+
+    def _lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = make_key(prompt, llm_string)
+
+        # --1-- Hot tier
+        with self._lock:
+            if key in self._hot:
+                created_at, size, value = self._hot[key]
+                if not self._expired(created_at):
+                    self._hot.move_to_end(key)
+                    self._touched[key] = time.time()
+                    self._hit(size, hot=True)
+                    return value
+                del self._hot[key]
+
+        # --2-- SQLite
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, size, created_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or self._expired(row[2]):
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        blob, size, created_at = row
+        try:
+            value = [loads(gen) for gen in json.loads(zlib.decompress(blob))]
+        except Exception as e:
+            print(f"[llm_cache] dropping unreadable entry {key[:8]}: {e}")
+            with conn:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        with conn:
+            conn.execute(
+                "UPDATE llm_cache SET accessed_at = ?, hits = hits + 1 WHERE key = ?",
+                (time.time(), key),
+            )
+        self._remember(key, created_at, size, value)
+        self._hit(size, hot=False)
+        return value
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = make_key(prompt, llm_string)
+        payload = json.dumps([dumps(gen) for gen in return_val]).encode("utf-8")
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache"
+                " (key, llm, value, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    normalize_llm_string(llm_string)[:512],
+                    zlib.compress(payload),
+                    len(payload),
+                    now,
+                    now,
+                ),
+            )
+        self._remember(key, now, len(payload), return_val)
+        with self._lock:
+            self._stats["updates"] += 1
+            evict = self._stats["updates"] % self.evict_every == 0
+        if evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then least recently used ones over the caps"""
+        conn = self._connect()
+        removed, stale = 0, []
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        with conn:
+            conn.executemany(  # so LRU order counts the hot tier's hits
+                "UPDATE llm_cache SET accessed_at = ? WHERE key = ?",
+                [(at, key) for key, at in touched.items()],
+            )
+            if self.ttl is not None:
+                removed += conn.execute(
+                    "DELETE FROM llm_cache WHERE created_at < ?",
+                    (time.time() - self.ttl,),
+                ).rowcount
+            count, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+            ).fetchone()
+            if count > self.max_entries or total > self.max_bytes:
+                keep_bytes, keep = 0, 0
+                rows = conn.execute(
+                    "SELECT key, size FROM llm_cache ORDER BY accessed_at DESC"
+                )
+                for key, size in rows:
+                    if keep < self.max_entries and keep_bytes + size <= self.max_bytes:
+                        keep, keep_bytes = keep + 1, keep_bytes + size
+                    else:
+                        stale.append(key)
+                conn.executemany(
+                    "DELETE FROM llm_cache WHERE key = ?", [(key,) for key in stale]
+                )
+                removed += len(stale)
+        with self._lock:
+            self._stats["evictions"] += removed
+            expired = [k for k, (c, *_) in self._hot.items() if self._expired(c)]
+            for key in [*expired, *stale]:
+                self._hot.pop(key, None)
+        return removed
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache")
+        with self._lock:
+            self._hot.clear()
+            self._touched.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["hot_entries"] = len(self._hot)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["entries"], stats["bytes"] = (
+            self._connect()
+            .execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache")
+            .fetchone()
+        )
+        return stats
+
+
+@lru_cache(1)
+def get_llm_cache() -> LLMCache:
+    return LLMCache()
+
+
+def install() -> LLMCache:
+    """Set the process-wide langchain cache (idempotent)"""
+    cache = get_llm_cache()
+    set_llm_cache(cache)
+    return cache
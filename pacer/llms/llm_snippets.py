@@ -5,11 +5,11 @@ Mistral
 
 from enum import StrEnum
 
-from langchain.globals import set_llm_cache
-from langchain_community.cache import SQLiteCache
 from langchain_mistralai import ChatMistralAI
 
-set_llm_cache(SQLiteCache(database_path=".langchain.db"))
+from pacer.llms import llm_cache
+
+llm_cache.install()
 
 
 class MistralModelName(StrEnum):
@@ -0,0 +1,327 @@
+"""Record/replay LLM and embedding provider for deterministic offline runs
+
+Modes:
+    * record: call the real model and store every response in a cassette file
+    * replay: answer from the cassette by request hash (no network)
+    * fake:   synthesize deterministic outputs (structured output included)
+
+Example usage:
+    >>> llm = ReplayChatModel(mode=ReplayMode.FAKE, latency=0.2)
+    >>> quiz = (quiz_prompt | llm.with_structured_output(Quiz)).invoke({"text": ""})
+    >>> emb = ReplayEmbeddings(mode=ReplayMode.FAKE, size=8)
+    >>> len(emb.embed_query("hello"))
+    8
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from enum import StrEnum, auto
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.load import dumpd, load
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import Field, PrivateAttr
+
+
+class ReplayMode(StrEnum):
+    RECORD = auto()
+    REPLAY = auto()
+    FAKE = auto()
+
+
+class Cassette:
+    """JSON file of `{request hash: recorded response}`, shared per path.
+    New entries are written at most every `flush_every` seconds, and at exit."""
+
+    _open: dict[str, "Cassette"] = {}
+    _open_lock = threading.Lock()
+
+    def __init__(self, path: Path, flush_every: float = 5.0):
+        self.path = Path(path)
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._entries: dict[str, Any] = {}
+        self._dirty = False
+        self._flushed_at = time.monotonic()
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as fl:
+                self._entries = json.load(fl)
+
+    @classmethod
+    def open(cls, path: Path | str) -> "Cassette":
+        key = str(Path(path).resolve())
+        with cls._open_lock:
+            if key not in cls._open:
+                cls._open[key] = cassette = cls(Path(path))
+                atexit.register(cassette.flush)
+            return cls._open[key]
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            return self._entries.get(key)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key: str, value: Any) -> None:
+        self.put_many({key: value})
+
+    def put_many(self, entries: dict[str, Any]) -> None:
+        with self._lock:
+            self._entries.update(entries)
+            self._dirty = True
+            due = time.monotonic() - self._flushed_at >= self.flush_every
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the cassette file (if anything was recorded since the last write)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as fl:
+                json.dump(self._entries, fl)
+            os.replace(tmp, self.path)
+            self._dirty = False
+            self._flushed_at = time.monotonic()
+
+
+def request_hash(*parts: Any) -> str:
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _sleep(latency: float, jitter: float, key: str) -> None:
+    """Deterministic artificial latency (jitter is seeded by the request)"""
+    if latency or jitter:
+        delay = latency + random.Random(key).uniform(0, jitter)
+        time.sleep(delay)
+
+
+def fake_from_schema(
+    schema: dict, rng: random.Random, defs: dict = None, name: str = "value"
+) -> Any:
+    """Deterministic value that validates against a (pydantic) JSON schema"""
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if ref := schema.get("$ref"):
+        return fake_from_schema(defs[ref.split("/")[-1]], rng, defs, name)
+    for key in ("anyOf", "oneOf", "allOf"):
+        if options := schema.get(key):
+            options = [o for o in options if o.get("type") != "null"] or options
+            return fake_from_schema(options[0], rng, defs, name)
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    if "const" in schema:
+        return schema["const"]
+
+    match schema.get("type", "object" if "properties" in schema else "string"):
+        case "object":
+            props = schema.get("properties", {})
+            required = schema.get("required", props)
+            value = {  # fields with a plain default keep it
+                key: fake_from_schema(prop, rng, defs, key)
+                for key, prop in props.items()
+                if key in required or "default" not in prop
+            }
+            # Quiz-like objects: keep the answer among the options
+            if isinstance(value.get("options"), list) and "answer" in value:
+                value["answer"] = rng.choice(value["options"] or [value["answer"]])
+            return value
+        case "array":
+            low = schema.get("minItems", 3)
+            count = min(max(low, 3), schema.get("maxItems", 4))
+            item = schema.get("items", {})
+            return [
+                fake_from_schema(item, rng, defs, f"{name} {i}") for i in range(count)
+            ]
+        case "integer":
+            return rng.randint(schema.get("minimum", 0), schema.get("maximum", 100))
+        case "number":
+            return round(rng.uniform(0, 100), 3)
+        case "boolean":
+            return rng.random() < 0.5
+        case "null":
+            return None
+        case _:
+            if schema.get("format") == "uuid":
+                return str(uuid.UUID(int=rng.getrandbits(128)))
+            return f"{name} {rng.randint(0, 9999)}"
+
+
+def _tool_for_choice(tools: list[dict], tool_choice: Any) -> dict:
+    if isinstance(tool_choice, dict):
+        name = tool_choice.get("function", {}).get("name")
+    elif isinstance(tool_choice, str) and tool_choice not in (
+        "any",
+        "auto",
+        "required",
+    ):
+        name = tool_choice
+    else:
+        name = None
+    for tool in tools:
+        if name is None or tool["function"]["name"] == name:
+            return tool
+    return tools[0]
+
+
+class ReplayChatModel(BaseChatModel):
+    """Chat model with record/replay/fake modes (see module docstring)"""
+
+    mode: ReplayMode = ReplayMode.FAKE
+    cassette_path: Optional[Path] = None
+    inner: Optional[BaseChatModel] = Field(default=None, exclude=True)
+    latency: float = 0.0  # artificial latency (replay/fake), seconds
+    latency_jitter: float = 0.0
+
+    _cassette: Optional[Cassette] = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        if self.mode == ReplayMode.RECORD and self.inner is None:
+            raise ValueError("Record mode needs the real (`inner`) model")
+        if self.mode != ReplayMode.FAKE:
+            if self.cassette_path is None:
+                raise ValueError(f"`cassette_path` is required in {self.mode} mode")
+            self._cassette = Cassette.open(self.cassette_path)
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay-chat"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"mode": str(self.mode), "cassette_path": str(self.cassette_path)}
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        formatted = [convert_to_openai_tool(tool) for tool in tools]
+        if tool_choice is not None:
+            kwargs["tool_choice"] = tool_choice
+        return self.bind(tools=formatted, **kwargs)
+
+    def _request_key(self, messages, stop, kwargs) -> str:
+        call_kwargs = {k: v for k, v in kwargs.items() if not k.startswith("ls_")}
+        return request_hash([dumpd(m) for m in messages], stop, call_kwargs)
+
+    def _fake(self, messages, key: str, **kwargs) -> ChatResult:
+        rng = random.Random(key)
+        if tools := kwargs.get("tools"):
+            tool = _tool_for_choice(tools, kwargs.get("tool_choice"))
+            function = tool["function"]
+            args = fake_from_schema(function.get("parameters", {}), rng)
+            message = AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": function["name"], "args": args, "id": f"call_{key[:12]}"}
+                ],
+            )
+        elif response_format := kwargs.get("response_format"):
+            schema = (
+                response_format.get("json_schema", {}).get("schema", {})
+                if isinstance(response_format, dict)
+                else convert_to_openai_tool(response_format)["function"]["parameters"]
+            )
+            message = AIMessage(content=json.dumps(fake_from_schema(schema, rng)))
+        else:
+            last = str(messages[-1].content) if messages else ""
+            message = AIMessage(
+                content=f"Fake answer [{key[:8]}] to: {' '.join(last.split()[:20])}"
+            )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._request_key(messages, stop, kwargs)
+
+        match self.mode:
+            case ReplayMode.FAKE:
+                _sleep(self.latency, self.latency_jitter, key)
+                return self._fake(messages, key, **kwargs)
+            case ReplayMode.REPLAY:
+                if (recorded := self._cassette.get(key)) is None:
+                    raise KeyError(
+                        f"Request {key[:12]} not in cassette {self.cassette_path}"
+                        " (record it first)"
+                    )
+                _sleep(self.latency, self.latency_jitter, key)
+                return ChatResult(
+                    generations=[load(gen) for gen in recorded["generations"]],
+                    llm_output=recorded.get("llm_output"),
+                )
+            case ReplayMode.RECORD:
+                result = self.inner._generate(messages, stop=stop, **kwargs)
+                self._cassette.put(
+                    key,
+                    {
+                        "generations": [dumpd(gen) for gen in result.generations],
+                        "llm_output": json.loads(
+                            json.dumps(result.llm_output, default=str)
+                        ),
+                    },
+                )
+                return result
+
+
+class ReplayEmbeddings(Embeddings):
+    """`Embeddings` counterpart of `ReplayChatModel` (one cassette entry per text)"""
+
+    def __init__(
+        self,
+        mode: ReplayMode = ReplayMode.FAKE,
+        cassette_path: Optional[Path] = None,
+        inner: Optional[Embeddings] = None,
+        size: int = 3072,  # text-embedding-3-large
+        latency: float = 0.0,
+    ):
+        self.mode = ReplayMode(mode)
+        self.inner = inner
+        self.size = size
+        self.latency = latency
+        self.cassette = None
+        if self.mode == ReplayMode.RECORD and inner is None:
+            raise ValueError("Record mode needs the real (`inner`) embeddings")
+        if self.mode != ReplayMode.FAKE:
+            if cassette_path is None:
+                raise ValueError(f"`cassette_path` is required in {self.mode} mode")
+            self.cassette = Cassette.open(cassette_path)
+
+    def _fake(self, text: str) -> list[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8])
+        vector = np.random.default_rng(seed).standard_normal(self.size)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [request_hash(text) for text in texts]
+        _sleep(self.latency, 0, keys[0] if keys else "")
+
+        match self.mode:
+            case ReplayMode.FAKE:
+                return [self._fake(text) for text in texts]
+            case ReplayMode.REPLAY:
+                if missing := [k for k in keys if k not in self.cassette]:
+                    raise KeyError(f"{len(missing)} texts not in cassette")
+                return [self.cassette.get(k) for k in keys]
+            case ReplayMode.RECORD:
+                todo = [(k, t) for k, t in zip(keys, texts) if k not in self.cassette]
+                if todo:
+                    vectors = self.inner.embed_documents([t for _, t in todo])
+                    self.cassette.put_many(
+                        {k: vector for (k, _), vector in zip(todo, vectors)}
+                    )
+                return [self.cassette.get(k) for k in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
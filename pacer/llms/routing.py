@@ -0,0 +1,85 @@
+"""Task classes used by `LLMSwitch` to route sub-tasks to cheaper models,
+and the callback that reports per-task latency so routes can be tuned."""
+
+import statistics
+import threading
+import time
+from collections import defaultdict, deque
+from enum import StrEnum, auto
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class TaskClass(StrEnum):
+    ANSWER = auto()  # final answers: chat, notebooks -> the selected (large) model
+    AUXILIARY = auto()  # multi-query, compression, refine steps, quiz options
+
+
+class LatencyTracker:
+    """Rolling window of call latencies per (task, service)"""
+
+    def __init__(self, window: int = 500):
+        self.window = window
+        self._lock = threading.Lock()
+        self._latencies: dict[tuple[str, str], deque] = defaultdict(
+            lambda: deque(maxlen=self.window)
+        )
+        self._errors: dict[tuple[str, str], int] = defaultdict(int)
+
+    def record(self, task: str, service: str, seconds: float, error: bool = False):
+        with self._lock:
+            self._latencies[(task, service)].append(seconds)
+            self._errors[(task, service)] += error
+
+    def report(self) -> dict[str, dict[str, dict]]:
+        """{task: {service: {count, errors, mean, p50, p95}}} (seconds)"""
+        report = defaultdict(dict)
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._latencies.items()]
+            errors = dict(self._errors)
+        for (task, service), latencies in items:
+            quantiles = (
+                statistics.quantiles(latencies, n=20, method="inclusive")
+                if len(latencies) > 1
+                else latencies * 19
+            )
+            report[task][service] = {
+                "count": len(latencies),
+                "errors": errors.get((task, service), 0),
+                "mean": round(statistics.fmean(latencies), 3),
+                "p50": round(quantiles[9], 3),
+                "p95": round(quantiles[18], 3),
+            }
+        return dict(report)
+
+
+LATENCY = LatencyTracker()
+
+
+class RouteLatencyHandler(BaseCallbackHandler):
+    """Attached to every routed model, feeds `LATENCY`"""
+
+    def __init__(self, task: str, service: str, tracker: LatencyTracker = LATENCY):
+        self.task = str(task)
+        self.service = str(service)
+        self.tracker = tracker
+        self._starts: dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def _stop(self, run_id: UUID, error: bool) -> None:
+        if (start := self._starts.pop(run_id, None)) is not None:
+            seconds = time.perf_counter() - start
+            self.tracker.record(self.task, self.service, seconds, error=error)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any):
+        self._stop(run_id, error=False)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._stop(run_id, error=True)
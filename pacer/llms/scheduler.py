@@ -0,0 +1,420 @@
+"""Process-wide LLM request scheduler
+
+Every model handed out by `LLMSwitch` routes its calls through `SCHEDULER`:
+    * per-service token buckets for both requests and tokens
+    * a priority queue, so interactive chat goes before background work
+    * jittered backoff retries whenever the provider answers with a 429
+
+Example usage:
+    >>> with priority(Priority.BACKGROUND):
+    ...     SCHEDULER.submit("openai_4o", lambda: llm.invoke("hi"), tokens=10)
+    >>> SCHEDULER.metrics()["openai_4o"]["queued"]
+    0
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import email.utils
+import heapq
+import itertools
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from enum import IntEnum
+from functools import lru_cache, partial
+from typing import Any, Callable, ClassVar, Iterator, Optional
+
+
+class Priority(IntEnum):
+    """Lower value is served first"""
+
+    INTERACTIVE = 0
+    NORMAL = 1
+    BACKGROUND = 2
+
+
+_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar(
+    "llm_priority", default=Priority.NORMAL
+)
+
+
+@contextlib.contextmanager
+def priority(level: Priority):
+    """Run every LLM call inside the block with the given priority"""
+    token = _priority.set(level)
+    try:
+        yield level
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> Priority:
+    return _priority.get()
+
+
+@dataclass
+class ServiceLimits:
+    requests_per_minute: float = 500
+    tokens_per_minute: float = 30_000
+
+
+class TokenBucket:
+    """Classic token bucket, refilled continuously at `rate` tokens per second.
+    The level may go negative after `adjust` (we under-estimated a request),
+    in which case callers wait until the debt is paid back."""
+
+    def __init__(self, capacity: float, rate: float, clock: Callable[[], float] = None):
+        self.capacity = capacity
+        self.rate = rate
+        self._clock = clock or time.monotonic
+        self._level = capacity
+        self._updated = self._clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._level = min(
+            self.capacity, self._level + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    @property
+    def level(self) -> float:
+        self._refill()
+        return self._level
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (0 if available now)"""
+        amount = min(amount, self.capacity)  # an oversized request must still pass
+        missing = amount - self.level
+        return 0.0 if missing <= 0 else missing / self.rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self._level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float) -> None:
+        """Correct a previous `take` once the real cost is known"""
+        self._refill()
+        self._level = min(self.capacity, self._level - amount)
+
+
+@dataclass(order=True)
+class _Ticket:
+    priority: int
+    seq: int
+    tokens: float = field(compare=False)
+
+
+@dataclass
+class _ServiceState:
+    limits: ServiceLimits
+    requests: TokenBucket
+    tokens: TokenBucket
+    queue: list[_Ticket] = field(default_factory=list)
+    blocked_until: float = 0.0
+    in_flight: int = 0
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    rate_limited: int = 0
+    retries: int = 0
+
+
+class RateLimited(Exception):
+    """Raised by fake/local providers to signal a 429"""
+
+    status_code = 429
+
+    def __init__(self, retry_after: Optional[float] = None):
+        super().__init__(f"429 Too Many Requests (retry after: {retry_after})")
+        self.retry_after = retry_after
+
+
+def retry_after_from_error(error: Exception) -> Optional[float]:
+    """Seconds to wait if `error` is a rate-limit (429) error, else None.
+    Understands openai/mistral (httpx) errors as well as `RateLimited`."""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(
+        response, "status_code", None
+    )
+    if status != 429:
+        return None
+    if getattr(error, "retry_after", None) is not None:
+        return float(error.retry_after)
+
+    headers = getattr(response, "headers", None) or {}
+    if value := headers.get("retry-after-ms"):
+        with contextlib.suppress(ValueError):
+            return float(value) / 1000
+    if value := headers.get("retry-after"):
+        try:
+            return float(value)
+        except ValueError:
+            with contextlib.suppress(TypeError, ValueError):
+                date = email.utils.parsedate_to_datetime(value)
+                return max(0.0, date.timestamp() - time.time())
+    return 0.0
+
+
+class LLMScheduler:
+    """Coordinates all LLM calls of the process.
+    Callers block in `submit` until they are first in their service's queue
+    and both buckets have room, so there is no dispatcher thread to manage."""
+
+    def __init__(
+        self,
+        default_limits: ServiceLimits = None,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        jitter: float = 0.5,
+        clock: Callable[[], float] = None,
+        sleep: Callable[[float], None] = None,
+    ):
+        self.default_limits = default_limits or ServiceLimits()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self._clock = clock or time.monotonic
+        self._sleep = sleep or time.sleep
+        self._limits: dict[str, ServiceLimits] = {}
+        self._states: dict[str, _ServiceState] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def configure(self, service: str, limits: ServiceLimits) -> None:
+        """Set the limits of a service (refills its buckets)"""
+        with self._cond:
+            self._limits[str(service)] = limits
+            state = self._state(str(service))
+            state.limits = limits
+            state.requests, state.tokens = self._buckets(limits)
+            self._cond.notify_all()
+
+    def _buckets(self, limits: ServiceLimits) -> tuple[TokenBucket, TokenBucket]:
+        rpm, tpm = limits.requests_per_minute, limits.tokens_per_minute
+        return (
+            TokenBucket(rpm, rpm / 60, self._clock),
+            TokenBucket(tpm, tpm / 60, self._clock),
+        )
+
+    def _state(self, service: str) -> _ServiceState:
+        if service not in self._states:
+            limits = self._limits.get(service, self.default_limits)
+            requests, tokens = self._buckets(limits)
+            self._states[service] = _ServiceState(
+                limits=limits, requests=requests, tokens=tokens
+            )
+        return self._states[service]
+
+    def _acquire(self, service: str, tokens: float, level: Priority) -> None:
+        with self._cond:
+            state = self._state(service)
+            ticket = _Ticket(int(level), next(self._seq), tokens)
+            heapq.heappush(state.queue, ticket)
+            try:
+                while True:
+                    if state.queue[0] is ticket:
+                        wait = max(
+                            state.blocked_until - self._clock(),
+                            state.requests.wait_time(1),
+                            state.tokens.wait_time(tokens),
+                        )
+                        if wait <= 0:
+                            break
+                        self._cond.wait(timeout=wait)
+                    else:
+                        self._cond.wait()
+            except BaseException:
+                state.queue.remove(ticket)
+                heapq.heapify(state.queue)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(state.queue)
+            state.requests.take(1)
+            state.tokens.take(tokens)
+            state.in_flight += 1
+            self._cond.notify_all()
+
+    def _release(self, service: str, ok: bool) -> None:
+        with self._cond:
+            state = self._state(service)
+            state.in_flight -= 1
+            if ok:
+                state.completed += 1
+            self._cond.notify_all()
+
+    def report_usage(self, service: str, estimated: float, actual: float) -> None:
+        """Charge the token bucket with the difference once real usage is known"""
+        with self._cond:
+            self._state(str(service)).tokens.adjust(actual - estimated)
+            self._cond.notify_all()
+
+    def _backoff(self, attempt: int, retry_after: float) -> float:
+        delay = min(self.max_delay, max(retry_after, self.base_delay * 2**attempt))
+        return delay * (1 + random.uniform(0, self.jitter))
+
+    def submit(
+        self,
+        service: str,
+        fn: Callable[[], Any],
+        *,
+        tokens: float = 1,
+        level: Optional[Priority] = None,
+    ) -> Any:
+        """Run `fn` once the service's limits allow it, retrying on 429s"""
+        service = str(service)
+        level = current_priority() if level is None else level
+        with self._cond:
+            self._state(service).submitted += 1
+
+        for attempt in itertools.count():
+            self._acquire(service, tokens, level)
+            try:
+                result = fn()
+            except Exception as e:
+                self._release(service, ok=False)
+                retry_after = retry_after_from_error(e)
+                with self._cond:
+                    state = self._state(service)
+                    if retry_after is None or attempt >= self.max_retries:
+                        state.failed += 1
+                        raise
+                    delay = self._backoff(attempt, retry_after)
+                    state.rate_limited += 1
+                    state.retries += 1
+                    # The provider told us to wait: hold back the whole service
+                    state.blocked_until = max(
+                        state.blocked_until, self._clock() + delay
+                    )
+                print(f"[scheduler] {service}: 429, retrying in {delay:.2f}s")
+                self._sleep(delay)
+                continue
+            self._release(service, ok=True)
+            return result
+
+    def stream(
+        self,
+        service: str,
+        fn: Callable[[], Iterator],
+        *,
+        tokens: float = 1,
+        level: Optional[Priority] = None,
+    ) -> Iterator:
+        """Iterate `fn()` holding one slot of the service until it is exhausted
+        (not retried: chunks may already have been consumed)"""
+        service = str(service)
+        level = current_priority() if level is None else level
+        with self._cond:
+            self._state(service).submitted += 1
+        self._acquire(service, tokens, level)
+        ok = False
+        try:
+            yield from fn()
+            ok = True
+        finally:
+            self._release(service, ok=ok)
+            if not ok:
+                with self._cond:
+                    self._state(service).failed += 1
+
+    def queue_depth(self, service: str = None) -> int:
+        with self._cond:
+            if service is not None:
+                state = self._states.get(str(service))
+                return len(state.queue) if state else 0
+            return sum(len(s.queue) for s in self._states.values())
+
+    def metrics(self) -> dict[str, dict]:
+        """Queue depth (total and per priority) and counters for every service"""
+        with self._cond:
+            return {
+                service: {
+                    "queued": len(state.queue),
+                    "queued_by_priority": {
+                        level.name: sum(1 for t in state.queue if t.priority == level)
+                        for level in Priority
+                    },
+                    "in_flight": state.in_flight,
+                    "submitted": state.submitted,
+                    "completed": state.completed,
+                    "failed": state.failed,
+                    "rate_limited": state.rate_limited,
+                    "retries": state.retries,
+                    "requests_available": round(state.requests.level, 2),
+                    "tokens_available": round(state.tokens.level, 2),
+                }
+                for service, state in self._states.items()
+            }
+
+
+SCHEDULER = LLMScheduler()
+
+
+def estimate_tokens(messages: list, max_tokens: Optional[int] = None) -> int:
+    """Rough token estimate (~4 chars per token) used before the real usage is known"""
+    chars = sum(len(str(getattr(m, "content", m))) for m in messages)
+    return chars // 4 + (max_tokens or 256)
+
+
+def _actual_tokens(result) -> Optional[int]:
+    usage = (getattr(result, "llm_output", None) or {}).get("token_usage") or {}
+    return usage.get("total_tokens")
+
+
+class ScheduledChatModelMixin:
+    """Mixed in front of a langchain chat model class (see `scheduled_model`)
+    so that `_generate`, and hence `invoke`, `with_structured_output`, chains etc.,
+    all go through `SCHEDULER` (and so does `_stream`, i.e. `stream`)."""
+
+    scheduler_service: ClassVar[str] = "default"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        estimated = estimate_tokens(messages, getattr(self, "max_tokens", None))
+        fn = partial(
+            super()._generate, messages, stop=stop, run_manager=run_manager, **kwargs
+        )
+        result = SCHEDULER.submit(self.scheduler_service, fn, tokens=estimated)
+        if (actual := _actual_tokens(result)) is not None:
+            SCHEDULER.report_usage(self.scheduler_service, estimated, actual)
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        estimated = estimate_tokens(messages, getattr(self, "max_tokens", None))
+        fn = partial(
+            super()._stream, messages, stop=stop, run_manager=run_manager, **kwargs
+        )
+        yield from SCHEDULER.stream(self.scheduler_service, fn, tokens=estimated)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        return await asyncio.to_thread(
+            self._generate,
+            messages,
+            stop,
+            run_manager and run_manager.get_sync(),
+            **kwargs,
+        )
+
+
+@lru_cache(None)
+def _scheduled_class(model_cls: type, service: str) -> type:
+    return type(
+        f"Scheduled{model_cls.__name__}",
+        (ScheduledChatModelMixin, model_cls),
+        {
+            "__module__": __name__,
+            "__annotations__": {"scheduler_service": ClassVar[str]},
+            "scheduler_service": service,
+        },
+    )
+
+
+def scheduled_model(model, service: str):
+    """Rebuild `model` (with the same arguments) as a scheduler-routed subclass"""
+    if isinstance(model, ScheduledChatModelMixin):
+        return model
+    cls = _scheduled_class(type(model), str(service))
+    return cls(**{name: getattr(model, name) for name in model.model_fields_set})
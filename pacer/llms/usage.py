@@ -0,0 +1,292 @@
+"""Per-call token, cost and latency accounting
+
+`UsageCallbackHandler` is attached to every model `LLMSwitch` hands out and
+stores one `LLMUsage` row per call, tagged with the calling service function
+(`@track`) and the project. Rows are written in batches (`flush`).
+
+Example usage:
+    >>> @track
+    ... def create_quiz(project_name: str): ...
+    >>> project_totals("My Project")
+    >>> latency_report()  # p50/p95 per operation
+"""
+
+import atexit
+import contextlib
+import contextvars
+import functools
+import inspect
+import statistics
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime as dt
+from datetime import timezone
+from typing import Any, Callable, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from sqlalchemy import Integer, cast, func
+
+from pacer.llms import llm_cache
+from pacer.orm import base
+from pacer.orm.llm_usage_orm import LLMUsage
+
+# USD per 1M (prompt, completion) tokens
+PRICES: dict[str, tuple[float, float]] = {
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "mistral-large-latest": (2.0, 6.0),
+    "mistral-small-latest": (0.2, 0.6),
+    "text-embedding-3-large": (0.13, 0.0),
+    "text-embedding-3-small": (0.02, 0.0),
+}
+
+_operation: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "llm_operation", default=None
+)
+_project: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "llm_project", default=None
+)
+
+
+@contextlib.contextmanager
+def tag(operation: str = None, project: str = None):
+    """Tag LLM calls in the block (the outermost operation wins)"""
+    tokens = []
+    if operation and _operation.get() is None:
+        tokens.append((_operation, _operation.set(operation)))
+    if project and _project.get() is None:
+        tokens.append((_project, _project.set(project)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def _project_from_args(bound: inspect.BoundArguments) -> Optional[str]:
+    if project_name := bound.arguments.get("project_name"):
+        return project_name
+    for value in bound.arguments.values():
+        if project := getattr(value, "project_ref", None):
+            return getattr(project, "name", None)
+    return None
+
+
+def track(fn: Callable) -> Callable:
+    """Decorator: LLM calls inside `fn` are accounted to `fn.__name__`
+    (and to its `project_name` argument, if any)"""
+    signature = inspect.signature(fn)
+
+    def _tag(args, kwargs):
+        try:
+            bound = signature.bind_partial(*args, **kwargs)
+            project = _project_from_args(bound)
+        except TypeError:
+            project = None
+        return tag(operation=fn.__name__, project=project)
+
+    if inspect.isgeneratorfunction(fn):  # calls happen while it is iterated
+
+        @functools.wraps(fn)
+        def generator_wrapper(*args, **kwargs):
+            with _tag(args, kwargs):
+                yield from fn(*args, **kwargs)
+
+        return generator_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with _tag(args, kwargs):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def cost_of(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+
+
+def _token_usage(response) -> tuple[int, int]:
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    for generations in response.generations:
+        for gen in generations:
+            if metadata := getattr(getattr(gen, "message", None), "usage_metadata", 0):
+                return metadata.get("input_tokens", 0), metadata.get("output_tokens", 0)
+    return 0, 0
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Records every call of the model it is attached to"""
+
+    def __init__(self, service: str, task: str = None):
+        self.service = str(service)
+        self.task = task and str(task)
+        self._starts: dict[UUID, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, invocation_params: dict = None) -> None:
+        params = invocation_params or {}
+        model = params.get("model_name") or params.get("model")
+        llm_cache.get_llm_cache().last_lookup_hit(reset=True)
+        with self._lock:
+            self._starts[run_id] = (
+                time.perf_counter(),
+                _operation.get(),
+                _project.get(),
+                model,
+            )
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs):
+        self._start(run_id, kwargs.get("invocation_params"))
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs):
+        self._start(run_id, kwargs.get("invocation_params"))
+
+    def _stop(self, run_id: UUID, response=None) -> None:
+        with self._lock:
+            start = self._starts.pop(run_id, None)
+        if start is None:
+            return
+        started, operation, project, model = start
+        prompt_tokens, completion_tokens = (
+            _token_usage(response) if response else (0, 0)
+        )
+        llm_output = (response and response.llm_output) or {}
+        model = llm_output.get("model_name") or llm_output.get("model") or model
+        cache_hit = response is not None and llm_cache.get_llm_cache().last_lookup_hit()
+        record(
+            LLMUsage(
+                project_name=project,
+                operation=operation or "unknown",
+                task=self.task,
+                service=self.service,
+                model=model,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                cost=(
+                    0.0
+                    if cache_hit
+                    else cost_of(model, prompt_tokens, completion_tokens)
+                ),
+                latency=time.perf_counter() - started,
+                cache_hit=cache_hit,
+                error=response is None,
+            )
+        )
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any):
+        self._stop(run_id, response)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._stop(run_id)
+
+
+FLUSH_EVERY = 2.0  # seconds between writes of the recorded rows
+FLUSH_SIZE = 50  # ... or as soon as this many are pending
+
+_pending: list[LLMUsage] = []
+_pending_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+
+def _session():
+    return base.make_session()()
+
+
+def record(usage: LLMUsage) -> None:
+    """Queue a row; rows are written in batches (see `flush`)"""
+    with _pending_lock:
+        _pending.append(usage)
+        due = (
+            len(_pending) >= FLUSH_SIZE or time.monotonic() - _flushed_at >= FLUSH_EVERY
+        )
+    if due:
+        flush()
+
+
+def flush() -> None:
+    """Write the queued rows in one transaction"""
+    global _flushed_at
+    with _pending_lock:
+        rows = _pending[:]
+        _pending.clear()
+        _flushed_at = time.monotonic()
+    if not rows:
+        return
+    try:
+        with _session() as session:
+            session.add_all(rows)
+            session.commit()
+    except Exception as e:  # accounting must never break an LLM call
+        print(f"[usage] could not record {len(rows)} LLM calls: {e}")
+
+
+atexit.register(flush)
+
+
+def project_totals(project_name: str = None) -> list[dict]:
+    """Token/cost totals per project and operation"""
+    flush()
+    with _session() as session:
+        query = session.query(
+            LLMUsage.project_name,
+            LLMUsage.operation,
+            func.count(LLMUsage.id),
+            func.sum(LLMUsage.prompt_tokens),
+            func.sum(LLMUsage.completion_tokens),
+            func.sum(LLMUsage.cost),
+            func.sum(cast(LLMUsage.cache_hit, Integer)),
+        ).group_by(LLMUsage.project_name, LLMUsage.operation)
+        if project_name:
+            query = query.filter(LLMUsage.project_name == project_name)
+        return [
+            dict(
+                project=project,
+                operation=operation,
+                calls=calls,
+                prompt_tokens=prompt or 0,
+                completion_tokens=completion or 0,
+                cost=round(cost or 0, 6),
+                cache_hits=hits or 0,
+            )
+            for project, operation, calls, prompt, completion, cost, hits in query
+        ]
+
+
+def latency_report(project_name: str = None, since: dt = None) -> list[dict]:
+    """p50/p95 latency (seconds) per operation"""
+    flush()
+    with _session() as session:
+        query = session.query(LLMUsage.operation, LLMUsage.latency).filter(
+            LLMUsage.error.is_(False)
+        )
+        if project_name:
+            query = query.filter(LLMUsage.project_name == project_name)
+        if since:
+            query = query.filter(LLMUsage.created_at >= since.astimezone(timezone.utc))
+        latencies = defaultdict(list)
+        for operation, latency in query:
+            latencies[operation].append(latency)
+
+    report = []
+    for operation, values in sorted(latencies.items()):
+        quantiles = (
+            statistics.quantiles(values, n=20, method="inclusive")
+            if len(values) > 1
+            else values * 19
+        )
+        report.append(
+            dict(
+                operation=operation,
+                calls=len(values),
+                p50=round(quantiles[9], 3),
+                p95=round(quantiles[18], 3),
+                total=round(sum(values), 3),
+            )
+        )
+    return report
@@ -39,6 +39,18 @@ class JupyterCells(BaseModel):
         return cls(cells=cells)
 
 
+class NotebookSection(BaseModel):
+    """One section of a notebook outline"""
+
+    title: str
+    description: str = Field(description="What the section teaches")
+    query: str = Field(description="Search query for the section's source material")
+
+
+class NotebookOutline(BaseModel):
+    sections: list[NotebookSection]
+
+
 if __name__ == "__main__":
     import IPython
 
@@ -1,11 +1,13 @@
 import base64
+import io
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, BinaryIO, Callable, Optional
 from uuid import UUID
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, PrivateAttr
 
 from pacer.models.project_model import ProjectData
+from pacer.orm.blob_store import get_blob_store
 from pacer.orm.file_orm import FileStatus, FileType
 
 
@@ -18,18 +20,58 @@ class FileEntryBase(BaseModel):
 
 
 class FileEntry(FileEntryBase):
+    """A file of a project. Stored payloads live in the blob store (`content_hash`);
+    `content` holds a payload not stored yet (or of a row stored before blobs).
+    Listed entries (`services.list_files`) fetch `content` on first read."""
+
     title: str = Field(None, repr=False)
-    content: str = Field(..., repr=False)
+    content: str | bytes = Field("", repr=False)
+    content_hash: Optional[str] = Field(None, repr=False)
+    size: Optional[int] = None
     status: FileStatus = FileStatus.CREATED
     data: Optional[dict] = Field(default_factory=dict, repr=False)
     project_ref: ProjectData = Field(default=None, repr=False)
 
-    @field_validator("content", mode="before")
+    _load_content: Optional[Callable[[], str]] = PrivateAttr(default=None)
+
     @classmethod
-    def convert_bytes_to_str(cls, value: str | bytes) -> str:
-        if isinstance(value, bytes):
-            return base64.b64encode(value).decode("utf-8")  # Encode to base64
-        return value
+    def listed(cls, load_content: Callable[[], str], **fields) -> "FileEntry":
+        """An entry without its payload, `load_content` fetches it when read"""
+        entry = cls(**fields)
+        entry._load_content = load_content
+        return entry
+
+    def payload(self) -> str | bytes:
+        """`content`, loaded first for listed entries (empty once in the blob store)"""
+        if not self.content and self._load_content:
+            self.content = self._load_content()
+            self._load_content = None
+        return self.content
+
+    def read_bytes(self) -> bytes:
+        if self.content_hash:
+            return get_blob_store().get(self.content_hash)
+        content = self.payload()
+        if isinstance(content, bytes):
+            return content
+        if self.type_ == FileType.PDF:  # stored as base64 before blobs
+            return base64.b64decode(content)
+        return content.encode("utf-8")
+
+    def read_text(self) -> str:
+        if not self.content_hash and isinstance(content := self.payload(), str):
+            return content
+        return self.read_bytes().decode("utf-8", errors="replace")
+
+    def open(self) -> BinaryIO:
+        """The payload as a binary stream (not read into memory at once)"""
+        if self.content_hash:
+            return get_blob_store().open(self.content_hash)
+        return io.BytesIO(self.read_bytes())
+
+    def path(self) -> Optional[Path]:
+        """A (memory-mappable) file with the payload, once stored"""
+        return get_blob_store().path(self.content_hash) if self.content_hash else None
 
     def model_post_init(self, *args, **kwargs):
         if self.type_ == FileType.AUTO:
@@ -0,0 +1,29 @@
+from datetime import datetime as dt
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from pacer.orm.job_orm import ACTIVE, JobKind, JobStatus
+
+
+class JobInfo(BaseModel):
+    id: str
+    kind: JobKind
+    key: str
+    project_name: Optional[str] = None
+    payload: dict = Field(default_factory=dict, repr=False)
+    status: JobStatus
+    attempts: int = 0
+    max_attempts: int = 3
+    progress: Optional[float] = None
+    message: str = ""
+    error: Optional[str] = None
+    created_at: dt = Field(default=None, repr=False)
+    finished_at: Optional[dt] = Field(default=None, repr=False)
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE
+
+    class Config:
+        from_attributes = True  # Enables ORM support
@@ -1,10 +1,13 @@
 import os
+from enum import StrEnum, auto
 from functools import lru_cache
 from pathlib import Path
 
-from sqlalchemy import create_engine
+from sqlalchemy import Delete, Insert, Update, create_engine, event, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.elements import TextClause
 
 from pacer.config import consts
 
@@ -16,20 +19,134 @@ if TEST_DB_PATH.exists():
 
 Base = declarative_base()
 
+BUSY_TIMEOUT = 30  # seconds a connection waits for a lock before "database is locked"
+POOL_SIZE = 8  # connections kept per engine (Streamlit runs a thread per session)
+MAX_OVERFLOW = 16
 
-@lru_cache(1)
-def make_session(db_path: Path = DB_PATH):
-    """Create a `Session` class (not the object)"""
+
+class EngineMode(StrEnum):
+    SIMPLE = auto()  # SQLite defaults
+    PRODUCTION = auto()  # WAL, busy timeout and a pool sized for threads
+
+
+def _upgrade_tables(engine) -> None:
+    """Add columns and indexes introduced after a table was created
+    (`create_all` only creates missing tables)"""
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    type_ = column.type.compile(engine.dialect)
+                    add = f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {type_}'
+                    conn.execute(text(add))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+def _set_pragmas(dbapi_connection, _record, *, query_only: bool = False) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")  # readers don't block the writer
+    cursor.execute("PRAGMA synchronous=NORMAL")  # safe with WAL, fewer fsyncs
+    cursor.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT * 1000}")
+    if query_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def make_engine(
+    db_path: Path = DB_PATH, mode: EngineMode = EngineMode.PRODUCTION, **kwargs
+) -> Engine:
+    query_only = kwargs.pop("query_only", False)
+    if mode == EngineMode.SIMPLE:
+        return create_engine(f"sqlite:///{db_path}", **kwargs)
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        connect_args={"timeout": BUSY_TIMEOUT, "check_same_thread": False},
+        pool_size=kwargs.pop("pool_size", POOL_SIZE),
+        max_overflow=kwargs.pop("max_overflow", MAX_OVERFLOW),
+        pool_timeout=BUSY_TIMEOUT,
+        **kwargs,
+    )
+    event.listen(
+        engine,
+        "connect",
+        lambda conn, record: _set_pragmas(conn, record, query_only=query_only),
+    )
+    return engine
+
+
+class RoutingSession(Session):
+    """Reads on the read engine. Writes, and everything after a write until the
+    transaction ends (so a session reads its own writes), on the write engine,
+    as is `session.connection()` (e.g. for DDL or `VACUUM`)."""
+
+    writer: Engine = None
+    reader: Engine = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wrote = False
+        event.listen(self, "before_flush", self._write)
+        event.listen(self, "after_transaction_end", self._end)
+
+    def _write(self, *args) -> None:
+        self._wrote = True
+
+    def _end(self, session, transaction) -> None:
+        if transaction.parent is None:
+            self._wrote = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if (
+            self._wrote
+            or isinstance(clause, (Insert, Update, Delete, TextClause))
+            or (mapper is None and clause is None)  # `session.connection()`
+        ):
+            self._wrote = True
+            return self.writer
+        return self.reader
+
+
+@lru_cache(None)
+def make_session(
+    db_path: Path = DB_PATH,
+    mode: EngineMode = EngineMode.PRODUCTION,
+    split_reads: bool = False,
+):
+    """Create a `Session` class (not the object)
+
+    Args:
+        mode: `PRODUCTION` is safe for concurrent sessions (threads)
+        split_reads: a single-connection writer and a pool of read-only readers
+    """
 
     from pacer.orm import (  # So tables created before engine starts
         chat_message_orm,
         file_orm,
+        job_orm,
         jupyter_cell_orm,
+        llm_usage_orm,
         note_orm,
         project_orm,
+        quiz_review_orm,
     )
 
-    engine = create_engine(f"sqlite:///{db_path}")
-    Base.metadata.create_all(engine)
-    Session = sessionmaker(bind=engine, autoflush=False)
-    return Session
+    if split_reads and mode == EngineMode.PRODUCTION:
+        # SQLite has one writer at a time: queue writers in the pool, not on locks
+        writer = make_engine(db_path, mode, pool_size=1, max_overflow=0)
+    else:
+        writer = make_engine(db_path, mode)
+    Base.metadata.create_all(writer)
+    _upgrade_tables(writer)
+    if not split_reads:
+        return sessionmaker(bind=writer, autoflush=False)
+
+    reader = make_engine(db_path, mode, query_only=True)
+    routing = type(
+        "RoutingSession", (RoutingSession,), dict(writer=writer, reader=reader)
+    )
+    return sessionmaker(class_=routing, autoflush=False)
@@ -0,0 +1,139 @@
+"""Content-addressed, compressed storage of file payloads
+Blobs are keyed by the SHA-256 of their bytes (so the same document uploaded
+to several projects is stored once) and gzip-compressed on disk. `File` rows
+only keep the hash and the size.
+
+Example usage:
+    >>> store = get_blob_store()
+    >>> digest, size = store.put(pdf_bytes)
+    >>> with store.open(digest) as fl:  # streamed decompression
+    ...     header = fl.read(5)
+    >>> store.mmap(digest)[:5]  # a decompressed copy, memory-mapped
+    b'%PDF-'
+
+Decompressed copies are a cache bounded by `PLAIN_CACHE_BYTES` (least
+recently used copies are removed). Hold `store.lock` between checking that
+no row references a blob and deleting it, and between `put` and committing
+the row referencing it.
+"""
+
+import gzip
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO
+
+from pacer.config import consts
+
+BLOB_DIR = consts.ROOT_DIR / ".blobs"
+COMPRESS_LEVEL = 6
+PLAIN_CACHE_BYTES = 512 * 2**20  # decompressed copies kept on disk
+
+
+class BlobStore:
+    def __init__(
+        self,
+        root: Path = BLOB_DIR,
+        level: int = COMPRESS_LEVEL,
+        cache_bytes: int = PLAIN_CACHE_BYTES,
+    ):
+        self.root = Path(root)
+        self.level = level
+        self.cache_bytes = cache_bytes
+        self.lock = threading.RLock()  # references are checked, blobs added/deleted
+        self.cache_dir = self.root / ".plain"  # decompressed copies (for mmap/paths)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest[2:]}.gz"
+
+    def _write(self, path: Path, write) -> None:
+        """Atomic: readers never see a partial blob"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fl:
+                write(fl)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def put(self, data: bytes) -> tuple[str, int]:
+        """Store `data` (once) and return its (hash, size)"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not path.exists():
+            self._write(
+                path,
+                lambda fl: fl.write(gzip.compress(data, self.level, mtime=0)),
+            )
+        return digest, len(data)
+
+    def exists(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+    def open(self, digest: str) -> BinaryIO:
+        """The blob as a (decompressing) binary stream"""
+        return gzip.open(self._path(digest), "rb")
+
+    def get(self, digest: str) -> bytes:
+        with self.open(digest) as fl:
+            return fl.read()
+
+    def path(self, digest: str) -> Path:
+        """A decompressed copy on disk (cached), e.g. for `PyPDFLoader`"""
+        plain = self.cache_dir / digest
+        try:
+            os.utime(plain)  # most recently used
+            return plain
+        except FileNotFoundError:
+            pass
+        with self.open(digest) as src:
+            self._write(plain, lambda fl: shutil.copyfileobj(src, fl))
+        self._evict(keep=plain)
+        return plain
+
+    def _evict(self, keep: Path) -> None:
+        """Remove the least recently used copies beyond `cache_bytes`
+        (open files and maps stay readable)"""
+        copies = []
+        for plain in self.cache_dir.iterdir():
+            try:
+                stat = plain.stat()
+            except FileNotFoundError:  # evicted by another thread
+                continue
+            if plain.suffix != ".tmp":
+                copies.append((stat.st_mtime, stat.st_size, plain))
+        total = sum(size for _, size, _ in copies)
+        for _, size, plain in sorted(copies):
+            if total <= self.cache_bytes:
+                break
+            if plain != keep:
+                plain.unlink(missing_ok=True)
+                total -= size
+
+    def mmap(self, digest: str) -> mmap.mmap | bytes:
+        """Read-only memory map of the decompressed blob"""
+        with open(self.path(digest), "rb") as fl:
+            if os.fstat(fl.fileno()).st_size == 0:
+                return b""  # empty files cannot be mapped
+            return mmap.mmap(fl.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def delete(self, digest: str) -> None:
+        for path in (self._path(digest), self.cache_dir / digest):
+            path.unlink(missing_ok=True)
+
+    def disk_usage(self) -> int:
+        """Bytes of the compressed blobs"""
+        return sum(p.stat().st_size for p in self.root.glob("??/*.gz"))
+
+
+@lru_cache(1)
+def get_blob_store() -> BlobStore:
+    return BlobStore()
@@ -1,19 +1,46 @@
 import uuid
+from datetime import datetime as dt
+from datetime import timezone
+from enum import StrEnum, auto
 
-from sqlalchemy import UUID, VARCHAR, Column, ForeignKey, Null, Text
+from sqlalchemy import (
+    UUID,
+    VARCHAR,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    Text,
+)
 from sqlalchemy.orm import relationship
 
 from pacer.orm.base import Base
 
 
+class MessageCategory(StrEnum):
+    SUMMARY = auto()  # the rolling summary of the messages up to `position`
+
+
 class ChatMessage(Base):
+    """One chat message, ordered by `position` (see `pacer.tools.chat_history`)"""
+
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        Index("ix_chat_messages_project_position", "project_id", "position"),
+    )
 
     id = Column(
         UUID(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4())
     )
-    project_id = Column(UUID(as_uuid=False), ForeignKey("projects.id"), nullable=False)
+    project_id = Column(
+        UUID(as_uuid=False), ForeignKey("projects.id"), nullable=False, index=True
+    )
+    position = Column(Integer, default=0, nullable=False)
     type = Column(VARCHAR, nullable=False)
-    category = Column(VARCHAR, default=Null, nullable=True)
+    category = Column(VARCHAR, nullable=True)  # `MessageCategory`, None: chat
     content = Column(Text, default="", nullable=False)
+    created_at = Column(
+        DateTime(timezone=True), default=lambda: dt.now(timezone.utc), nullable=True
+    )
     project_ref = relationship("Project", back_populates="chat_messages")
@@ -3,8 +3,18 @@ from enum import StrEnum
 from typing import Optional
 
 from pydantic import BaseModel
-from sqlalchemy import JSON, UUID, Column, ForeignKey, Integer, Null, String, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    JSON,
+    UUID,
+    Column,
+    ForeignKey,
+    Index,
+    Integer,
+    Null,
+    String,
+    Text,
+)
+from sqlalchemy.orm import deferred, relationship
 
 from pacer.orm.base import Base
 
@@ -48,14 +58,18 @@ class FileType(StrEnum):
 
 class File(Base):
     __tablename__ = "files"
+    __table_args__ = (Index("ix_files_project_filepath", "project_id", "filepath"),)
 
     id = Column(
         UUID(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4())
     )
     project_id = Column(UUID(as_uuid=False), ForeignKey("projects.id"), nullable=False)
     type = Column(Text, default=FileType.TEXT, nullable=False)
-    filepath = Column(String, nullable=False)
-    content = Column(Text, nullable=False)
+    filepath = Column(String, nullable=False, index=True)
+    # Rows stored before the blob store; deferred so listing never loads payloads
+    content = deferred(Column(Text, default="", nullable=False))
+    content_hash = Column(String(64), index=True)  # see `pacer.orm.blob_store`
+    size = Column(Integer)
     status = Column(Text, default=str(FileStatus.CREATED), nullable=True)
     data = Column(JSON, default=dict)
 
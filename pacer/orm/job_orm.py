@@ -0,0 +1,67 @@
+import uuid
+from datetime import datetime as dt
+from datetime import timezone
+from enum import StrEnum, auto
+
+from sqlalchemy import (
+    JSON,
+    UUID,
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    String,
+    Text,
+)
+
+from pacer.orm.base import Base
+
+
+class JobStatus(StrEnum):
+    QUEUED = auto()
+    RUNNING = auto()
+    SUCCEEDED = auto()
+    FAILED = auto()
+
+
+class JobKind(StrEnum):
+    SUMMARY = auto()
+    QUIZ = auto()
+    NOTEBOOK = auto()
+
+
+ACTIVE = (JobStatus.QUEUED, JobStatus.RUNNING)
+
+
+class Job(Base):
+    """One background job (see `pacer.tools.job_queue`)"""
+
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+        Index("ix_jobs_key_status", "key", "status"),
+    )
+
+    id = Column(
+        UUID(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    kind = Column(String, nullable=False)
+    key = Column(String, nullable=False)  # one active job per key
+    project_name = Column(String, nullable=True, index=True)
+    payload = Column(JSON, default=dict)
+    status = Column(String, default=JobStatus.QUEUED, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=3, nullable=False)
+    progress = Column(Float, nullable=True)  # 0..1, None when unknown
+    message = Column(Text, default="", nullable=False)
+    error = Column(Text, nullable=True)
+    worker = Column(String, nullable=True)
+    run_at = Column(
+        DateTime(timezone=True), default=lambda: dt.now(timezone.utc), nullable=False
+    )
+    created_at = Column(
+        DateTime(timezone=True), default=lambda: dt.now(timezone.utc), nullable=False
+    )
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
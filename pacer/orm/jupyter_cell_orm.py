@@ -1,19 +1,45 @@
 import uuid
+from datetime import datetime as dt
+from datetime import timezone
 from enum import StrEnum, auto
 
-from sqlalchemy import UUID, VARCHAR, Column, ForeignKey, Text
+from sqlalchemy import (
+    JSON,
+    UUID,
+    VARCHAR,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    Text,
+)
 from sqlalchemy.orm import relationship
 
 from pacer.orm.base import Base
 
 
 class JupyterCell(Base):
+    """One notebook cell, ordered by `position` (see `pacer.tools.notebook_store`)"""
+
     __tablename__ = "jupyter_cells"
+    __table_args__ = (
+        Index("ix_jupyter_cells_project_position", "project_id", "position"),
+    )
 
     id = Column(
         UUID(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4())
     )
     project_id = Column(UUID(as_uuid=False), ForeignKey("projects.id"), nullable=False)
+    position = Column(Integer, default=0, nullable=False)
     type = Column(VARCHAR, default="python", nullable=False)
     content = Column(Text, default="", nullable=False)
+    outputs = Column(JSON, default=list)
+    cell_metadata = Column("metadata", JSON, default=dict)
+    execution_count = Column(Integer, nullable=True)
+    updated_at = Column(
+        DateTime(timezone=True),
+        default=lambda: dt.now(timezone.utc),
+        onupdate=lambda: dt.now(timezone.utc),
+    )
     project_ref = relationship("Project", back_populates="jupyter_cells")
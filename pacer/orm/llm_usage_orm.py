@@ -0,0 +1,31 @@
+import uuid
+from datetime import datetime as dt
+from datetime import timezone
+
+from sqlalchemy import UUID, Boolean, Column, DateTime, Float, Integer, String
+
+from pacer.orm.base import Base
+
+
+class LLMUsage(Base):
+    """One row per LLM call (see `pacer.llms.usage`)"""
+
+    __tablename__ = "llm_usage"
+
+    id = Column(
+        UUID(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    project_name = Column(String, nullable=True, index=True)
+    operation = Column(String, nullable=False, index=True)
+    task = Column(String, nullable=True)
+    service = Column(String, nullable=True)
+    model = Column(String, nullable=True)
+    prompt_tokens = Column(Integer, default=0, nullable=False)
+    completion_tokens = Column(Integer, default=0, nullable=False)
+    cost = Column(Float, default=0.0, nullable=False)
+    latency = Column(Float, nullable=False)
+    cache_hit = Column(Boolean, default=False, nullable=False)
+    error = Column(Boolean, default=False, nullable=False)
+    created_at = Column(
+        DateTime(timezone=True), default=lambda: dt.now(timezone.utc), nullable=False
+    )
@@ -12,6 +12,8 @@ class Note(Base):
     id = Column(
         UUID(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4())
     )
-    project_id = Column(UUID(as_uuid=False), ForeignKey("projects.id"), nullable=False)
+    project_id = Column(
+        UUID(as_uuid=False), ForeignKey("projects.id"), nullable=False, index=True
+    )
     content = Column(Text, default="", nullable=False)
     project_ref = relationship("Project", back_populates="notes")
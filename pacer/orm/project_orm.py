@@ -30,3 +30,6 @@ class Project(Base):
     chat_messages = relationship(
         "ChatMessage", back_populates="project_ref", cascade="all, delete-orphan"
     )
+    quiz_reviews = relationship(
+        "QuizReview", back_populates="project_ref", cascade="all, delete-orphan"
+    )
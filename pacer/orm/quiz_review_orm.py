@@ -0,0 +1,42 @@
+import uuid
+from datetime import datetime as dt
+from datetime import timezone
+
+from sqlalchemy import (
+    UUID,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Integer,
+    String,
+    UniqueConstraint,
+)
+from sqlalchemy.orm import relationship
+
+from pacer.orm.base import Base
+
+
+class QuizReview(Base):
+    """Spaced-repetition state of one quiz question (see `pacer.quiz.practice`)"""
+
+    __tablename__ = "quiz_reviews"
+    __table_args__ = (UniqueConstraint("project_id", "question_key"),)
+
+    id = Column(
+        UUID(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    project_id = Column(
+        UUID(as_uuid=False), ForeignKey("projects.id"), nullable=False, index=True
+    )
+    question_key = Column(String, nullable=False)
+    repetitions = Column(Integer, default=0, nullable=False)
+    interval = Column(Float, default=0.0, nullable=False)  # days
+    ease = Column(Float, default=2.5, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    correct = Column(Integer, default=0, nullable=False)
+    due_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    reviewed_at = Column(
+        DateTime(timezone=True), default=lambda: dt.now(timezone.utc), nullable=False
+    )
+    project_ref = relationship("Project", back_populates="quiz_reviews")
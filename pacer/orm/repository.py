@@ -0,0 +1,87 @@
+"""Project-scoped queries
+A project name is resolved to its id once (cached per database), then the
+child tables are queried by their indexed `project_id` instead of loading the
+`Project` and walking its lazy relationships. `project` eager-loads
+(`selectinload`) only the relationships a caller asks for.
+
+Example usage:
+    >>> projects = get_project_repository()
+    >>> with SessionLocal() as session:
+    ...     notes = projects.notes(session, "My Project")
+    ...     project = projects.project(session, "My Project", "files", "notes")
+"""
+
+import threading
+from functools import lru_cache
+from typing import Optional
+
+from sqlalchemy.orm import Session, selectinload
+
+from pacer.orm.chat_message_orm import ChatMessage
+from pacer.orm.note_orm import Note
+from pacer.orm.project_orm import Project
+
+
+class ProjectRepository:
+    def __init__(self):
+        self._ids: dict[tuple[str, str], str] = {}  # (database, name) -> id
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _database(session: Session) -> str:
+        return str(session.get_bind().url)
+
+    def project_id(self, session: Session, name: str) -> Optional[str]:
+        key = (self._database(session), name)
+        if (project_id := self._ids.get(key)) is None:
+            project_id = session.query(Project.id).filter(Project.name == name).scalar()
+            if project_id is not None:
+                with self._lock:
+                    self._ids[key] = project_id
+        return project_id
+
+    def remember(self, session: Session, project: Project) -> None:
+        with self._lock:
+            self._ids[(self._database(session), project.name)] = project.id
+
+    def forget(self, name: str) -> None:
+        """Drop the cached id (the project was deleted or renamed)"""
+        with self._lock:
+            for key in [key for key in self._ids if key[1] == name]:
+                del self._ids[key]
+
+    def project(
+        self, session: Session, name: str, *relationships: str
+    ) -> Optional[Project]:
+        """The project, with `relationships` (e.g. "files") loaded eagerly"""
+        if (project_id := self.project_id(session, name)) is None:
+            return None
+        options = [selectinload(getattr(Project, rel)) for rel in relationships]
+        return session.get(Project, project_id, options=options)
+
+    def data(self, session: Session, name: str) -> Optional[dict]:
+        """`Project.data` alone (quiz items, buffers)"""
+        if (project_id := self.project_id(session, name)) is None:
+            return None
+        data = session.query(Project.data).filter(Project.id == project_id).scalar()
+        return data or {}
+
+    def notes(self, session: Session, name: str) -> list[Note]:
+        return (
+            session.query(Note)
+            .filter(Note.project_id == self.project_id(session, name))
+            .all()
+        )
+
+    def chat_messages(self, session: Session, name: str) -> list[ChatMessage]:
+        return (
+            session.query(ChatMessage)
+            .filter(ChatMessage.project_id == self.project_id(session, name))
+            .order_by(ChatMessage.position)
+            .all()
+        )
+
+
+@lru_cache(1)
+def get_project_repository() -> ProjectRepository:
+    return ProjectRepository()
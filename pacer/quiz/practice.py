@@ -0,0 +1,298 @@
+"""Spaced-repetition practice (SM-2)
+Each question has a review state. A heap ordered by due time gives the next
+`n` due questions in O(n log N), and review results are persisted in batches.
+
+Example usage:
+    >>> practice = Practice("My Project", [q.question for q in quiz.questions])
+    >>> for state in practice.due(n=10):
+    ...     practice.review(state.key, Grade.GOOD)
+    >>> practice.flush()
+"""
+
+import hashlib
+import heapq
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field, replace
+from datetime import datetime as dt
+from datetime import timezone
+from enum import IntEnum
+from typing import Callable, Iterable, Optional
+
+from pacer.orm import base
+from pacer.orm.quiz_review_orm import QuizReview
+from pacer.orm.repository import get_project_repository
+
+DAY = 24 * 3600
+RELEARN_DELAY = 10 * 60  # seconds until a failed question is due again
+MIN_EASE = 1.3
+
+
+class Grade(IntEnum):
+    """SM-2 response quality"""
+
+    AGAIN = 1
+    HARD = 3
+    GOOD = 4
+    EASY = 5
+
+
+def question_key(question: str) -> str:
+    normalized = " ".join(question.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+
+@dataclass
+class ReviewState:
+    key: str
+    repetitions: int = 0
+    interval: float = 0.0  # days
+    ease: float = 2.5
+    attempts: int = 0
+    correct: int = 0
+    due: float = 0.0  # unix time
+    reviewed: Optional[float] = None
+
+
+def schedule(state: ReviewState, grade: Grade, now: float = None) -> ReviewState:
+    """SM-2: the next review state after answering with `grade`"""
+    now = time.time() if now is None else now
+    q = int(grade)
+    ease = max(MIN_EASE, state.ease + 0.1 - (5 - q) * (0.08 + (5 - q) * 0.02))
+    if q < Grade.HARD:
+        repetitions, interval = 0, 0.0
+        due = now + RELEARN_DELAY
+    else:
+        repetitions = state.repetitions + 1
+        if repetitions == 1:
+            interval = 1.0
+        elif repetitions == 2:
+            interval = 6.0
+        else:
+            interval = state.interval * ease
+        due = now + interval * DAY
+    return replace(
+        state,
+        repetitions=repetitions,
+        interval=interval,
+        ease=ease,
+        attempts=state.attempts + 1,
+        correct=state.correct + (q >= Grade.HARD),
+        due=due,
+        reviewed=now,
+    )
+
+
+class DueQueue:
+    """Min-heap of `(due, key)` with lazy deletion of stale entries.
+    A second heap feeds the due count: entries move into `_counted` as their
+    due time passes, so `count_due` is O(log N) per newly due state."""
+
+    def __init__(self, states: Iterable[ReviewState] = ()):
+        self.states: dict[str, ReviewState] = {s.key: s for s in states}
+        self._heap = [(s.due, s.key) for s in self.states.values()]
+        heapq.heapify(self._heap)
+        self._upcoming = list(self._heap)  # not counted as due yet
+        self._counted: set[str] = set()  # due by `_counted_until`
+        self._counted_until = float("-inf")
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def push(self, state: ReviewState) -> None:
+        self.states[state.key] = state
+        heapq.heappush(self._heap, (state.due, state.key))
+        self._counted.discard(state.key)
+        if state.due <= self._counted_until:
+            self._counted.add(state.key)
+        else:
+            heapq.heappush(self._upcoming, (state.due, state.key))
+
+    def remove(self, key: str) -> None:
+        self.states.pop(key, None)  # its heap entries become stale
+        self._counted.discard(key)
+
+    def _valid(self, entry: tuple[float, str]) -> bool:
+        state = self.states.get(entry[1])
+        return state is not None and state.due == entry[0]
+
+    def _compact(self, heap: list) -> list:
+        if len(heap) > 2 * len(self.states) + 64:  # drop stale entries
+            heap = [e for e in heap if self._valid(e)]
+            heapq.heapify(heap)
+        return heap
+
+    def due(self, now: float = None, n: int = 10) -> list[ReviewState]:
+        """Up to `n` states due by `now`, most overdue first"""
+        now = time.time() if now is None else now
+        taken = []
+        while self._heap and len(taken) < n and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if self._valid(entry):
+                taken.append(entry)
+        for entry in taken:
+            heapq.heappush(self._heap, entry)
+        self._heap = self._compact(self._heap)
+        return [self.states[key] for _, key in taken]
+
+    def count_due(self, now: float = None) -> int:
+        now = time.time() if now is None else now
+        if now < self._counted_until:  # asked about the past: count again
+            self._upcoming = [(s.due, s.key) for s in self.states.values()]
+            heapq.heapify(self._upcoming)
+            self._counted, self._counted_until = set(), float("-inf")
+        while self._upcoming and self._upcoming[0][0] <= now:
+            entry = heapq.heappop(self._upcoming)
+            if self._valid(entry):
+                self._counted.add(entry[1])
+        self._counted_until = now
+        self._upcoming = self._compact(self._upcoming)
+        return len(self._counted)
+
+
+def _to_dt(timestamp: Optional[float]) -> Optional[dt]:
+    return None if timestamp is None else dt.fromtimestamp(timestamp, timezone.utc)
+
+
+def _to_ts(value: Optional[dt]) -> Optional[float]:
+    if value is None:
+        return None
+    if value.tzinfo is None:  # SQLite drops the timezone
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def load_states(project_name: str) -> list[ReviewState]:
+    SessionLocal = base.make_session()
+    with SessionLocal() as session:
+        project_id = get_project_repository().project_id(session, project_name)
+        rows = session.query(QuizReview).filter(QuizReview.project_id == project_id)
+        return [
+            ReviewState(
+                key=row.question_key,
+                repetitions=row.repetitions,
+                interval=row.interval,
+                ease=row.ease,
+                attempts=row.attempts,
+                correct=row.correct,
+                due=_to_ts(row.due_at),
+                reviewed=_to_ts(row.reviewed_at),
+            )
+            for row in rows
+        ]
+
+
+def save_states(project_name: str, states: list[ReviewState]) -> None:
+    """Upsert review states in one transaction"""
+    if not states:
+        return
+    SessionLocal = base.make_session()
+    with SessionLocal() as session:
+        project_id = get_project_repository().project_id(session, project_name)
+        if project_id is None:
+            return
+        keys = [s.key for s in states]
+        rows = {
+            row.question_key: row
+            for row in session.query(QuizReview).filter(
+                QuizReview.project_id == project_id,
+                QuizReview.question_key.in_(keys),
+            )
+        }
+        for state in states:
+            row = rows.get(state.key)
+            if row is None:
+                row = QuizReview(project_id=project_id, question_key=state.key)
+                session.add(row)
+            row.repetitions = state.repetitions
+            row.interval = state.interval
+            row.ease = state.ease
+            row.attempts = state.attempts
+            row.correct = state.correct
+            row.due_at = _to_dt(state.due)
+            row.reviewed_at = _to_dt(state.reviewed or time.time())
+        session.commit()
+
+
+def _flush_pending(project_name: str, pending: dict, save: Callable) -> None:
+    """Last flush of a dropped `Practice` (or at exit)"""
+    if pending:
+        try:
+            save(project_name, list(pending.values()))
+            pending.clear()
+        except Exception as e:
+            print(f"[practice] could not save {len(pending)} reviews: {e}")
+
+
+@dataclass
+class Practice:
+    """Due queue of a project's questions with batched persistence
+    (pending reviews are also saved when the object is dropped, or at exit)"""
+
+    project_name: str
+    questions: list[str] = field(default_factory=list)
+    batch_size: int = 20
+    flush_every: float = 60.0  # seconds
+    load: Callable[[str], list[ReviewState]] = load_states
+    save: Callable[[str, list[ReviewState]], None] = save_states
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+        self._pending: dict[str, ReviewState] = {}
+        self._last_flush = time.monotonic()
+        self.version = None
+        self.queue = DueQueue(self.load(self.project_name))
+        self.sync(self.questions)
+        weakref.finalize(
+            self, _flush_pending, self.project_name, self._pending, self.save
+        )
+
+    def sync(self, questions: list[str], version=None) -> None:
+        """Track new questions (due now) and forget removed ones.
+        `version` (e.g. the question count) is kept to skip unchanged quizzes."""
+        with self._lock:
+            self.questions = list(questions)
+            self.version = version
+            self._by_key = {question_key(q): q for q in self.questions}
+            for key in self._by_key.keys() - self.queue.states.keys():
+                self.queue.push(ReviewState(key=key))
+            for key in self.queue.states.keys() - self._by_key.keys():
+                self.queue.remove(key)
+
+    def question(self, key: str) -> str:
+        return self._by_key[key]
+
+    def due(self, n: int = 10, now: float = None) -> list[ReviewState]:
+        with self._lock:
+            return self.queue.due(now=now, n=n)
+
+    def count_due(self, now: float = None) -> int:
+        with self._lock:
+            return self.queue.count_due(now=now)
+
+    def review(self, key: str, grade: Grade, now: float = None) -> ReviewState:
+        with self._lock:
+            state = schedule(self.queue.states[key], grade, now=now)
+            self.queue.push(state)
+            self._pending[key] = state
+            full = len(self._pending) >= self.batch_size
+            stale = time.monotonic() - self._last_flush >= self.flush_every
+        if full or stale:
+            self.flush()
+        return state
+
+    def flush(self) -> int:
+        """Persist pending review results, returns how many were saved"""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()  # the same dict the finalizer flushes
+            self._last_flush = time.monotonic()
+        try:
+            self.save(self.project_name, pending)
+        except Exception:  # keep them for the next flush (newer reviews win)
+            with self._lock:
+                for state in pending:
+                    self._pending.setdefault(state.key, state)
+            raise
+        return len(pending)
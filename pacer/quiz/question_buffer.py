@@ -0,0 +1,117 @@
+"""Per-project pool of pre-generated, unseen quiz questions
+"Make More" takes questions from the pool instantly. Whenever a pool falls
+below `low_water`, a background worker refills it up to `high_water`.
+
+Example usage:
+    >>> buffer = QuestionBuffer(generate=lambda project, pooled: [...])
+    >>> buffer.request_refill("My Project")
+    >>> buffer.take("My Project", n=10)
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from pacer.quiz.quiz_creater import QuizQuestion
+
+Generate = Callable[[str, list[QuizQuestion]], list[QuizQuestion]]
+
+
+class QuestionBuffer:
+    def __init__(
+        self,
+        generate: Generate,
+        load: Callable[[str], list[QuizQuestion]] = None,
+        save: Callable[[str, list[QuizQuestion]], None] = None,
+        low_water: int = 5,
+        high_water: int = 15,
+        max_workers: int = 2,
+    ):
+        """
+        Args:
+            generate: new questions for a project (given the pooled ones)
+            load, save: persistence of a project's pool
+        """
+        self.generate = generate
+        self.load = load
+        self.save = save
+        self.low_water = low_water
+        self.high_water = high_water
+        self._pools: dict[str, list[QuizQuestion]] = {}
+        self._refills: dict[str, Future] = {}
+        self._generation: dict[str, int] = {}  # bumped by `clear`
+        self._lock = threading.RLock()
+        self._workers = ThreadPoolExecutor(max_workers, thread_name_prefix="quiz")
+
+    def _pool(self, project_name: str) -> list[QuizQuestion]:
+        with self._lock:
+            if project_name not in self._pools:
+                loaded = self.load(project_name) if self.load else []
+                self._pools[project_name] = list(loaded or [])
+            return self._pools[project_name]
+
+    def _save(self, project_name: str) -> None:
+        if self.save:
+            with self._lock:
+                pool = list(self._pool(project_name))
+            self.save(project_name, pool)
+
+    def size(self, project_name: str) -> int:
+        return len(self._pool(project_name))
+
+    def refilling(self, project_name: str) -> bool:
+        with self._lock:
+            future = self._refills.get(project_name)
+            return future is not None and not future.done()
+
+    def take(self, project_name: str, n: int) -> list[QuizQuestion]:
+        """Up to `n` pooled questions (removed from the pool)"""
+        with self._lock:
+            pool = self._pool(project_name)
+            taken, pool[:] = pool[:n], pool[n:]
+        if taken:
+            self._save(project_name)
+        self.request_refill(project_name)
+        return taken
+
+    def clear(self, project_name: str) -> None:
+        """Drop pooled questions (e.g. their sources changed)"""
+        with self._lock:
+            self._pool(project_name).clear()
+            self._generation[project_name] = self._generation.get(project_name, 0) + 1
+        self._save(project_name)
+
+    def request_refill(self, project_name: str) -> Optional[Future]:
+        """Start a background refill if the pool is low (one per project)"""
+        with self._lock:
+            if self.size(project_name) >= self.low_water:
+                return None
+            if self.refilling(project_name):
+                return self._refills[project_name]
+            future = self._workers.submit(self._refill, project_name)
+            self._refills[project_name] = future
+            return future
+
+    def _refill(self, project_name: str) -> int:
+        added = 0
+        try:
+            while self.size(project_name) < self.high_water:
+                with self._lock:
+                    generation = self._generation.get(project_name, 0)
+                    pooled = list(self._pool(project_name))
+                new = self.generate(project_name, pooled)
+                with self._lock:
+                    if generation != self._generation.get(project_name, 0):
+                        continue  # cleared meanwhile: generate from the new sources
+                    pool = self._pool(project_name)
+                    known = {q.question for q in pool}
+                    new = [q for q in new if q.question not in known]
+                    pool.extend(new)
+                self._save(project_name)
+                added += len(new)
+                if not new:
+                    break
+        except Exception as e:  # a background refill must never break the app
+            print(f"[question_buffer] refill of {project_name!r} failed: {e}")
+        print(f"[question_buffer] {project_name!r}: +{added} questions")
+        return added
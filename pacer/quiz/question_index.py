@@ -0,0 +1,154 @@
+"""Local embedding index of quiz questions
+Vectors are cached by text hash (and persisted per quiz), so growing a quiz
+only embeds the new questions. Used by `quiz_creater.add_questions` to
+reject near-duplicate candidates and to summarize what a quiz already covers.
+
+Example usage:
+    >>> index = QuestionIndex(name="My Project")
+    >>> index.novel(["What is X?", "What is Y?"], existing=["what is x?"])
+    [False, True]
+"""
+
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from pacer.config import consts
+
+INDEX_DIR = consts.ROOT_DIR / ".quiz_index"
+SIMILARITY_THRESHOLD = 0.9  # cosine similarity above which a question is a repeat
+
+
+def _key(text: str) -> str:
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+_locks: dict[Path, threading.RLock] = {}
+_locks_guard = threading.Lock()
+
+
+def _lock(path: Optional[Path]) -> threading.RLock:
+    """One lock per saved index (instances of the same project share it)"""
+    if path is None:
+        return threading.RLock()
+    with _locks_guard:
+        return _locks.setdefault(path, threading.RLock())
+
+
+class QuestionIndex:
+    """Text -> normalized embedding cache with vectorized similarity queries"""
+
+    def __init__(
+        self,
+        name: str = None,
+        embedding: Embeddings = None,
+        threshold: float = SIMILARITY_THRESHOLD,
+        directory: Path = INDEX_DIR,
+    ):
+        self.embedding = embedding or consts.DEFAULT_EMBEDDING
+        self.threshold = threshold
+        self.path: Optional[Path] = None
+        if name:
+            self.path = Path(directory) / f"{_key(name)[:16]}.npz"
+        self._lock = _lock(self.path)
+        self._rows: dict[str, int] = {}
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self.embedded = 0  # texts sent to the embedding model (for stats/tests)
+        self._mtime: Optional[int] = None  # of the file when last read or written
+        with self._lock:
+            self._load()
+
+    def _add(self, vectors: dict[str, np.ndarray]) -> None:
+        new = {k: v for k, v in vectors.items() if k not in self._rows}
+        if not new:
+            return
+        rows = np.stack(list(new.values())).astype(np.float32)
+        self._matrix = np.vstack([self._matrix, rows]) if self._rows else rows
+        for key in new:
+            self._rows[key] = len(self._rows)
+
+    def _load(self) -> None:
+        """Add the vectors saved by other instances (since our last save)"""
+        if self.path is None or not self.path.exists():
+            return
+        if (mtime := self.path.stat().st_mtime_ns) == self._mtime:
+            return
+        with np.load(self.path) as data:
+            self._add(dict(zip(map(str, data["keys"]), data["matrix"])))
+        self._mtime = mtime
+
+    def _save(self) -> None:
+        """Write the index, keeping what other instances saved meanwhile"""
+        if self.path is None:
+            return
+        self._load()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp.npz")
+        keys = sorted(self._rows, key=self._rows.get)
+        np.savez(tmp, keys=np.array(keys), matrix=self._matrix)
+        tmp.replace(self.path)
+        self._mtime = self.path.stat().st_mtime_ns
+
+    def vectors(self, texts: list[str]) -> np.ndarray:
+        """(len(texts), dim) unit vectors, embedding only unseen texts
+        (under the lock of the index: keys added meanwhile cannot shift rows)"""
+        keys = [_key(t) for t in texts]
+        with self._lock:
+            self._load()
+            missing = {k: t for k, t in zip(keys, texts) if k not in self._rows}
+            if missing:
+                new = np.asarray(
+                    self.embedding.embed_documents(list(missing.values())),
+                    dtype=np.float32,
+                )
+                new /= np.linalg.norm(new, axis=1, keepdims=True).clip(min=1e-12)
+                self.embedded += len(missing)
+                self._add(dict(zip(missing, new)))
+                self._save()
+            if not texts:
+                return np.zeros((0, self._matrix.shape[1]), dtype=np.float32)
+            return self._matrix[[self._rows[k] for k in keys]]
+
+    def novel(self, candidates: list[str], existing: list[str]) -> list[bool]:
+        """Which candidates are not near-duplicates of `existing`
+        (or of an earlier accepted candidate)"""
+        if not candidates:
+            return []
+        cand = self.vectors(candidates)
+        if existing:
+            known = (cand @ self.vectors(existing).T).max(axis=1) < self.threshold
+        else:
+            known = np.ones(len(candidates), dtype=bool)
+        among = cand @ cand.T  # candidates against each other
+        accepted = []
+        for i in range(len(candidates)):
+            ok = bool(known[i]) and all(among[i, j] < self.threshold for j in accepted)
+            if ok:
+                accepted.append(i)
+        return [i in accepted for i in range(len(candidates))]
+
+    def representatives(self, texts: list[str], k: int) -> list[str]:
+        """`k` mutually distant texts (farthest point sampling)"""
+        if len(texts) <= k:
+            return list(texts)
+        vectors = self.vectors(texts)
+        chosen = [0]
+        distance = 1 - vectors @ vectors[0]
+        for _ in range(k - 1):
+            i = int(distance.argmax())
+            chosen.append(i)
+            distance = np.minimum(distance, 1 - vectors @ vectors[i])
+        return [texts[i] for i in sorted(chosen)]
+
+    def least_covered(self, sections: list[str], questions: list[str]) -> int:
+        """Index of the section with the fewest questions closest to it"""
+        if len(sections) < 2 or not questions:
+            return 0
+        nearest = (self.vectors(questions) @ self.vectors(sections).T).argmax(axis=1)
+        counts = np.bincount(nearest, minlength=len(sections))
+        return int(counts.argmin())
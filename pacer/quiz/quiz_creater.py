@@ -1,26 +1,40 @@
+import math
+import random
+import re
+
 from langchain.prompts import PromptTemplate
 from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
 from pydantic import BaseModel, Field, field_validator
 
+from pacer.llms import usage
 from pacer.llms.llm_adapter import LLMSwitch
+from pacer.llms.routing import TaskClass
+from pacer.quiz.question_index import QuestionIndex
 from pacer.tools import rag
 
+SECTION_TOKENS = 3000  # max (estimated) tokens of source text per quiz call
+MAX_CONCURRENCY = 4  # quiz calls in flight at once
+OVERSAMPLE = 1.5  # ask each section for more questions than it gets (dedup margin)
+
 quiz_prompt = PromptTemplate(
-    input_variables=["text"],
+    input_variables=["text", "n"],
     template=(
-        "Generate a multiple-choice quiz with 10 questions. Each question should have 4 options, "
+        "Generate a multiple-choice quiz with {n} questions. Each question should have 4 options, "
         "with the correct answer marked clearly."
         "Based on the following text:\n{text}\n\n"
     ),
 )
 
+COVERAGE_SIZE = 12  # existing questions shown to the LLM when adding more
+
 quiz_append_prompt = PromptTemplate(
-    input_variables=["text"],
+    input_variables=["text", "n", "count", "covered"],
     template=(
-        "Add 10 new questions to the questions below."
+        "Add {n} new questions to a quiz that already has {count} questions. "
         "Each question should have 4-6 options, "
-        "with the correct answer marked clearly."
-        "The Questions:\n{questions}\n\n"
+        "with the correct answer marked clearly. "
+        "Do not repeat what the quiz already covers, for example:\n{covered}\n\n"
         "Base questions on the following text:\n{text}\n\n"
     ),
 )
@@ -63,35 +77,164 @@ class Quiz(BaseModel):
     # answers: list[str] = Field(default_factory=list)
 
 
-def create_quiz(documents: list[Document], llm=None) -> Quiz:
-    llm = llm or LLMSwitch.get_current()
-    # -1- Gather sources
-    texts = [doc.page_content for doc in documents]
-    combined_text = "\n".join(texts)
-
-    print("Combined:", combined_text)
-    # -2- structured chain
-
+def _tokens(text: str) -> int:
+    return len(text) // 4  # same estimate as `scheduler.estimate_tokens`
+
+
+def make_sections(
+    documents: list[Document], max_tokens: int = SECTION_TOKENS
+) -> list[str]:
+    """Pack documents (in order) into sections of at most `max_tokens`,
+    splitting documents that are larger than a section"""
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=max_tokens * 4, chunk_overlap=0  # ~4 chars per token
+    )
+    sections, current, size = [], [], 0
+    for doc in documents:
+        for part in splitter.split_text(doc.page_content):
+            if current and size + _tokens(part) > max_tokens:
+                sections.append("\n".join(current))
+                current, size = [], 0
+            current.append(part)
+            size += _tokens(part)
+    if current:
+        sections.append("\n".join(current))
+    return sections
+
+
+def _allocate(weights: list[int], total: int, rng=random) -> list[int]:
+    """Split `total` proportionally to `weights`: every section gets the floor
+    or the ceiling of its share, and the rounding is spread over all sections
+    from a random start (systematic sampling), so quizzes with fewer questions
+    than sections cover the whole corpus, not only its beginning"""
+    if not total or not weights:
+        return [0] * len(weights)
+    if not sum(weights):
+        weights = [1] * len(weights)
+    step = sum(weights) / total
+    start = rng.random() * step
+    counts, edge, before = [], 0, 0
+    for w in weights:
+        edge += w
+        upto = math.ceil((edge - start) / step)  # points `start + k * step` < edge
+        counts.append(upto - before)
+        before = upto
+    return counts
+
+
+def _question_key(question: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+
+def merge_sections(
+    section_questions: list[list[QuizQuestion]], quotas: list[int]
+) -> list[QuizQuestion]:
+    """Deduplicate across sections, then take each section's quota
+    (quotas a section cannot fill go to the sections with questions left)"""
+    seen, unique = set(), []
+    for questions in section_questions:
+        kept = []
+        for q in questions:
+            if (key := _question_key(q.question)) not in seen:
+                seen.add(key)
+                kept.append(q)
+        unique.append(kept)
+
+    taken = [qs[:quota] for qs, quota in zip(unique, quotas)]
+    missing = sum(quotas) - sum(map(len, taken))
+    while missing > 0:
+        progress = False
+        for i, qs in enumerate(unique):
+            if missing and len(taken[i]) < len(qs):
+                taken[i].append(qs[len(taken[i])])
+                missing -= 1
+                progress = True
+        if not progress:
+            break
+    return [q for qs in taken for q in qs]
+
+
+@usage.track
+def create_quiz(
+    documents: list[Document],
+    llm=None,
+    n_questions: int = 10,
+    max_concurrency: int = MAX_CONCURRENCY,
+    section_tokens: int = SECTION_TOKENS,
+) -> Quiz:
+    """Generate questions for token-bounded sections of the sources concurrently,
+    then merge, deduplicate and sample them down to `n_questions`
+    (spread proportionally to the section sizes)."""
+    llm = llm or LLMSwitch.get_current(task=TaskClass.AUXILIARY)
+    # -1- Gather sources into sections
+    sections = make_sections(documents, max_tokens=section_tokens)
+    if not sections:
+        raise ValueError("No source text to create a quiz from")
+    quotas = _allocate([_tokens(s) for s in sections], n_questions)
+    print(f"Creating quiz from {len(sections)} sections: {quotas=}")
+
+    # -2- structured chain per section (sections without a quota are skipped)
     chain = quiz_prompt | llm.with_structured_output(Quiz)
-
-    return chain.invoke(dict(text=combined_text))
-
-
-def add_questions(documents: list[Document], quiz: Quiz, llm=None) -> Quiz:
-    llm = llm or LLMSwitch.get_current()
-    # -1- Gather sources
-    texts = [doc.page_content for doc in documents]
-    combined_text = "\n".join(texts)
+    todo = [i for i, quota in enumerate(quotas) if quota]
+    results = chain.batch(
+        [dict(text=sections[i], n=math.ceil(quotas[i] * OVERSAMPLE)) for i in todo],
+        config=dict(max_concurrency=max_concurrency),
+        return_exceptions=True,
+    )
+
+    # -3- merge
+    section_questions = [[] for _ in sections]
+    errors = []
+    for i, res in zip(todo, results):
+        if isinstance(res, Exception):
+            print(f"*** Warning: quiz section {i} failed: {res}")
+            errors.append(res)
+        else:
+            section_questions[i] = res.questions
+    if errors and len(errors) == len(todo):
+        raise errors[0]
+    return Quiz(questions=merge_sections(section_questions, quotas))
+
+
+@usage.track
+def add_questions(
+    documents: list[Document],
+    quiz: Quiz,
+    llm=None,
+    n_questions: int = 10,
+    index: QuestionIndex = None,
+    section_tokens: int = SECTION_TOKENS,
+) -> Quiz:
+    """Add questions about the least covered section of the sources.
+    The prompt holds a bounded coverage summary (not every question), and
+    candidates too similar to existing questions are rejected, so the cost
+    stays flat as the quiz grows."""
+    llm = llm or LLMSwitch.get_current(task=TaskClass.AUXILIARY)
+    index = index or QuestionIndex()
+    existing = [q.question for q in quiz.questions]
+
+    # -1- Pick the source section
+    sections = make_sections(documents, max_tokens=section_tokens)
+    if not sections:
+        raise ValueError("No source text to add questions from")
+    section = sections[index.least_covered(sections, existing)]
 
     # -2- structured chain
     chain = quiz_append_prompt | llm.with_structured_output(Quiz)
-    questions_json = [q.model_dump_json(indent=2) for q in quiz.questions]
-    res: Quiz = chain.invoke(dict(text=combined_text, questions=str(questions_json)))
-
-    # -3- merge (just-in-case)
-    res_questions = {q.question for q in res.questions}
-    for q in quiz.questions:
-        if q.question not in res_questions:
-            res.questions.append(q)
-    quiz.questions = res.questions
-    return res
+    covered = index.representatives(existing, COVERAGE_SIZE)
+    res: Quiz = chain.invoke(
+        dict(
+            text=section,
+            n=math.ceil(n_questions * OVERSAMPLE),
+            count=len(existing),
+            covered="\n".join(f"- {q}" for q in covered),
+        )
+    )
+
+    # -3- merge (near-duplicates rejected)
+    candidates = [q.question for q in res.questions]
+    novel = index.novel(candidates, existing=existing)
+    new = [q for q, ok in zip(res.questions, novel) if ok][:n_questions]
+    print(f"Adding {len(new)} of {len(candidates)} generated questions")
+    quiz.questions = quiz.questions + new
+    return quiz
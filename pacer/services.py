@@ -1,27 +1,44 @@
+import threading
 from collections import defaultdict
+from functools import partial
 from itertools import chain
 from pathlib import Path
 from typing import Generator, Optional
 from uuid import uuid4
 
 from langchain.schema import Document
+from langchain_core.messages import HumanMessage, SystemMessage
 from sqlalchemy import desc
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.attributes import flag_modified
 
+from pacer.llms import usage
 from pacer.llms.llm_adapter import LLMSwitch
-from pacer.models.code_cell_model import JupyterCells
+from pacer.llms.scheduler import Priority, priority
+from pacer.models.code_cell_model import Cell, JupyterCells
 from pacer.models.file_model import FileEntry
+from pacer.models.job_model import JobInfo
 from pacer.models.project_model import ProjectData
 from pacer.orm import base
+from pacer.orm.blob_store import get_blob_store
 from pacer.orm.chat_message_orm import ChatMessage
 from pacer.orm.file_orm import File, FileStatus, FileType
+from pacer.orm.job_orm import JobKind, JobStatus
 from pacer.orm.note_orm import Note
 from pacer.orm.project_orm import Project
-from pacer.quiz import quiz_creater
+from pacer.orm.repository import get_project_repository
+from pacer.quiz import practice, quiz_creater
+from pacer.quiz.question_buffer import QuestionBuffer
+from pacer.quiz.question_index import QuestionIndex
 from pacer.tools import rag
+from pacer.tools.chat_history import ChatHistory
+from pacer.tools.job_queue import JobContext, get_job_queue
+from pacer.tools.notebook_store import NotebookStore, cell_node
+from pacer.tools.notebook_validation import validate_cells
 
 SessionLocal = base.make_session()
+PROJECTS = get_project_repository()  # name -> id, eager loads
+_QUIZ_LOCK = threading.Lock()  # `project.data` items are read-modify-write
 
 
 def list_projects(session: Session = None) -> list[str]:
@@ -30,11 +47,72 @@ def list_projects(session: Session = None) -> list[str]:
         return list(chain(*query.all()))
 
 
-def list_files(project_name: str) -> list[FileEntry]:
+_LISTED_COLUMNS = (
+    File.id,
+    File.filepath,
+    File.type,
+    File.content_hash,
+    File.size,
+    File.status,
+    File.data,
+)
+
+
+def _load_content(file_id: str) -> str:
+    """`File.content` of a row stored before the blob store"""
+    with SessionLocal() as session:
+        return session.query(File.content).filter(File.id == file_id).scalar() or ""
+
+
+def list_files(
+    project_name: str, offset: int = 0, limit: Optional[int] = None
+) -> list[FileEntry]:
+    """The project's files without their payloads (`read_*` fetches them),
+    ordered by path, `limit` of them from `offset`"""
+    with SessionLocal() as session:
+        if (project_id := PROJECTS.project_id(session, project_name)) is None:
+            return []
+        rows = (
+            session.query(*_LISTED_COLUMNS)
+            .filter(File.project_id == project_id)
+            .order_by(File.filepath, File.id)
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+    project_ref = ProjectData(id=project_id, name=project_name)
+    return [
+        FileEntry.listed(
+            partial(_load_content, row.id), project_ref=project_ref, **row._asdict()
+        )
+        for row in rows
+    ]
+
+
+def count_files(project_name: str) -> int:
     with SessionLocal() as session:
-        project = session.query(Project).filter_by(name=project_name).first()
-        entries = list(map(FileEntry.model_validate, project.files))
-        return entries
+        project_id = PROJECTS.project_id(session, project_name)
+        return session.query(File.id).filter(File.project_id == project_id).count()
+
+
+def get_file(file_id: str) -> Optional[FileEntry]:
+    """One file, as listed (without its payload)"""
+    with SessionLocal() as session:
+        row = (
+            session.query(
+                *_LISTED_COLUMNS, Project.id.label("project_id"), Project.name
+            )
+            .join(Project, File.project_id == Project.id)
+            .filter(File.id == file_id)
+            .first()
+        )
+    if row is None:
+        return None
+    fields = row._asdict()
+    project_ref = ProjectData(id=fields.pop("project_id"), name=fields.pop("name"))
+    return FileEntry.listed(
+        partial(_load_content, row.id), project_ref=project_ref, **fields
+    )
 
 
 def add_project(project_name: str) -> ProjectData:
@@ -42,6 +120,7 @@ def add_project(project_name: str) -> ProjectData:
         project = Project(id=str(uuid4()), name=project_name)
         session.add(project)
         session.commit()
+        PROJECTS.remember(session, project)
         return ProjectData.model_validate(project)
 
 
@@ -50,26 +129,61 @@ def add_files(file_entries: list[FileEntry]) -> list[File]:
         return
     with SessionLocal() as session:
         project = file_entries[0].project_ref
-        if not project.id:
-            project = session.query(Project).filter_by(name=project.name).first()
-
-        files = [
-            File(
-                id=str(uuid4()),
-                type=file_entry.type_,
-                project_id=project.id,
-                filepath=file_entry.filepath,
-                content=file_entry.content,
-                status=FileStatus.CREATED,
-            )
-            for file_entry in file_entries
-        ]
-
-        session.add_all(files)
-        session.commit()
+        project_id = project.id or PROJECTS.project_id(session, project.name)
+
+        files = []
+        store = get_blob_store()
+        with store.lock:  # a blob is referenced before it can be deleted
+            for file_entry in file_entries:
+                # Payloads go to the (deduplicating) blob store, rows keep the hash
+                content_hash, size = store.put(file_entry.read_bytes())
+                file_entry.content_hash, file_entry.size = content_hash, size
+                files.append(
+                    File(
+                        id=str(uuid4()),
+                        type=file_entry.type_,
+                        project_id=str(project_id),
+                        filepath=file_entry.filepath,
+                        content_hash=content_hash,
+                        size=size,
+                        status=FileStatus.CREATED,
+                        data=file_entry.data,
+                    )
+                )
+
+            session.add_all(files)
+            session.commit()
+        QUESTION_BUFFER.request_refill(file_entries[0].project_ref.name)
         return files
 
 
+def move_contents_to_blobs(batch_size: int = 50) -> int:
+    """Move payloads of rows stored before the blob store out of the DB
+    (and `VACUUM`, so the DB file shrinks). Returns the number of moved files."""
+    moved = 0
+    while True:
+        with SessionLocal() as session:
+            files = (
+                session.query(File)
+                .filter(File.content_hash.is_(None))
+                .limit(batch_size)
+                .all()
+            )
+            if not files:
+                break
+            store = get_blob_store()
+            with store.lock:
+                for file in files:
+                    entry = FileEntry.model_validate(file)
+                    file.content_hash, file.size = store.put(entry.read_bytes())
+                    file.content = ""
+                session.commit()
+            moved += len(files)
+    with SessionLocal() as session:
+        session.connection().exec_driver_sql("VACUUM")
+    return moved
+
+
 def add_url(url: str, project_name: str) -> list[File]:
     docs = rag.read_url(url)
     entries = [
@@ -86,34 +200,69 @@ def add_url(url: str, project_name: str) -> list[File]:
 
 
 def delete_project(project_name: str):
+    """Deletes the project with its rows (cascade), and the blobs only it used"""
     with SessionLocal() as session:
-        session.query(Project).filter(Project.name == project_name).delete(
-            synchronize_session="fetch"
+        relationships = (
+            "files",
+            "notes",
+            "jupyter_cells",
+            "chat_messages",
+            "quiz_reviews",
         )
+        project = PROJECTS.project(session, project_name, *relationships)
+        if project is None:
+            return
+        hashes = {file.content_hash for file in project.files} - {None}
+        session.delete(project)
         session.commit()
+        PROJECTS.forget(project_name)
+        _delete_unused_blobs(session, hashes)
+
+
+def _delete_unused_blobs(session, hashes: set[str]) -> None:
+    """Delete the blobs no row references (atomically with `add_files`)"""
+    store = get_blob_store()
+    with store.lock:
+        used = (
+            session.query(File.content_hash)
+            .filter(File.content_hash.in_(hashes))
+            .distinct()
+        )
+        for content_hash in hashes - set(chain(*used.all())):
+            store.delete(content_hash)
 
 
 def delete_file(file_entry: FileEntry):
+    """Deletes every row of the file (e.g. one per document of a URL), and the
+    blobs only they used"""
     with SessionLocal() as session:
-        session.query(File).filter(
+        rows = session.query(File).filter(
             (File.project_id == str(file_entry.project_ref.id))
             & (File.filepath == file_entry.filepath)
-        ).delete(synchronize_session="fetch")
+        )
+        hashes = set(chain(*rows.with_entities(File.content_hash).all()))
+        rows.delete(synchronize_session="fetch")
         session.commit()
+        _delete_unused_blobs(session, hashes - {None})  # the last references?
+    # Pooled questions may be about the removed file
+    QUESTION_BUFFER.clear(file_entry.project_ref.name)
+    QUESTION_BUFFER.request_refill(file_entry.project_ref.name)
 
 
+@usage.track
 def add_summary_to_file(file_entry: FileEntry):
     """Adds both to `FileEntry` and `File` (in ORM)"""
     # suffix = Path(file_entry.filepath).suffix
     if file_entry.type_ in (FileType.MARKDOWN, FileType.TEXT, FileType.URL):
-        split = rag.split_text(file_entry.content)
+        split = rag.split_text(file_entry.read_text())
     elif file_entry.type_ in (FileType.PDF,):
-        split = rag.read_pdf(file_entry.content)
+        split = rag.read_pdf(file_entry.path() or file_entry.payload())
     else:
         raise ValueError(f"Unkown type: `{file_entry.type_}`")
 
     print("Summary:")
-    summary = rag.create_summary(split)
+    with priority(Priority.BACKGROUND):
+        summary = rag.create_summary(split)
     print(summary)
 
     with SessionLocal() as session:
@@ -129,11 +278,11 @@ def iter_read_entry(entry: FileEntry) -> Generator[None, None, Document]:
     text_types = [FileType.TEXT, FileType.URL, FileType.MARKDOWN]
     match entry.type_:
         case FileType.PDF:
-            yield from rag.read_pdf(entry.content)
+            yield from rag.read_pdf(entry.path() or entry.payload())
         case t if t in text_types:
-            yield Document(page_content=entry.content)
+            yield Document(page_content=entry.read_text())
         case _:
-            yield Document(page_content=entry.content)
+            yield Document(page_content=entry.read_text())
 
 
 def read_sources(sources: list[FileEntry]) -> list[Document]:
@@ -146,69 +295,246 @@ def read_sources(sources: list[FileEntry]) -> list[Document]:
 def get_quiz(project_name: str) -> Optional[quiz_creater.Quiz]:
     assert project_name
     with SessionLocal() as session:
-        project = session.query(Project).filter(Project.name == project_name).first()
-        q = project.data.get("quiz")
+        q = (PROJECTS.data(session, project_name) or {}).get("quiz")
         if q:
             return quiz_creater.Quiz.model_validate_json(q)
 
 
-def create_quiz(project_name: str) -> quiz_creater.Quiz:
-    assert project_name
+def _save_quiz_data(project_name: str, **items: Optional[str]) -> None:
+    """Set (or pop, if None) `project.data` items under `_QUIZ_LOCK`"""
+    with _QUIZ_LOCK, SessionLocal() as session:
+        project = PROJECTS.project(session, project_name)
+        if project is None:
+            return
+        for key, value in items.items():
+            if value is None:
+                project.data.pop(key, None)
+            else:
+                project.data[key] = value
+        flag_modified(project, "data")  #  the ORM may not detect changes automatically
+        session.commit()
+
+
+def _load_buffer(project_name: str) -> list[quiz_creater.QuizQuestion]:
     with SessionLocal() as session:
-        project = session.query(Project).filter(Project.name == project_name).first()
-        files = list(map(FileEntry.model_validate, project.files))
-        docs = read_sources(files)
+        data = (PROJECTS.data(session, project_name) or {}).get("quiz_buffer")
+        return quiz_creater.Quiz.model_validate_json(data).questions if data else []
+
+
+def _save_buffer(project_name: str, questions: list[quiz_creater.QuizQuestion]):
+    buffered = quiz_creater.Quiz(questions=questions)
+    _save_quiz_data(project_name, quiz_buffer=buffered.model_dump_json())
+
+
+def _generate_buffered(
+    project_name: str, pooled: list[quiz_creater.QuizQuestion]
+) -> list[quiz_creater.QuizQuestion]:
+    """New questions for the buffer (pooled ones count as existing)"""
+    if not (quiz := get_quiz(project_name=project_name)):
+        return []  # nothing to "make more" of yet
+    files = list_files(project_name)
+    if not files:
+        return []
+    existing = quiz_creater.Quiz(questions=quiz.questions + pooled)
+    count = len(existing.questions)
+    tag = usage.tag("refill_question_buffer", project_name)
+    with tag, priority(Priority.BACKGROUND):
+        more = quiz_creater.add_questions(
+            read_sources(files), existing, index=QuestionIndex(name=project_name)
+        )
+    return more.questions[count:]
+
+
+QUESTION_BUFFER = QuestionBuffer(
+    generate=_generate_buffered, load=_load_buffer, save=_save_buffer
+)
 
-        quiz = get_quiz(project_name=project_name)
+
+@usage.track
+def create_quiz(project_name: str, n_questions: int = 10) -> quiz_creater.Quiz:
+    """Creates the quiz, or adds questions (from the pre-generated buffer
+    when it has any)"""
+    assert project_name
+    quiz = get_quiz(project_name=project_name)
+    if quiz and (buffered := QUESTION_BUFFER.take(project_name, n_questions)):
+        quiz.questions += buffered
+    else:
+        docs = read_sources(list_files(project_name))
         if quiz:
-            quiz = quiz_creater.add_questions(docs, quiz)
+            index = QuestionIndex(name=project_name)
+            quiz = quiz_creater.add_questions(
+                docs, quiz, n_questions=n_questions, index=index
+            )
         else:
-            quiz = quiz_creater.create_quiz(docs)
-        project.data["quiz"] = quiz.model_dump_json(indent=2)
-        flag_modified(project, "data")  #  the ORM may not detect changes automatically
-        session.commit()
-        return quiz
+            quiz = quiz_creater.create_quiz(docs, n_questions=n_questions)
+    _save_quiz_data(project_name, quiz=quiz.model_dump_json(indent=2))
+    QUESTION_BUFFER.request_refill(project_name)
+    return quiz
+
+
+def buffered_questions(project_name: str) -> int:
+    """Pre-generated questions ready for `create_quiz`"""
+    return QUESTION_BUFFER.size(project_name)
+
+
+def get_practice(
+    project_name: str, quiz: quiz_creater.Quiz = None
+) -> practice.Practice:
+    """Spaced-repetition state of the project's quiz questions"""
+    quiz = quiz or get_quiz(project_name)
+    questions = [q.question for q in quiz.questions] if quiz else []
+    return practice.Practice(project_name, questions)
 
 
 def remove_quiz(project_name: str) -> None:
     assert project_name
-    with SessionLocal() as session:
-        project = session.query(Project).filter(Project.name == project_name).first()
-        project.data.pop("quiz", None)
-        flag_modified(project, "data")  #  the ORM may not detect changes automatically
-        session.commit()
+    QUESTION_BUFFER.clear(project_name)
+    _save_quiz_data(project_name, quiz=None)
 
 
+@usage.track
 def create_jupyter_cells(project_name: str) -> JupyterCells:
     assert project_name
-    with SessionLocal() as session:
-        project = session.query(Project).filter(Project.name == project_name).first()
-        files = list(map(FileEntry.model_validate, project.files))
-        docs = read_sources(files)
-        db = rag.insert_docs(docs, sub_dir=project_name)
-        cells: JupyterCells = rag.create_jupyter_cells(db=db)
-        return cells
+    docs = read_sources(list_files(project_name))
+    db = rag.insert_docs(docs, sub_dir=project_name)
+    return JupyterCells(cells=list(rag.stream_sectioned_cells(db=db)))
 
 
+@usage.track
 def update_jupyter_cells(
     project_name: str, cells: JupyterCells, update: str
 ) -> JupyterCells:
     assert project_name
-    with SessionLocal() as session:
-        project = session.query(Project).filter(Project.name == project_name).first()
-        files = list(map(FileEntry.model_validate, project.files))
-        docs = read_sources(files)
-        db = rag.insert_docs(docs, sub_dir=project_name)
-        cells: JupyterCells = rag.update_jupyter_cells(
-            db=db, notebook_cells=cells, user_message=update
+    docs = read_sources(list_files(project_name))
+    db = rag.insert_docs(docs, sub_dir=project_name)
+    cells: JupyterCells = rag.update_jupyter_cells(
+        db=db, notebook_cells=cells, user_message=update
+    )
+    return cells
+
+
+@usage.track
+def stream_jupyter_cells(
+    project_name: str, cells: JupyterCells = None, update: str = None
+) -> Generator[Cell, None, None]:
+    """Cells of a new notebook, section by section (or, given `update`, cells to
+    add to `cells`), yielded while the LLM is still writing the rest"""
+    assert project_name
+    docs = read_sources(list_files(project_name))
+    db = rag.insert_docs(docs, sub_dir=project_name)
+    if update is None:
+        yield from rag.stream_sectioned_cells(db=db)
+    else:
+        prompt = rag.update_prompt(update, cells)
+        yield from rag.stream_jupyter_cells(db=db, prompt_template=prompt)
+
+
+# ---- Background jobs (see `pacer.tools.job_queue`)
+
+JOBS = get_job_queue()
+
+
+def _summary_job(job: JobContext, file_id: str) -> None:
+    if (file_entry := get_file(file_id)) is None:
+        return  # deleted meanwhile
+    job.progress(message=f"Summarizing {file_entry.title}..")
+    add_summary_to_file(file_entry)
+
+
+def _quiz_job(job: JobContext, n_questions: int = 10) -> None:
+    job.progress(message="Writing questions..")
+    create_quiz(project_name=job.info.project_name, n_questions=n_questions)
+
+
+def _notebook_job(job: JobContext) -> None:
+    """Generate the project's notebook into its `jupyter_cells`, then run it"""
+    project_name = job.info.project_name
+    store = NotebookStore(project_name)
+    store.clear()  # a retry starts over
+    for n, cell in enumerate(stream_jupyter_cells(project_name=project_name), 1):
+        store.append([cell_node(cell)])
+        job.progress(message=f"Generated {n} cells..")
+    job.progress(message="Running the notebook..")
+    cells = store.load()
+    validate_cells(cells)
+    store.patch([cell for cell in cells if cell.cell_type == "code"])
+
+
+def _save_job_status(job: JobInfo) -> None:
+    """The latest job of every kind, in `project.data["jobs"]`"""
+    with _QUIZ_LOCK, SessionLocal() as session:
+        project = PROJECTS.project(session, job.project_name)
+        if project is None:
+            return
+        project.data = project.data or {}
+        project.data.setdefault("jobs", {})[job.kind] = job.model_dump(
+            mode="json", include={"id", "status", "progress", "message", "error"}
         )
-        return cells
+        flag_modified(project, "data")
+        session.commit()
+
+
+def _summary_updated(job: JobInfo) -> None:
+    status = {
+        JobStatus.SUCCEEDED: FileStatus.SUMMARY_CREATED,
+        JobStatus.FAILED: FileStatus.FAILED,
+    }.get(job.status)
+    if status is not None:
+        with SessionLocal() as session:
+            session.query(File).filter(File.id == job.payload["file_id"]).update(
+                dict(status=status), synchronize_session=False
+            )
+            session.commit()
+    _save_job_status(job)
+
+
+JOBS.register(JobKind.SUMMARY, _summary_job, on_update=_summary_updated)
+JOBS.register(JobKind.QUIZ, _quiz_job, on_update=_save_job_status)
+JOBS.register(JobKind.NOTEBOOK, _notebook_job, on_update=_save_job_status)
+
+
+def submit_summary(file_entry: FileEntry) -> str:
+    """Queue `add_summary_to_file` (returns the job id)"""
+    return JOBS.submit(
+        JobKind.SUMMARY,
+        key=f"summary:{file_entry.id}",
+        project_name=file_entry.project_ref.name,
+        file_id=str(file_entry.id),
+    )
+
+
+def submit_quiz(project_name: str, n_questions: int = 10) -> str:
+    """Queue `create_quiz` (returns the job id)"""
+    return JOBS.submit(
+        JobKind.QUIZ,
+        key=f"quiz:{project_name}",
+        project_name=project_name,
+        n_questions=n_questions,
+    )
+
+
+def submit_notebook(project_name: str) -> str:
+    """Queue the generation (and validation) of the project's notebook"""
+    return JOBS.submit(
+        JobKind.NOTEBOOK,
+        key=f"notebook:{project_name}",
+        project_name=project_name,
+        max_attempts=2,
+    )
+
+
+def get_job(job_id: str) -> Optional[JobInfo]:
+    return JOBS.get(job_id)
+
+
+def latest_job(key: str) -> Optional[JobInfo]:
+    """E.g. `latest_job(f"quiz:{project_name}")`"""
+    return JOBS.latest(key)
 
 
 def add_note(note: str, project_name: str) -> Note:
     with SessionLocal() as session:
-        project = session.query(Project).filter(Project.name == project_name).first()
-        note = Note(project_id=project.id, content=note)
+        note = Note(project_id=PROJECTS.project_id(session, project_name), content=note)
 
         session.add(note)
         session.commit()
@@ -217,8 +543,7 @@ def add_note(note: str, project_name: str) -> Note:
 
 def get_notes(project_name: str) -> list[Note]:
     with SessionLocal() as session:
-        project = session.query(Project).filter(Project.name == project_name).first()
-        return project.notes
+        return PROJECTS.notes(session, project_name)
 
 
 def remove_note(note: Note):
@@ -236,20 +561,69 @@ def update_note(note: Note, new_note: str) -> Note:
 
 def get_messages(project_name: str) -> list[ChatMessage]:
     with SessionLocal() as session:
-        project = session.query(Project).filter(Project.name == project_name).first()
-        return project.chat_messages
-
-
-def ask(messages, context_files: list[FileEntry] = None, *args, llm=None, **kwargs):
-    """Ask An AI Agent about a question relating to docs"""
+        return PROJECTS.chat_messages(session, project_name)
+
+
+def chat_history(project_name: str) -> ChatHistory:
+    return ChatHistory(project_name, SessionLocal)
+
+
+def recent_messages(project_name: str, n: int = None):
+    """The last `n` persisted chat messages (for display)"""
+    return chat_history(project_name).recent(n)
+
+
+def clear_chat(project_name: str) -> None:
+    chat_history(project_name).clear()
+
+
+def chat(
+    project_name: str,
+    user_input: str,
+    context_files: list[FileEntry] = None,
+    llm=None,
+):
+    """One chat turn: only the last few messages and a rolling summary of the
+    earlier ones are sent (see `pacer.tools.chat_history`)"""
+    history = chat_history(project_name)
+    history.append(HumanMessage(user_input))
+    summary, messages = history.context()
+    response = ask(
+        messages,
+        context_files=context_files,
+        llm=llm,
+        project_name=project_name,
+        summary=summary,
+    )
+    history.append(response)
+    return response
+
+
+@usage.track
+def ask(
+    messages,
+    context_files: list[FileEntry] = None,
+    *args,
+    llm=None,
+    project_name: str = None,
+    summary: str = "",
+    **kwargs,
+):
+    """Ask An AI Agent about a question relating to docs
+    (`project_name` is only used to account the LLM usage,
+    `summary` stands for the messages before `messages`)"""
     llm = llm or LLMSwitch.get_current()
-    if not context_files:
-        return llm.invoke(messages, *args, **kwargs)
-
-    docs = read_sources(context_files)
-    db = rag.insert_docs_non_persistant(docs=docs)
-    resp = rag.context_chat(messages=messages, db=db)
-    return resp
+    with priority(Priority.INTERACTIVE):  # chat goes before background work
+        if not context_files:
+            if summary:
+                note = f"Summary of the earlier conversation:\n{summary}"
+                messages = [SystemMessage(note), *messages]
+            return llm.invoke(messages, *args, **kwargs)
+
+        docs = read_sources(context_files)
+        db = rag.insert_docs_non_persistant(docs=docs)
+        resp = rag.context_chat(messages=messages, db=db, llm=llm, summary=summary)
+        return resp
 
 
 if __name__ == "__main__":
@@ -0,0 +1,155 @@
+import base64
+import threading
+import time
+
+import pytest
+from sqlalchemy import text
+
+from pacer import services
+from pacer.models import file_model
+from pacer.models.file_model import FileEntry
+from pacer.models.project_model import ProjectData
+from pacer.orm import base
+from pacer.orm.blob_store import BlobStore
+from pacer.orm.file_orm import File, FileType
+from pacer.orm.project_orm import Project
+
+PAYLOAD = b"%PDF-1.4\n" + b"stream of repetitive page content\n" * 5000
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = BlobStore(tmp_path / "blobs")
+    monkeypatch.setattr(services, "get_blob_store", lambda: store)
+    monkeypatch.setattr(file_model, "get_blob_store", lambda: store)
+    Session = base.make_session(tmp_path / "blobs.db")
+    monkeypatch.setattr(services, "SessionLocal", Session)
+    monkeypatch.setattr(services.QUESTION_BUFFER, "request_refill", lambda name: None)
+    return store
+
+
+def test_put_is_content_addressed_and_compressed(store):
+    digest, size = store.put(PAYLOAD)
+    assert store.put(PAYLOAD) == (digest, size) == (digest, len(PAYLOAD))
+    assert store.disk_usage() < size / 10
+
+    assert store.get(digest) == PAYLOAD
+    with store.open(digest) as fl:
+        assert fl.read(8) == b"%PDF-1.4"
+    assert store.mmap(digest)[:8] == b"%PDF-1.4"
+
+
+def test_files_are_deduplicated_across_projects(store):
+    for name in ("a", "b"):
+        services.add_project(name)
+        services.add_files(
+            [
+                FileEntry(
+                    filepath="doc.pdf",
+                    content=PAYLOAD,
+                    project_ref=ProjectData(name=name),
+                )
+            ]
+        )
+    (a,), (b,) = services.list_files("a"), services.list_files("b")
+    assert a.content_hash == b.content_hash and a.size == len(PAYLOAD)
+    assert a.content == "" and a.read_bytes() == PAYLOAD
+    assert len(list(store.root.glob("??/*.gz"))) == 1
+
+    services.delete_file(a)
+    assert store.exists(b.content_hash)  # still used by project "b"
+    services.delete_file(b)
+    assert not store.exists(b.content_hash)
+
+
+def test_every_row_of_a_url_is_collected(store):
+    services.add_project("web")
+    services.add_files(
+        [
+            FileEntry(
+                filepath="https://example.com",
+                content=f"document {n}",
+                type=FileType.URL,
+                project_ref=ProjectData(name="web"),
+            )
+            for n in range(3)
+        ]
+    )
+    first, *_ = services.list_files("web")
+    services.delete_file(first)
+    assert not services.list_files("web")
+    assert not list(store.root.glob("??/*.gz"))
+
+
+def test_decompressed_copies_are_bounded(store):
+    store.cache_bytes = 2 * (len(PAYLOAD) + 1)
+    digests = [store.put(PAYLOAD + bytes([i]))[0] for i in range(4)]
+    for digest in digests:
+        assert store.path(digest).read_bytes()[:8] == b"%PDF-1.4"
+    copies = {p.name for p in store.cache_dir.iterdir()}
+    assert len(copies) == 2 and digests[-1] in copies
+
+
+def test_delete_does_not_race_an_add(store):
+    services.add_project("a")
+    services.add_project("b")
+    (a,) = services.add_files(
+        [
+            FileEntry(
+                filepath="a.pdf", content=PAYLOAD, project_ref=ProjectData(name="a")
+            )
+        ]
+    )
+    (a,) = services.list_files("a")
+
+    # "a" is deleted while "b" adds the same payload (stored, not committed yet)
+    put, deleting = store.put, []
+
+    def put_then_wait(data):
+        result = put(data)
+        deleting.append(threading.Thread(target=services.delete_file, args=(a,)))
+        deleting[0].start()
+        time.sleep(0.2)
+        return result
+
+    store.put = put_then_wait
+    services.add_files(
+        [
+            FileEntry(
+                filepath="b.pdf", content=PAYLOAD, project_ref=ProjectData(name="b")
+            )
+        ]
+    )
+    deleting[0].join()
+    (b,) = services.list_files("b")
+    assert not services.list_files("a") and b.read_bytes() == PAYLOAD
+
+
+def test_legacy_contents_are_moved(store):
+    services.add_project("legacy")
+    with services.SessionLocal() as session:
+        project = session.query(Project).filter_by(name="legacy").one()
+        session.add_all(
+            [
+                File(
+                    project_id=project.id,
+                    type=FileType.PDF,
+                    filepath="old.pdf",
+                    content=base64.b64encode(PAYLOAD).decode(),
+                ),
+                File(
+                    project_id=project.id,
+                    type=FileType.TEXT,
+                    filepath="old.txt",
+                    content="plain text",
+                ),
+            ]
+        )
+        session.commit()
+
+    assert services.move_contents_to_blobs() == 2
+    pdf, txt = sorted(services.list_files("legacy"), key=lambda f: f.filepath)
+    assert pdf.read_bytes() == PAYLOAD and txt.read_text() == "plain text"
+    with services.SessionLocal() as session:
+        payload = session.execute(text("SELECT sum(length(content)) FROM files"))
+        assert payload.scalar() == 0
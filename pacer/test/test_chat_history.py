@@ -0,0 +1,90 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from pacer import services
+from pacer.orm import base
+from pacer.orm.blob_store import BlobStore
+from pacer.tools.chat_history import ChatHistory
+
+
+@pytest.fixture
+def Session(tmp_path, monkeypatch):
+    Session = base.make_session(tmp_path / "chat.db")
+    monkeypatch.setattr(services, "SessionLocal", Session)
+    monkeypatch.setattr(services, "get_blob_store", lambda: BlobStore(tmp_path))
+    monkeypatch.setattr(services.QUESTION_BUFFER, "request_refill", lambda name: None)
+    services.add_project("chat")
+    return Session
+
+
+@pytest.fixture
+def folds():
+    return []
+
+
+@pytest.fixture
+def history(Session, folds):
+    def summarize(summary, messages):
+        folds.append([m.content for m in messages])
+        return " ".join([summary, *(m.content for m in messages)]).strip()
+
+    return ChatHistory("chat", Session, window=4, fold_every=2, summarize=summarize)
+
+
+def _turn(history: ChatHistory, n: int):
+    history.append(HumanMessage(f"q{n}"), AIMessage(f"a{n}"))
+
+
+def test_window_is_bounded_and_summary_is_incremental(history, folds):
+    _turn(history, 0)
+    _turn(history, 1)
+    assert history.context() == ("", [*history.recent()])
+    assert not folds
+
+    for n in range(2, 6):
+        _turn(history, n)
+        summary, messages = history.context()
+        assert len(messages) == 4
+        assert [m.content for m in messages] == [f"q{n-1}", f"a{n-1}", f"q{n}", f"a{n}"]
+    # each fold only sees the messages that just left the window
+    assert folds == [["q0", "a0"], ["q1", "a1"], ["q2", "a2"], ["q3", "a3"]]
+    assert summary == "q0 a0 q1 a1 q2 a2 q3 a3"
+    assert history.context()[0] == summary and len(folds) == 4  # cached
+
+
+def test_history_is_persisted_per_project(Session, history):
+    for n in range(3):
+        _turn(history, n)
+    history.context()
+
+    reopened = ChatHistory("chat", Session, window=4, fold_every=2, summarize=None)
+    assert [m.type for m in reopened.recent(3)] == ["ai", "human", "ai"]
+    assert reopened.context()[0] == "q0 a0"  # no summarize call needed
+    assert services.get_messages("chat")[0].content == "q0"
+
+    services.clear_chat("chat")
+    assert history.context() == ("", [])
+
+
+def test_chat_sends_the_window(Session, monkeypatch):
+    sent = []
+
+    def ask(messages, summary="", **kwargs):
+        sent.append((summary, [m.content for m in messages]))
+        return AIMessage(f"answer {len(sent)}")
+
+    monkeypatch.setattr(services, "ask", ask)
+    monkeypatch.setattr(
+        services,
+        "chat_history",
+        lambda name: ChatHistory(
+            name, Session, window=2, fold_every=2, summarize=lambda s, m: "earlier"
+        ),
+    )
+    for n in range(3):
+        services.chat("chat", f"q{n}")
+    assert sent[-1] == ("earlier", ["answer 2", "q2"])
+    assert [m.content for m in services.recent_messages("chat", 2)] == [
+        "q2",
+        "answer 3",
+    ]
@@ -0,0 +1,91 @@
+import random
+import threading
+import time
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import select, text
+
+from pacer import services
+from pacer.models import file_model
+from pacer.models.file_model import FileEntry
+from pacer.models.project_model import ProjectData
+from pacer.orm import base
+from pacer.orm.blob_store import BlobStore
+from pacer.orm.file_orm import FileType
+from pacer.orm.project_orm import Project
+
+THREADS = 16
+OPS_PER_THREAD = 40
+
+
+def _stress(n_threads: int = THREADS, n_ops: int = OPS_PER_THREAD) -> tuple:
+    projects = [f"stress-{i}" for i in range(4)]
+    for name in projects:
+        services.add_project(name)
+
+    errors, start = [], threading.Barrier(n_threads + 1)
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        start.wait()
+        for i in range(n_ops):
+            project = rng.choice(projects)
+            try:
+                match rng.choice(["note", "files", "list"]):
+                    case "note":
+                        services.add_note(f"note {seed}-{i}", project_name=project)
+                    case "files":
+                        entry = FileEntry(
+                            content="x" * rng.randint(100, 5000),
+                            filepath=f"doc-{seed}-{i}.txt",
+                            type=FileType.TEXT,
+                            project_ref=ProjectData(name=project),
+                        )
+                        services.add_files([entry])
+                    case "list":
+                        services.list_files(project)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(n_threads)]
+    for t in threads:
+        t.start()
+    start.wait()
+    began = time.perf_counter()
+    for t in threads:
+        t.join()
+    return errors, n_threads * n_ops / (time.perf_counter() - began)
+
+
+@pytest.mark.parametrize("split_reads", [False, True])
+def test_concurrent_sessions(tmp_path, monkeypatch, split_reads):
+    Session = base.make_session(tmp_path / "stress.db", split_reads=split_reads)
+    monkeypatch.setattr(services, "SessionLocal", Session)
+    monkeypatch.setattr(services.QUESTION_BUFFER, "request_refill", lambda name: None)
+    store = BlobStore(tmp_path / "blobs")
+    monkeypatch.setattr(services, "get_blob_store", lambda: store)
+    monkeypatch.setattr(file_model, "get_blob_store", lambda: store)
+
+    errors, ops_per_second = _stress()
+    print(f"\nsplit_reads={split_reads}: {ops_per_second:.0f} ops/s")
+    assert not errors, errors[:3]
+
+    with Session() as session:
+        assert session.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        notes = session.execute(text("SELECT count(*) FROM notes")).scalar()
+        files = session.execute(text("SELECT count(*) FROM files")).scalar()
+    assert notes + files > 0
+
+
+def test_split_sessions_read_their_writes(tmp_path):
+    Session = base.make_session(tmp_path / "split.db", split_reads=True)
+    with Session() as session:
+        session.add(Project(id=str(uuid4()), name="p"))
+        session.flush()
+        assert session.query(Project).filter_by(name="p").count() == 1  # writer
+        session.commit()
+        assert session.get_bind(clause=select(Project)) is Session.class_.reader
+        assert session.query(Project).count() == 1
+    with Session() as session:
+        session.connection().exec_driver_sql("VACUUM")  # not on a query_only reader
@@ -0,0 +1,104 @@
+import re
+
+import pytest
+from sqlalchemy import event
+
+from pacer import services
+from pacer.models import file_model
+from pacer.models.file_model import FileEntry
+from pacer.models.project_model import ProjectData
+from pacer.orm import base
+from pacer.orm.blob_store import BlobStore
+from pacer.orm.file_orm import File, FileType
+from pacer.orm.project_orm import Project
+
+_CONTENT_COLUMN = re.compile(r"files\.content\b(?!_hash)")
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    store = BlobStore(tmp_path / "blobs")
+    monkeypatch.setattr(services, "get_blob_store", lambda: store)
+    monkeypatch.setattr(file_model, "get_blob_store", lambda: store)
+    Session = base.make_session(tmp_path / "listing.db")
+    monkeypatch.setattr(services, "SessionLocal", Session)
+    return Session
+
+
+def _content_selects(Session, fn) -> tuple:
+    """The result of `fn` and the statements reading `files.content` meanwhile"""
+    engine = Session.kw["bind"]
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if _CONTENT_COLUMN.search(statement):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        result = fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return result, statements
+
+
+def test_listing_does_not_load_payloads(session):
+    services.add_project("big")
+    services.add_files(
+        [
+            FileEntry(
+                filepath=f"{i:03}.txt",
+                content=f"{i % 10}" * 100_000,
+                project_ref=ProjectData(name="big"),
+            )
+            for i in range(20)
+        ]
+    )
+    files, statements = _content_selects(session, lambda: services.list_files("big"))
+    assert not statements
+    assert len(files) == services.count_files("big") == 20
+    assert all(f.content == "" and f.size == 100_000 for f in files)
+    assert files[3].read_text() == "3" * 100_000  # from the blob store
+
+
+def test_legacy_content_is_loaded_when_read(session):
+    with session() as s:
+        project = Project(name="legacy")
+        s.add(project)
+        s.flush()
+        s.add(
+            File(
+                project_id=project.id,
+                filepath="old.md",
+                type=FileType.MARKDOWN,
+                content="# Old",
+            )
+        )
+        s.commit()
+
+    (entry,), statements = _content_selects(
+        session, lambda: services.list_files("legacy")
+    )
+    assert not statements and entry.type_ == FileType.MARKDOWN
+    text, statements = _content_selects(session, entry.read_text)
+    assert text == "# Old" and len(statements) == 1
+    assert entry.read_text() == "# Old"  # loaded once
+
+
+def test_pagination(session):
+    services.add_project("paged")
+    services.add_files(
+        [
+            FileEntry(
+                filepath=f"{i}.txt", content="x", project_ref=ProjectData(name="paged")
+            )
+            for i in (3, 1, 4, 0, 2)
+        ]
+    )
+    pages = [services.list_files("paged", offset=o, limit=2) for o in (0, 2, 4)]
+    assert [[f.filepath for f in page] for page in pages] == [
+        ["0.txt", "1.txt"],
+        ["2.txt", "3.txt"],
+        ["4.txt"],
+    ]
+    assert services.list_files("missing") == []
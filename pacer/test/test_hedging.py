@@ -0,0 +1,114 @@
+import random
+import statistics
+import time
+
+import pytest
+
+from pacer.llms.hedging import HedgeController, HedgePolicy
+
+
+class FakeService:
+    """Local service with an injected latency distribution:
+    `slow_ratio` of the calls take `slow` seconds, the rest `fast` seconds"""
+
+    def __init__(self, name, fast=0.005, slow=0.3, slow_ratio=0.0, seed=0, fail=False):
+        self.name = name
+        self.fast, self.slow, self.slow_ratio = fast, slow, slow_ratio
+        self.fail = fail
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    def __call__(self):
+        self.calls += 1
+        slow = self._rng.random() < self.slow_ratio
+        time.sleep(self.slow if slow else self.fast)
+        if self.fail:
+            raise ConnectionError(f"{self.name} failed")
+        return self.name
+
+
+def _run(controller, primary, secondary, n):
+    latencies, answers = [], []
+    for _ in range(n):
+        start = time.perf_counter()
+        answers.append(controller.call(primary, secondary, "p", "s", tokens=10))
+        latencies.append(time.perf_counter() - start)
+    return latencies, answers
+
+
+def test_hedging_cuts_tail_latency():
+    policy = HedgePolicy(
+        percentile=80, min_samples=10, initial_delay=1, max_hedge_ratio=0.5
+    )
+    controller = HedgeController(policy)
+    primary = FakeService("primary", slow_ratio=0.15, seed=1)
+    secondary = FakeService("secondary")
+
+    latencies, answers = _run(controller, primary, secondary, 80)
+    stats = controller.stats()
+
+    assert stats["hedged"] > 0
+    assert stats["secondary_wins"] > 0
+    assert set(answers) <= {"primary", "secondary"}
+    # After warm-up, no call waits for a slow primary
+    tail = sorted(latencies[20:])[-3:]
+    assert max(tail) < primary.slow
+    assert stats["hedged"] <= policy.max_hedge_ratio * stats["calls"]
+
+
+def test_extra_spend_is_capped():
+    policy = HedgePolicy(
+        min_samples=1000, initial_delay=0.001, max_hedge_ratio=1, max_extra_tokens=30
+    )
+    controller = HedgeController(policy)
+    primary = FakeService("primary", fast=0.02)
+    secondary = FakeService("secondary", fast=0.02)
+
+    _run(controller, primary, secondary, 10)
+    stats = controller.stats()
+    assert stats["hedged"] == 3  # 10 tokens per call
+    assert stats["extra_tokens"] == 30
+    assert stats["budget_denied"] == 7
+
+
+def test_extra_spend_budget_is_a_rolling_window():
+    policy = HedgePolicy(
+        min_samples=1000,
+        initial_delay=0.001,
+        max_hedge_ratio=1,
+        max_extra_tokens=30,
+        budget_window=0.3,
+    )
+    controller = HedgeController(policy)
+    primary = FakeService("primary", fast=0.02)
+    secondary = FakeService("secondary", fast=0.02)
+
+    _run(controller, primary, secondary, 5)
+    assert controller.stats()["hedged"] == 3
+    time.sleep(0.35)  # the window passed: hedging resumes
+    _run(controller, primary, secondary, 5)
+    stats = controller.stats()
+    assert stats["hedged"] == 6 and stats["extra_tokens"] == 60
+
+
+def test_first_valid_response_wins():
+    policy = HedgePolicy(min_samples=1000, initial_delay=0.001, max_hedge_ratio=1)
+    controller = HedgeController(policy)
+    primary = FakeService("primary", fast=0.01, fail=True)
+    secondary = FakeService("secondary", fast=0.05)
+
+    assert controller.call(primary, secondary, tokens=1) == "secondary"
+
+    failing = FakeService("secondary", fail=True)
+    with pytest.raises(ConnectionError):
+        controller.call(primary, failing, tokens=1)
+
+
+def test_delay_follows_percentile():
+    controller = HedgeController(HedgePolicy(percentile=50, min_samples=3))
+    assert controller.delay("p") == controller.policy.initial_delay
+    for seconds in (0.1, 0.2, 0.3, 0.4, 0.5):
+        controller.record_latency("p", seconds)
+    assert controller.delay("p") == pytest.approx(
+        statistics.median([0.1, 0.2, 0.3, 0.4, 0.5])
+    )
@@ -0,0 +1,95 @@
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from pacer import services
+from pacer.models import file_model
+from pacer.orm import base
+from pacer.orm.blob_store import BlobStore
+from pacer.tools import ingest, rag
+
+
+@pytest.fixture
+def course(tmp_path, monkeypatch):
+    store = BlobStore(tmp_path / "blobs")
+    monkeypatch.setattr(services, "get_blob_store", lambda: store)
+    monkeypatch.setattr(file_model, "get_blob_store", lambda: store)
+    monkeypatch.setattr(services, "SessionLocal", base.make_session(tmp_path / "i.db"))
+    monkeypatch.setattr(services.QUESTION_BUFFER, "request_refill", lambda name: None)
+    # Offline: paragraphs as chunks, words as tokens
+    monkeypatch.setattr(
+        ingest,
+        "_split",
+        lambda docs: [
+            rag.Document(page_content=part)
+            for doc in docs
+            for part in doc.page_content.split("\n\n")
+        ],
+    )
+    monkeypatch.setattr(ingest, "_count_tokens", lambda text: len(text.split()))
+
+    root = tmp_path / "course"
+    (root / "week1").mkdir(parents=True)
+    for n in range(5):
+        text = f"Lecture {n}\n\nSorting compares keys\n\nMerging is linear"
+        (root / "week1" / f"lecture{n}.md").write_text(text)
+    (root / "data.json").write_text('{"key": "value"}')
+    (root / "slides.bin").write_bytes(b"\x00")  # unsupported
+    return root
+
+
+def test_dry_run_estimates_cost(course, monkeypatch):
+    monkeypatch.setattr(rag, "insert_docs", lambda *a, **kw: pytest.fail("embedded"))
+    stats = ingest.ingest("course", [course], workers=2, dry_run=True)
+    assert (stats.files, stats.chunks, stats.tokens) == (6, 16, 42)
+    assert stats.cost() == pytest.approx(42 * 0.13 / 1e6)
+    assert "course" not in services.list_projects()
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts += texts
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+def test_interrupted_ingest_resumes(course, tmp_path, monkeypatch):
+    monkeypatch.setattr(rag.consts, "ROOT_DIR", tmp_path)  # .chroma_persist
+    embeddings = CountingEmbeddings()
+    add_files, batches = services.add_files, []
+
+    def interrupted(entries):
+        if batches:
+            raise KeyboardInterrupt
+        batches.append(entries)
+        return add_files(entries)
+
+    monkeypatch.setattr(services, "add_files", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        ingest.ingest(
+            "course", [course], workers=0, batch_size=4, embedding_function=embeddings
+        )
+    assert len(services.list_files("course")) == 4
+
+    monkeypatch.setattr(services, "add_files", add_files)
+    stats = ingest.ingest(
+        "course", [course / "week1", course], workers=0, embedding_function=embeddings
+    )
+    assert (stats.skipped, stats.files) == (4, 2)
+    files = services.list_files("course")
+    assert sorted(f.title for f in files) == [
+        "data.json",
+        *(f"lecture{n}.md" for n in range(5)),
+    ]
+    assert files[-1].read_text().startswith("Lecture 4")
+
+    # The interrupted batch was embedded once: its chunks are not embedded again
+    assert len(embeddings.texts) == 16
+    db = rag.insert_docs([], embedding_function=embeddings, sub_dir="course")
+    stored = db.get(include=["metadatas"])
+    assert len(stored["ids"]) == 16
+    assert {m["source"] for m in stored["metadatas"]} == {f.filepath for f in files}
@@ -0,0 +1,164 @@
+import threading
+import time
+from datetime import datetime as dt
+from datetime import timedelta, timezone
+
+import pytest
+
+from pacer import services
+from pacer.models.file_model import FileEntry
+from pacer.models.job_model import JobInfo
+from pacer.models.project_model import ProjectData
+from pacer.orm import base
+from pacer.orm.blob_store import BlobStore
+from pacer.orm.file_orm import File, FileStatus
+from pacer.orm.job_orm import Job, JobKind, JobStatus
+from pacer.tools import job_queue
+from pacer.tools.job_queue import JobQueue
+
+
+@pytest.fixture
+def Session(tmp_path):
+    return base.make_session(tmp_path / "jobs.db")
+
+
+@pytest.fixture
+def queue(Session):
+    queue = JobQueue(Session, workers=2, poll_interval=0.05, retry_delay=0.01)
+    yield queue
+    queue.stop(timeout=5)
+
+
+def test_jobs_are_deduplicated_by_key(queue):
+    release, runs = threading.Event(), []
+    queue.register(JobKind.QUIZ, lambda job, n: runs.append(n) or release.wait(5))
+
+    first = queue.submit(JobKind.QUIZ, key="quiz:a", n=1)
+    assert queue.submit(JobKind.QUIZ, key="quiz:a", n=2) == first
+    release.set()
+    assert queue.wait(first, timeout=5).status == JobStatus.SUCCEEDED
+    assert runs == [1]
+
+    assert queue.submit(JobKind.QUIZ, key="quiz:a", n=3) != first  # finished
+
+
+def test_failed_jobs_are_retried(queue):
+    attempts = []
+
+    def flaky(job):
+        attempts.append(job.info.attempts)
+        if len(attempts) < 3:
+            raise RuntimeError("rate limited")
+
+    queue.register(JobKind.SUMMARY, flaky)
+    queue.register(JobKind.QUIZ, lambda job: 1 / 0)
+
+    info = queue.wait(queue.submit(JobKind.SUMMARY), timeout=5)
+    assert info.status == JobStatus.SUCCEEDED and attempts == [1, 2, 3]
+
+    info = queue.wait(queue.submit(JobKind.QUIZ, max_attempts=2), timeout=5)
+    assert info.status == JobStatus.FAILED and info.attempts == 2
+    assert info.error == "ZeroDivisionError: division by zero"
+
+
+def test_progress_is_reported(queue):
+    updates: list[JobInfo] = []
+
+    def handler(job):
+        assert job.info.project_name == "p"
+        job.progress(0.5, "half way")
+
+    queue.register(JobKind.NOTEBOOK, handler, on_update=updates.append)
+    job_id = queue.submit(JobKind.NOTEBOOK, project_name="p", key="notebook:p")
+    queue.wait(job_id, timeout=5)
+    seen = [(u.status, u.progress, u.message) for u in updates]
+    assert seen == [
+        (JobStatus.QUEUED, None, ""),
+        (JobStatus.RUNNING, None, ""),
+        (JobStatus.RUNNING, 0.5, "half way"),
+        (JobStatus.SUCCEEDED, 1.0, "half way"),
+    ]
+
+
+def test_every_job_runs_once_across_queues(Session, queue):
+    """Two queues on one database, as the app and `pacer-cli worker`"""
+    runs, lock = [], threading.Lock()
+
+    def handler(job, n):
+        with lock:
+            runs.append(n)
+
+    other = JobQueue(Session, workers=2, poll_interval=0.05)
+    for q in (queue, other):
+        q.register(JobKind.SUMMARY, handler)
+    try:
+        ids = [queue.submit(JobKind.SUMMARY, n=n) for n in range(20)]
+        other.start()
+        assert all(queue.wait(i, timeout=10).status == "succeeded" for i in ids)
+    finally:
+        other.stop(timeout=5)
+    assert sorted(runs) == list(range(20))
+
+
+def test_jobs_of_dead_workers_are_requeued(Session, queue):
+    with Session() as session:
+        old = dt.now(timezone.utc) - timedelta(hours=1)
+        job = Job(
+            kind=JobKind.QUIZ, key="quiz:stale", status="running", heartbeat_at=old
+        )
+        session.add(job)
+        session.commit()
+        job_id = job.id
+    queue.register(JobKind.QUIZ, lambda job: None)
+    queue.start()
+    assert queue.wait(job_id, timeout=5).status == JobStatus.SUCCEEDED
+
+
+def test_long_jobs_keep_their_lease(Session, monkeypatch):
+    monkeypatch.setattr(job_queue, "LEASE_TIMEOUT", 0.3)
+    queue = JobQueue(Session, workers=1, poll_interval=0.05, heartbeat_interval=0.05)
+    statuses = []
+
+    def handler(job):  # no progress reports, longer than the lease
+        time.sleep(0.6)
+        queue._requeue_stale()  # as a worker starting elsewhere
+        statuses.append(queue.get(job.info.id).status)
+
+    queue.register(JobKind.QUIZ, handler)
+    try:
+        info = queue.wait(queue.submit(JobKind.QUIZ), timeout=5)
+    finally:
+        queue.stop(timeout=5)
+    assert statuses == [JobStatus.RUNNING]
+    assert info.status == JobStatus.SUCCEEDED and info.attempts == 1
+
+
+def test_summary_status_is_written_back(tmp_path, monkeypatch):
+    monkeypatch.setattr(services, "SessionLocal", base.make_session(tmp_path / "s.db"))
+    monkeypatch.setattr(services, "get_blob_store", lambda: BlobStore(tmp_path))
+    monkeypatch.setattr(services.QUESTION_BUFFER, "request_refill", lambda name: None)
+    services.add_project("jobs")
+    services.add_files(
+        [
+            FileEntry(
+                filepath="a.md", content="# A", project_ref=ProjectData(name="jobs")
+            )
+        ]
+    )
+    (file,) = services.list_files("jobs")
+    job = JobInfo(
+        id="1",
+        kind=JobKind.SUMMARY,
+        key=f"summary:{file.id}",
+        project_name="jobs",
+        payload=dict(file_id=str(file.id)),
+        status=JobStatus.FAILED,
+        error="boom",
+    )
+    services._summary_updated(job)
+
+    with services.SessionLocal() as session:
+        assert session.get(File, str(file.id)).status == FileStatus.FAILED
+    with services.SessionLocal() as session:
+        saved = services.PROJECTS.data(session, "jobs")["jobs"]["summary"]
+    assert saved["status"] == "failed" and saved["error"] == "boom"
@@ -0,0 +1,173 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pacer.tools.kernel_pool import KernelPool, SessionLease
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = KernelPool(warm=2, max_kernels=3)
+    pool.prewarm()
+    deadline = time.monotonic() + 60
+    while pool.stats()["ready"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.1)
+    yield pool
+    pool.shutdown()
+
+
+def test_first_run_uses_a_warm_kernel(pool):
+    result = pool.execute("a", "x = 21\nprint(x * 2)")
+    assert result.ok and result.stdout == "42\n"
+    assert result.elapsed < 0.5  # no kernel start-up
+    assert pool.stats()["warm_hits"] >= 1
+
+    # Kernels are leased per project
+    assert pool.execute("a", "x").result == "21"
+    assert "NameError" in pool.execute("b", "x").error
+
+
+def test_timeout_interrupts(pool):
+    result = pool.execute("a", "import time\nwhile True: time.sleep(0.01)", timeout=1)
+    assert result.timed_out and not result.ok
+    assert pool.execute("a", "1 + 1").result == "2"  # the kernel is usable again
+
+
+def test_release_recycles_a_reset_kernel(pool):
+    pool.execute("c", "secret = 1")
+    pool.release("c")
+    pool.release("a")
+    pool.release("b")
+    assert pool.stats()["leased"] == 0
+    for project in ("d", "e"):
+        assert "NameError" in pool.execute(project, "secret").error
+
+
+def test_cap_evicts_least_recently_used(pool):
+    for project in ("f", "g", "h", "i"):
+        pool.execute(project, "1")
+    stats = pool.stats()
+    assert stats["leased"] + stats["ready"] + stats["starting"] <= 3
+    assert stats["evictions"] >= 1
+
+
+def test_output_is_streamed(pool):
+    arrivals = []
+    code = (
+        "import time\nfor i in range(3):\n    print(i, flush=True)\n    time.sleep(0.3)"
+    )
+    result = pool.execute(
+        "stream", code, on_output=lambda name, text: arrivals.append(time.monotonic())
+    )
+    assert result.stdout == "0\n1\n2\n"
+    assert arrivals[-1] - arrivals[0] > 0.5  # while the cell was running
+
+
+def test_memory_limit_and_dead_kernels(pool):
+    result = pool.execute("hog", "x = bytearray(4 * 1024**3)")
+    assert "MemoryError" in result.error
+    assert pool.execute("hog", "1 + 1").result == "2"
+
+    result = pool.execute("hog", "import os\nos._exit(1)", timeout=10)
+    assert "DeadKernelError" in result.error and not result.timed_out
+    assert pool.execute("hog", "1 + 1").result == "2"  # a fresh kernel
+
+
+def test_sessions_run_in_parallel(pool):
+    for session in ("session-1", "session-2"):
+        pool.execute(session, "1")  # leased (started) beforehand
+    with ThreadPoolExecutor(2) as ex:
+        start = time.monotonic()
+        results = list(
+            ex.map(
+                lambda session: pool.execute(session, "import time; time.sleep(1)"),
+                ["session-1", "session-2"],
+            )
+        )
+    assert all(r.ok for r in results)
+    assert time.monotonic() - start < 1.9
+
+
+def test_huge_output_is_bounded(pool):
+    result = pool.execute("loud", "for i in range(300_000): print(i)", timeout=60)
+    assert result.ok and result.truncated > 0
+    assert result.stdout.startswith("0\n1\n") and result.stdout.endswith("299999\n")
+    assert len(result.stdout) < 1_100_000
+
+
+class FakeKernel:
+    """Stands in for a `Kernel` that takes a while to start"""
+
+    live = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def __init__(self):
+        time.sleep(0.2)
+        with FakeKernel.lock:
+            FakeKernel.live += 1
+            FakeKernel.peak = max(FakeKernel.peak, FakeKernel.live)
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.stopped = False
+
+    def alive(self) -> bool:
+        return not self.stopped
+
+    def shutdown(self) -> None:
+        with FakeKernel.lock:
+            FakeKernel.live -= 1
+        self.stopped = True
+
+
+def test_concurrent_cold_starts(monkeypatch):
+    monkeypatch.setattr(FakeKernel, "live", 0)
+    monkeypatch.setattr(FakeKernel, "peak", 0)
+    pool = KernelPool(warm=0, max_kernels=2, kernel_factory=FakeKernel)
+    try:
+        with ThreadPoolExecutor(8) as ex:
+            kernels = list(ex.map(lambda _: pool.lease("p"), range(8)))
+        assert len({id(k) for k in kernels}) == 1  # one kernel, none leaked
+        assert FakeKernel.live == 1 and pool.stats()["cold_starts"] == 1
+
+        with ThreadPoolExecutor(3) as ex:
+            list(ex.map(pool.lease, ["a", "b", "c"]))
+        pool._starter.shutdown(wait=True)  # evicted kernels are shut down
+        assert FakeKernel.peak <= 2 and FakeKernel.live <= 2
+        assert pool.stats()["leased"] == FakeKernel.live
+    finally:
+        pool.shutdown()
+
+
+def test_held_lease_is_not_evicted(monkeypatch):
+    monkeypatch.setattr(FakeKernel, "live", 0)
+    pool = KernelPool(warm=0, max_kernels=1, idle_timeout=0, kernel_factory=FakeKernel)
+    try:
+        # `execute` holds the lease before the kernel takes its own lock
+        kernel = pool.lease("a", hold=True)
+        with pytest.raises(RuntimeError, match="busy"):
+            pool.lease("b")
+        pool.evict_idle()
+        assert not kernel.stopped and pool.stats()["leased"] == 1
+
+        pool._unhold(kernel)
+        pool.lease("b")  # "a" is evictable again
+        pool._starter.shutdown(wait=True)
+        assert kernel.stopped
+    finally:
+        pool.shutdown()
+
+
+def test_session_lease_is_released_with_the_session(monkeypatch):
+    monkeypatch.setattr(FakeKernel, "live", 0)
+    pool = KernelPool(warm=0, max_kernels=2, kernel_factory=FakeKernel)
+    try:
+        lease = SessionLease(pool)
+        kernel = pool.lease(lease.project)
+        del lease  # e.g. the Streamlit session state is dropped
+        pool._starter.shutdown(wait=True)
+        assert pool.stats()["leased"] == 0 and kernel.stopped
+    finally:
+        pool.shutdown()
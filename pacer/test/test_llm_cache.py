@@ -0,0 +1,79 @@
+import pytest
+from langchain_core.outputs import Generation
+
+from pacer.llms import llm_cache
+from pacer.llms.llm_cache import LLMCache
+
+LLM = "ChatOpenAI"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    return now
+
+
+def _cache(tmp_path, **kwargs) -> LLMCache:
+    return LLMCache(tmp_path / "cache.db", evict_every=10_000, **kwargs)
+
+
+def _answer(text: str):
+    return [Generation(text=text)]
+
+
+def test_indentation_is_part_of_the_key(tmp_path):
+    cache = _cache(tmp_path)
+    cache.update("def f():\n    return 1", LLM, _answer("four spaces"))
+    assert cache.lookup("def f():\n return 1", LLM) is None
+    assert cache.lookup("  def f():\n    return 1\n", LLM)[0].text == "four spaces"
+
+
+def test_ttl_eviction(tmp_path, clock):
+    cache = _cache(tmp_path, ttl=60)
+    cache.update("old", LLM, _answer("old"))
+    clock[0] += 30
+    cache.update("new", LLM, _answer("new"))
+    clock[0] += 45
+
+    assert cache.lookup("old", LLM) is None  # expired, even before eviction
+    assert cache.evict() == 1
+    assert cache.lookup("new", LLM)[0].text == "new"
+    assert cache.stats()["entries"] == 1
+
+
+def test_lru_eviction_over_the_caps(tmp_path, clock):
+    cache = _cache(tmp_path, max_entries=2, ttl=None)
+    for prompt in ("a", "b", "c"):
+        cache.update(prompt, LLM, _answer(prompt))
+        clock[0] += 1
+    cache.lookup("a", LLM)  # "b" is now the least recently used
+
+    assert cache.evict() == 1
+    assert cache.lookup("b", LLM) is None  # gone from the hot tier too
+    assert [cache.lookup(p, LLM)[0].text for p in ("a", "c")] == ["a", "c"]
+
+    size = cache.stats()["bytes"] // 2
+    (tmp_path / "small").mkdir()
+    small = _cache(tmp_path / "small", max_bytes=size, ttl=None)
+    for prompt in ("a", "c"):
+        small.update(prompt, LLM, _answer(prompt))
+        clock[0] += 1
+    assert small.evict() == 1
+    assert small.lookup("a", LLM) is None and small.lookup("c", LLM)
+
+
+def test_stats(tmp_path):
+    cache = _cache(tmp_path, hot_entries=1)
+    cache.update("a", LLM, _answer("a"))
+    cache.update("b", LLM, _answer("b"))  # pushes "a" out of the hot tier
+    cache.lookup("a", LLM)
+    cache.lookup("a", LLM)
+    cache.lookup("missing", LLM)
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["hot_hits"], stats["misses"]) == (2, 1, 1)
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+    assert stats["updates"] == 2 and stats["entries"] == 2
+    assert stats["bytes_saved"] == stats["bytes"] > 0  # "a" twice, same size as "b"
+    assert cache.last_lookup_hit() is False
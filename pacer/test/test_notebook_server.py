@@ -0,0 +1,70 @@
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from pacer.tools.jupyter_handler import JupyterHandler
+from pacer.tools.notebook_server import NotebookServer
+
+
+def http_server(port: int) -> list[str]:
+    """Stand-in for `jupyter-notebook` (answers HTTP, starts in ~100ms)"""
+    return [sys.executable, "-m", "http.server", str(port), "--bind", "127.0.0.1"]
+
+
+def child_processes() -> int:
+    proc = Path("/proc")
+    if not proc.exists():
+        pytest.skip("needs /proc")
+    count = 0
+    for stat in proc.glob("[0-9]*/stat"):
+        try:
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        count += fields[0] != "Z" and int(fields[1]) == os.getpid()
+    return count
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = NotebookServer(
+        root_dir=tmp_path, command=http_server, health_path="/", health_interval=0.2
+    )
+    yield server
+    server.stop()
+
+
+def test_reruns_reuse_one_server(server):
+    baseline = child_processes()
+    latencies = []
+    for i in range(100):  # one Streamlit fragment rerun per iteration
+        start = time.perf_counter()
+        handler = JupyterHandler(f"project {i % 3}", server=server)
+        handler.add_markdown("# Title").run_jupyter()
+        latencies.append(time.perf_counter() - start)
+        assert child_processes() - baseline == 1
+
+    assert server.starts == 1
+    print(
+        f"first: {latencies[0]:.3f}s, median rerun: {statistics.median(latencies):.4f}s"
+    )
+    assert statistics.median(latencies[1:]) < 0.05
+    assert max(latencies[1:]) < 1.0  # no fixed sleeps, health checks are cheap
+
+
+def test_dead_server_is_restarted(server):
+    server.ensure_running()
+    first_pid = server.pid
+    server._process.kill()
+    server._process.wait()
+
+    deadline = time.monotonic() + 10  # the watchdog restarts it
+    while time.monotonic() < deadline and server.starts < 2:
+        time.sleep(0.05)
+    assert server.starts == 2
+    assert server.ensure_running().healthy()  # waits for the restart to be ready
+    assert server.pid != first_pid
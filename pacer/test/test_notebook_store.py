@@ -0,0 +1,116 @@
+from functools import partial
+from uuid import uuid4
+
+import nbformat as nbf
+import pytest
+from sqlalchemy import event
+
+from pacer.orm import base
+from pacer.orm.project_orm import Project
+from pacer.tools.jupyter_handler import JupyterHandler
+from pacer.tools.notebook_server import NotebookServer
+from pacer.tools.notebook_store import NotebookStore
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    name = f"notebook-{uuid4()}"
+    db_path = tmp_path / "notebooks.db"
+    monkeypatch.setattr(base, "make_session", partial(base.make_session, db_path))
+    with base.make_session()() as session:
+        session.add(Project(name=name))
+        session.commit()
+    return name
+
+
+def _inserted_rows(fn) -> int:
+    """Rows inserted into `jupyter_cells` while running `fn`"""
+    engine = base.make_session().kw["bind"]
+    counts = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO jupyter_cells"):
+            counts.append(len(parameters) if executemany else 1)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return sum(counts)
+
+
+def test_append_and_patch(project):
+    store = NotebookStore(project)
+    cells = [nbf.v4.new_markdown_cell("# Title"), nbf.v4.new_code_cell("x = 1")]
+    store.append(cells)
+    assert _inserted_rows(lambda: store.append([nbf.v4.new_code_cell("x")])) == 1
+
+    loaded = store.load()
+    assert [c.source for c in loaded] == ["# Title", "x = 1", "x"]
+    assert [c.id for c in loaded[:2]] == [c.id for c in cells]
+
+    loaded[2].outputs = [nbf.v4.new_output("stream", name="stdout", text="1\n")]
+    loaded[2].metadata["pacer"] = dict(ok=True)
+    store.patch([loaded[2]])
+    (cell,) = [c for c in store.load() if c.id == loaded[2].id]
+    assert cell.outputs[0].text == "1\n" and cell.metadata["pacer"]["ok"]
+
+
+def test_handler_saves_incrementally(project, tmp_path):
+    server = NotebookServer(root_dir=tmp_path, port=1, watchdog=False)
+    handler = JupyterHandler(project, server=server)
+    handler.add_markdown("# Title").add_code("print(1)").save_changes()
+    assert not handler.main_ipynb_path.exists()  # exported lazily
+
+    handler.add_code("print(2)")
+    assert _inserted_rows(handler.save_changes) == 1
+
+    reloaded = JupyterHandler(project, server=server)
+    assert [c.source for c in reloaded.cells] == ["# Title", "print(1)", "print(2)"]
+
+    server.ensure_running = lambda: server
+    handler.run_jupyter()
+    with open(handler.main_ipynb_path) as fl:
+        nb = nbf.read(fl, as_version=4)
+    nbf.validate(nb)
+    assert [c.id for c in nb.cells] == [c.id for c in reloaded.cells]
+
+
+def test_legacy_notebook_is_imported(project, tmp_path):
+    server = NotebookServer(root_dir=tmp_path, port=1, watchdog=False)
+    path = JupyterHandler(project, server=server).main_ipynb_path
+    nb = nbf.v4.new_notebook(cells=[nbf.v4.new_code_cell("legacy = True")])
+    with open(path, "w", encoding="utf-8") as fl:
+        nbf.write(nb, fl)
+
+    assert [c.source for c in JupyterHandler(project, server=server).cells] == [
+        "legacy = True"
+    ]
+    assert [c.source for c in NotebookStore(project).load()] == ["legacy = True"]
+
+
+def test_notebook_edits_are_imported(project, tmp_path):
+    server = NotebookServer(root_dir=tmp_path, port=1, watchdog=False)
+    server.ensure_running = lambda: server
+    handler = JupyterHandler(project, server=server)
+    handler.add_markdown("# Title").add_code("x = 1").run_jupyter()
+
+    # Edited in Jupyter: a changed cell, a new one, a deleted one
+    with open(handler.main_ipynb_path, encoding="utf-8") as fl:
+        nb = nbf.read(fl, as_version=4)
+    nb.cells[1].source = "x = 2"
+    nb.cells.append(nbf.v4.new_code_cell("print(x)"))
+    del nb.cells[0]
+    with open(handler.main_ipynb_path, "w", encoding="utf-8") as fl:
+        nbf.write(nb, fl)
+
+    handler.add_code("y = x + 1").save_changes()  # stored, not exported yet
+    handler.add_code("print(y)").run_jupyter()
+
+    expected = ["x = 2", "print(x)", "y = x + 1", "print(y)"]
+    assert [c.source for c in handler.cells] == expected
+    assert [c.source for c in NotebookStore(project).load()] == expected
+    with open(handler.main_ipynb_path, encoding="utf-8") as fl:
+        assert [c.source for c in nbf.read(fl, as_version=4).cells] == expected
+    assert [c.source for c in JupyterHandler(project, server=server).cells] == expected
@@ -0,0 +1,179 @@
+import json
+import time
+from uuid import uuid4
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from pacer.models.code_cell_model import CellType
+from pacer.tools import rag
+
+NOTEBOOK = {
+    "cells": [
+        (
+            {"type": "markdown", "content": f"# Part {i}"}
+            if i % 2 == 0
+            else {"type": "python", "content": f"print({i})"}
+        )
+        for i in range(8)
+    ]
+}
+
+
+class StreamingToolModel(BaseChatModel):
+    """Writes the `NOTEBOOK` tool call in small chunks, `delay` seconds apart"""
+
+    delay: float = 0.02
+    chunk_size: int = 16
+
+    @property
+    def _llm_type(self) -> str:
+        return "streaming-tool"
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        message = AIMessage(
+            content="",
+            tool_calls=[{"name": "JupyterCells", "args": NOTEBOOK, "id": "1"}],
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        args = json.dumps(NOTEBOOK)
+        for start in range(0, len(args), self.chunk_size):
+            time.sleep(self.delay)
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[
+                        {
+                            "name": "JupyterCells" if start == 0 else None,
+                            "args": args[start : start + self.chunk_size],
+                            "id": "1" if start == 0 else None,
+                            "index": 0,
+                        }
+                    ],
+                )
+            )
+
+
+class StoredDB:
+    """`get` of a vector store holding one chunk"""
+
+    def get(self, ids=None, include=()):
+        return dict(
+            ids=["a.md:0"], documents=["numpy basics"], metadatas=[{"source": "a.md"}]
+        )
+
+
+class FakeDB(StoredDB):
+    def as_retriever(self, **kwargs):
+        return RunnableLambda(lambda query: [Document(page_content="numpy basics")])
+
+
+def test_cells_are_yielded_as_they_complete():
+    llm = StreamingToolModel()
+    start = time.perf_counter()
+    arrivals, cells = [], []
+    for cell in rag.stream_jupyter_cells(FakeDB(), llm=llm):
+        arrivals.append(time.perf_counter() - start)
+        cells.append(cell)
+    total = time.perf_counter() - start
+
+    assert [(c.type, c.content) for c in cells] == [
+        (CellType(c["type"]), c["content"]) for c in NOTEBOOK["cells"]
+    ]
+    assert arrivals[0] < total / 4  # the first cell long before the last one
+
+    # Same cells as the blocking call
+    blocking = rag.create_jupyter_cells(FakeDB(), llm=llm)
+    assert [c.content for c in blocking.cells] == [c.content for c in cells]
+
+
+class SectionModel(BaseChatModel):
+    """Outlines 4 sections, then writes each one in `delay` seconds
+    (the first section is the slowest)"""
+
+    delay: float = 0.2
+    prompts: list = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "sections"
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = messages[-1].content
+        self.prompts.append(prompt)
+        name = kwargs["tools"][0]["function"]["name"]
+        if name == "NotebookOutline":
+            args = {
+                "sections": [
+                    {"title": f"Part {i}", "description": "...", "query": f"q{i}"}
+                    for i in range(4)
+                ]
+            }
+        else:
+            part = prompt.split('titled "')[1].split('"')[0]
+            time.sleep(self.delay * (2 if part == "Part 0" else 1))
+            args = {
+                "cells": [
+                    {"type": "markdown", "content": f"# {part}"},
+                    {"type": "python", "content": f"print({part!r})"},
+                ]
+            }
+        message = AIMessage(
+            content="", tool_calls=[{"name": name, "args": args, "id": "1"}]
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class QueryDB(StoredDB):
+    def __init__(self):
+        self.queries = []
+
+    def as_retriever(self, **kwargs):
+        def retrieve(query):
+            self.queries.append(query)
+            return [Document(page_content=f"source for {query!r}")]
+
+        return RunnableLambda(retrieve)
+
+
+def test_sections_are_generated_concurrently_in_order():
+    llm, db = SectionModel(cache=False), QueryDB()
+    start = time.perf_counter()
+    cells = list(rag.stream_sectioned_cells(db, llm=llm, max_concurrency=4))
+    elapsed = time.perf_counter() - start
+
+    assert [c.content for c in cells[::2]] == [f"# Part {i}" for i in range(4)]
+    assert {"q0", "q1", "q2", "q3"} <= set(db.queries)  # per-section retrieval
+    assert elapsed < 2 * llm.delay + 0.3  # the slowest section, not the sum (1s)
+
+
+def test_outline_digest_covers_every_source():
+    db = Chroma(
+        collection_name=f"digest-{uuid4().hex}",
+        embedding_function=DeterministicFakeEmbedding(size=8),
+    )
+    db.add_documents(
+        [
+            Document(page_content=f"topic {s}.{n}", metadata={"source": f"{s}.md"})
+            for s in range(40)
+            for n in range(10)
+        ]
+    )
+    llm = SectionModel(delay=0, cache=False)  # not the process-wide LLM cache
+    rag.create_notebook_outline(db, llm=llm)
+    (digest,) = llm.prompts
+    assert all(f"topic {s}." in digest for s in range(40))  # not the first 30 only
@@ -0,0 +1,97 @@
+import nbformat as nbf
+import pytest
+
+from pacer.tools.kernel_pool import KernelPool
+from pacer.tools.notebook_validation import dependencies, validate_cells
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = KernelPool(warm=2, max_kernels=4)
+    pool.prewarm()
+    yield pool
+    pool.shutdown()
+
+
+def test_dependencies():
+    deps = dependencies(
+        [
+            "import numpy as np",
+            "x = np.arange(3)",
+            "def f(a):\n    return a + 1",
+            "print(f(x))",
+            "%time y = 1",
+            "print(len(str(y)))",
+        ]
+    )
+    assert deps == [set(), {0}, set(), {1, 2}, set(), {4}]  # magics are barriers
+
+
+def test_in_place_changes_are_dependencies():
+    assert dependencies(["items = []", "items.append(1)", "print(len(items))"]) == [
+        set(),
+        {0},
+        {1},
+    ]
+    deps = dependencies(
+        [
+            "df = {}",
+            'df["b"] = 1',
+            "model = Model()",
+            "model.fit(df)",
+            "counter = 0",
+            "def inc():\n    global counter\n    counter += 1",
+            "inc()",
+            "print(model, counter)",
+        ]
+    )
+    assert deps[3] == {1, 2} and deps[6] == {4, 5} and deps[7] == {3, 6}
+
+
+def _notebook(*sources):
+    return [nbf.v4.new_markdown_cell("# Practice")] + [
+        nbf.v4.new_code_cell(source) for source in sources
+    ]
+
+
+def test_validation_is_memoized(pool):
+    cells = _notebook("x = 2", "print(x * 21)", "y = undefined_name", "'independent'")
+    reports = validate_cells(cells, pool=pool)
+
+    assert [r.ok for r in reports] == [True, True, False, True]
+    assert not any(r.cached for r in reports)
+    assert "NameError" in reports[2].error
+    assert cells[2].outputs[0].text == "42\n"
+    assert cells[4].outputs[0].data["text/plain"] == "'independent'"
+
+    # Appending (as `update_jupyter_cells` does) only runs new cells and their deps
+    cells.append(nbf.v4.new_code_cell("z = x + 1\nz"))
+    reports = validate_cells(cells, pool=pool)
+    assert [r.cached for r in reports] == [False, True, True, True, False]
+    assert cells[5].outputs[0].data["text/plain"] == "3"
+
+    # Changing a cell re-runs it and its dependents
+    cells[1].source = "x = 3"
+    reports = validate_cells(cells, pool=pool)
+    assert [r.cached for r in reports] == [False, False, True, True, False]
+    assert cells[2].outputs[0].text == "63\n"
+
+    # Outputs and memo keys are saved into the notebook
+    nb = nbf.v4.new_notebook(cells=cells)
+    nbf.validate(nb)
+    again = nbf.reads(nbf.writes(nb), as_version=4)
+    assert all(r.cached for r in validate_cells(again.cells, pool=pool))
+
+
+def test_mutating_cells_are_rerun(pool):
+    cells = _notebook("items = []", "items.append(1)", "print(len(items))")
+    assert all(r.ok for r in validate_cells(cells, pool=pool))
+
+    cells.append(nbf.v4.new_code_cell("print(items[0])"))
+    reports = validate_cells(cells, pool=pool)
+    assert reports[-1].ok and cells[-1].outputs[0].text == "1\n"
+
+    cells[2].source = "items.append(2)"  # invalidates the cells after it
+    reports = validate_cells(cells, pool=pool)
+    assert [r.cached for r in reports] == [False, False, False, False]
+    assert cells[3].outputs[0].text == "1\n" and cells[4].outputs[0].text == "2\n"
@@ -0,0 +1,70 @@
+import time
+
+from pacer.tools.output_capture import (
+    AnsiHtmlRenderer,
+    LiveOutput,
+    OutputBuffer,
+    ansi_to_html,
+)
+
+
+def test_buffer_keeps_head_and_tail():
+    buffer = OutputBuffer(limit=1000, head=200)
+    for i in range(100_000):
+        buffer.write(f"line {i}\n")
+    text = buffer.text()
+    assert text.startswith("line 0\nline 1\n")
+    assert text.endswith("line 99999\n")
+    assert len(buffer) <= 1000 and buffer.dropped > 0
+    assert "characters truncated" in text
+
+
+def test_ansi_rendering():
+    html = ansi_to_html("\x1b[1;31mfail\x1b[0m <ok>\n\x1b[2Kdone")
+    assert '<span style="font-weight: bold;color: red;">fail</span>' in html
+    assert " &lt;ok&gt;\ndone</pre>" in html
+
+
+def test_rendering_is_incremental():
+    buffer, renderer = OutputBuffer(limit=10_000), AnsiHtmlRenderer()
+    buffer.write("\x1b[32m")
+    buffer.write("green\x1b")  # escape split between chunks
+    buffer.write("[0m plain")
+    assert '<span style="color: green;">green</span> plain</pre>' in renderer.render(
+        buffer
+    )
+    assert renderer.render(buffer) is renderer.render(buffer)  # cached
+
+    fed = []
+    feed = renderer.feed
+    renderer.feed = lambda text: fed.append(text) or feed(text)
+    buffer.write("\nmore")
+    renderer.render(buffer)
+    assert fed == ["\nmore"]  # only the new chunk is converted
+
+
+def test_million_lines_render_fast():
+    buffer, renderer = OutputBuffer(limit=100_000), AnsiHtmlRenderer()
+    start = time.perf_counter()
+    for i in range(10_000):  # streamed in chunks of 100 lines
+        buffer.write("".join(f"\x1b[33m{i}\x1b[0m line\n" for _ in range(100)))
+        if i % 100 == 0:
+            renderer.render(buffer)
+    html = renderer.render(buffer)
+    assert time.perf_counter() - start < 10
+    assert len(html) < 10 * 100_000
+
+
+def test_live_output_is_throttled_and_bounded():
+    updates = []
+    live = LiveOutput(updates.append, interval=0.2, tail=1000)
+    start = time.perf_counter()
+    for i in range(200_000):
+        live.write(f"line {i}\n")
+    live.flush()
+    elapsed = time.perf_counter() - start
+
+    assert len(updates) <= elapsed / 0.2 + 2  # not once per message
+    assert all(len(update) < 2000 for update in updates)  # the tail only
+    assert updates[-1].endswith("line 199999\n</pre>")
+    assert "line 0\n" in live.html()  # all of it once the cell ended
@@ -0,0 +1,135 @@
+import gc
+import time
+from functools import partial
+from uuid import uuid4
+
+from pacer.orm import base
+from pacer.orm.project_orm import Project
+from pacer.quiz.practice import (
+    DAY,
+    DueQueue,
+    Grade,
+    Practice,
+    ReviewState,
+    load_states,
+    schedule,
+)
+
+
+def test_sm2_intervals():
+    state = ReviewState(key="q")
+    intervals = []
+    for _ in range(4):
+        state = schedule(state, Grade.GOOD, now=0)
+        intervals.append(state.interval)
+    assert intervals[:2] == [1.0, 6.0]
+    assert intervals[3] > intervals[2] > 6.0
+
+    failed = schedule(state, Grade.AGAIN, now=0)
+    assert failed.repetitions == 0 and failed.due < DAY
+    assert failed.ease < state.ease
+    assert failed.attempts == 5 and failed.correct == 4
+
+
+class Due(float):
+    """A due time counting the comparisons made by the heaps"""
+
+    compared = 0
+
+    def __lt__(self, other):
+        Due.compared += 1
+        return float(self) < other
+
+
+def test_due_slice_of_a_large_bank(monkeypatch):
+    now = time.time()
+    states = [
+        ReviewState(key=str(i), due=Due(now + (i % 7 - 3) * DAY)) for i in range(50_000)
+    ]
+    queue = DueQueue(states)
+
+    monkeypatch.setattr(Due, "compared", 0)
+    due = queue.due(now=now, n=10)
+
+    assert len(due) == 10
+    assert all(s.due == now - 3 * DAY for s in due)  # most overdue first
+    assert Due.compared < len(states) // 10  # no scan of the whole bank
+
+    for s in due:  # reviewed questions leave the due slice
+        queue.push(schedule(s, Grade.GOOD, now=now))
+    assert not {s.key for s in due} & {s.key for s in queue.due(now=now, n=10)}
+
+
+def test_reviews_are_saved_in_batches():
+    saved = []
+    practice = Practice(
+        "p",
+        [f"Question {i}?" for i in range(30)],
+        batch_size=5,
+        load=lambda name: [],
+        save=lambda name, states: saved.append(len(states)),
+    )
+    for state in practice.due(n=12):
+        practice.review(state.key, Grade.GOOD)
+    assert saved == [5, 5]
+    assert practice.flush() == 2
+    assert practice.count_due() == 18
+
+
+def test_reviews_persist(tmp_path, monkeypatch):
+    name = f"practice-{uuid4()}"
+    SessionLocal = base.make_session(tmp_path / "practice.db")
+    monkeypatch.setattr(
+        base, "make_session", partial(base.make_session, tmp_path / "practice.db")
+    )
+    with SessionLocal() as session:
+        session.add(Project(name=name))
+        session.commit()
+
+    practice = Practice(name, ["What is X?", "What is Y?"])
+    state = practice.due(n=1)[0]
+    practice.review(state.key, Grade.EASY)
+    practice.flush()
+
+    (loaded,) = load_states(name)
+    assert loaded.key == state.key and loaded.repetitions == 1
+    assert Practice(name, ["What is X?", "What is Y?"]).count_due() == 1
+
+
+def test_due_count_is_kept_by_the_queue(monkeypatch):
+    now = time.time()
+    states = [ReviewState(key=str(i), due=Due(now + i * 60)) for i in range(50_000)]
+    queue = DueQueue(states)
+    assert queue.count_due(now=now) == 1
+
+    monkeypatch.setattr(Due, "compared", 0)
+    counts = [queue.count_due(now=now + 60 * n) for n in range(1, 101)]
+    assert Due.compared < len(states) // 10  # no scan of the whole bank
+    assert counts == list(range(2, 102))
+
+    late = now + 100 * 60
+    queue.push(schedule(queue.states["0"], Grade.GOOD, now=late))  # tomorrow
+    queue.push(ReviewState(key="new", due=late))  # due now
+    queue.remove("1")
+    assert queue.count_due(now=late) == 100
+    assert queue.count_due(now=now) == 0  # the past is recounted
+    assert queue.count_due(now=late + DAY) == sum(
+        s.due <= late + DAY for s in queue.states.values()
+    )
+
+
+def test_pending_reviews_are_saved_when_dropped():
+    saved = []
+    practice = Practice(
+        "p",
+        ["What is X?", "What is Y?"],
+        load=lambda name: [],
+        save=lambda name, states: saved.extend(s.key for s in states),
+    )
+    state = practice.due(n=1)[0]
+    practice.review(state.key, Grade.GOOD)
+    assert saved == []
+
+    del practice
+    gc.collect()
+    assert saved == [state.key]
@@ -0,0 +1,153 @@
+import random
+import threading
+import time
+
+import numpy as np
+from langchain.schema import Document
+
+from pacer import services
+from pacer.llms.replay import ReplayChatModel, ReplayEmbeddings
+from pacer.quiz import quiz_creater
+from pacer.quiz.question_index import QuestionIndex
+from pacer.quiz.quiz_creater import (
+    Quiz,
+    QuizQuestion,
+    _allocate,
+    add_questions,
+    create_quiz,
+    make_sections,
+    merge_sections,
+)
+
+
+def _docs(n: int, tokens: int = 1000) -> list[Document]:
+    return [
+        Document(page_content=f"Chapter {i}. " + "word " * (tokens * 4 // 5))
+        for i in range(n)
+    ]
+
+
+def test_sections_are_token_bounded():
+    sections = make_sections(_docs(5), max_tokens=1500)
+    assert len(sections) == 5
+    assert all(len(s) // 4 <= 1500 for s in sections)
+    # Small documents are packed together, large ones are split
+    assert len(make_sections(_docs(6, tokens=100), max_tokens=1500)) == 1
+    assert len(make_sections(_docs(1, tokens=5000), max_tokens=1500)) >= 4
+
+
+def test_merge_dedups_and_fills_quotas():
+    def q(text):
+        return QuizQuestion(question=text, answer="a", options=["a", "b"])
+
+    merged = merge_sections(
+        [[q("What is X?"), q("what is x")], [q("What is Y?"), q("What is Z?")]],
+        quotas=[2, 1],
+    )
+    assert [m.question for m in merged] == ["What is X?", "What is Y?", "What is Z?"]
+
+
+def test_allocation_covers_the_whole_corpus():
+    rng = random.Random(0)
+    weights = [1000 + i for i in range(20)]  # later sections slightly larger
+    covered = set()
+    for _ in range(10):
+        quotas = _allocate(weights, 3, rng=rng)
+        assert sum(quotas) == 3 and max(quotas) == 1
+        picked = [i for i, quota in enumerate(quotas) if quota]
+        assert picked[0] < 7 and 5 < picked[1] < 14 and picked[2] > 12  # spread
+        covered |= set(picked)
+    assert len(covered) > 10  # not the same sections every quiz
+
+    quotas = _allocate([100, 300, 600], 10, rng=rng)
+    assert sum(quotas) == 10 and quotas[1] in (3, 4) and quotas[2] == 6
+
+
+def test_sections_run_concurrently():
+    llm = ReplayChatModel(latency=0.2, cache=False)
+    docs = _docs(8)
+
+    start = time.perf_counter()
+    quiz = create_quiz(docs, llm=llm, n_questions=8, max_concurrency=8)
+    elapsed = time.perf_counter() - start
+
+    assert len(quiz.questions) == 8
+    assert len({q.question for q in quiz.questions}) == 8
+    assert elapsed < 8 * 0.2 / 2
+
+
+def test_index_rejects_repeats():
+    index = QuestionIndex(embedding=ReplayEmbeddings(size=64))
+    novel = index.novel(
+        ["What is X?", "What is Y?", "what is  y?"], existing=["what is x?"]
+    )
+    assert novel == [False, True, False]
+
+
+def test_index_is_consistent_across_threads_and_instances(tmp_path):
+    embedding = ReplayEmbeddings(size=16, latency=0.005)
+    texts = [f"Question {n}?" for n in range(40)]
+    a, b = (QuestionIndex("p", embedding=embedding, directory=tmp_path) for _ in "ab")
+
+    def work(index, part):
+        for text in part:
+            index.vectors([text, texts[0]])
+
+    threads = [
+        threading.Thread(target=work, args=(index, texts[n::4]))
+        for n, index in enumerate([a, b, a, b])
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    fresh = QuestionIndex("p", embedding=embedding, directory=tmp_path)
+    expected = np.asarray(embedding.embed_documents(texts), dtype=np.float32)
+    for index in (a, b, fresh):
+        assert np.allclose(index.vectors(texts), expected, atol=1e-6)
+    assert fresh.embedded == 0  # nothing an instance saved was overwritten
+
+
+def test_add_questions_cost_stays_flat():
+    index = QuestionIndex(embedding=ReplayEmbeddings(size=64))
+    llm = ReplayChatModel(cache=False)
+    docs = _docs(3)
+    quiz = create_quiz(docs, llm=llm, n_questions=3)
+
+    embedded = []
+    for _ in range(4):
+        before = index.embedded
+        quiz = add_questions(docs, quiz, llm=llm, n_questions=3, index=index)
+        embedded.append(index.embedded - before)
+
+    assert len(quiz.questions) > 3
+    assert len({q.question for q in quiz.questions}) == len(quiz.questions)
+    # After the first call only the new candidates are embedded
+    assert max(embedded[1:]) <= 3 * 2
+
+
+def test_requested_count_without_buffered_questions(monkeypatch):
+    docs, saved = _docs(8), {}
+    monkeypatch.setattr(services, "list_files", lambda name: [])
+    monkeypatch.setattr(services, "read_sources", lambda files: docs)
+    monkeypatch.setattr(services, "get_quiz", lambda project_name: saved.get("quiz"))
+    monkeypatch.setattr(
+        services,
+        "_save_quiz_data",
+        lambda name, quiz: saved.update(quiz=Quiz.model_validate_json(quiz)),
+    )
+    monkeypatch.setattr(services.QUESTION_BUFFER, "take", lambda name, n: [])
+    monkeypatch.setattr(services.QUESTION_BUFFER, "request_refill", lambda name: None)
+    monkeypatch.setattr(
+        services,
+        "QuestionIndex",
+        lambda name: QuestionIndex(embedding=ReplayEmbeddings(size=64)),
+    )
+    llm = ReplayChatModel(cache=False)
+    monkeypatch.setattr(
+        quiz_creater.LLMSwitch, "get_current", staticmethod(lambda **kw: llm)
+    )
+
+    assert len(services.create_quiz("p", n_questions=4).questions) == 4
+    assert len(services.create_quiz("p", n_questions=2).questions) == 6
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from pacer.config import consts
+from pacer.llms import llm_adapter
+from pacer.llms.llm_adapter import LLMService, LLMSwitch
+from pacer.llms.replay import Cassette, ReplayChatModel, ReplayEmbeddings, ReplayMode
+from pacer.llms.scheduler import ScheduledChatModelMixin
+
+
+@pytest.fixture(autouse=True)
+def fresh_cassettes(monkeypatch):
+    """Cassettes are shared per path: start each test from the files"""
+    monkeypatch.setattr(Cassette, "_open", {})
+
+
+def test_record_then_replay(tmp_path):
+    path = tmp_path / "llm.json"
+    inner = FakeListChatModel(responses=["first", "second"])
+    recorder = ReplayChatModel(mode=ReplayMode.RECORD, cassette_path=path, inner=inner)
+    assert recorder.invoke("q1", cache=False).content == "first"
+    assert recorder.invoke("q2", cache=False).content == "second"
+
+    cassette = Cassette.open(path)
+    assert not path.exists()  # batched: written on flush (or exit), not per call
+    cassette.flush()
+    assert len(json.loads(path.read_text())) == 2
+
+    Cassette._open.clear()
+    player = ReplayChatModel(mode=ReplayMode.REPLAY, cassette_path=path)
+    assert player.invoke("q2", cache=False).content == "second"
+    assert player.invoke("q1", cache=False).content == "first"
+
+
+def test_replay_of_an_unrecorded_request(tmp_path):
+    player = ReplayChatModel(mode=ReplayMode.REPLAY, cassette_path=tmp_path / "x.json")
+    with pytest.raises(KeyError, match="not in cassette"):
+        player.invoke("never recorded", cache=False)
+
+
+def test_replay_embeddings(tmp_path):
+    path = tmp_path / "embeddings.json"
+    fake = ReplayEmbeddings(size=8)
+    assert fake.embed_query("a") == fake.embed_query("a") != fake.embed_query("b")
+    assert sum(x * x for x in fake.embed_query("a")) == pytest.approx(1.0)
+
+    recorder = ReplayEmbeddings(ReplayMode.RECORD, cassette_path=path, inner=fake)
+    vectors = recorder.embed_documents(["a", "b"])
+    Cassette.open(path).flush()
+
+    Cassette._open.clear()
+    player = ReplayEmbeddings(ReplayMode.REPLAY, cassette_path=path, size=8)
+    assert player.embed_documents(["b", "a"]) == vectors[::-1]
+    with pytest.raises(KeyError):
+        player.embed_query("c")
+
+
+def test_recording_service_is_scheduled_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(consts, "REPLAY_MODE", ReplayMode.RECORD)
+    monkeypatch.setenv("PACER_CASSETTE", str(tmp_path / "llm.json"))
+    monkeypatch.setenv("PACER_RECORD_SERVICE", "fake")
+    monkeypatch.setitem(
+        LLMSwitch._services, "fake", lambda **kw: FakeListChatModel(responses=["x"])
+    )
+    model = LLMSwitch.get(LLMService.REPLAY)
+    assert isinstance(model, ScheduledChatModelMixin)
+    assert not isinstance(model.inner, ScheduledChatModelMixin)
+    assert llm_adapter.replay().inner.responses == ["x"]
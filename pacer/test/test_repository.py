@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import inspect
+
+from pacer import services
+from pacer.models.file_model import FileEntry
+from pacer.models.project_model import ProjectData
+from pacer.orm import base
+from pacer.orm.blob_store import BlobStore
+from pacer.orm.file_orm import File
+from pacer.orm.note_orm import Note
+from pacer.tools import query_benchmark
+
+
+@pytest.fixture
+def Session(tmp_path, monkeypatch):
+    store = BlobStore(tmp_path / "blobs")
+    monkeypatch.setattr(services, "get_blob_store", lambda: store)
+    Session = base.make_session(tmp_path / "repository.db")
+    monkeypatch.setattr(services, "SessionLocal", Session)
+    monkeypatch.setattr(services.QUESTION_BUFFER, "request_refill", lambda name: None)
+    return Session
+
+
+def test_foreign_keys_and_paths_are_indexed(Session):
+    inspector = inspect(Session.kw["bind"])
+    for table in ("files", "notes", "chat_messages", "jupyter_cells", "quiz_reviews"):
+        indexed = {index["column_names"][0] for index in inspector.get_indexes(table)}
+        assert "project_id" in indexed, table
+    files = {tuple(index["column_names"]) for index in inspector.get_indexes("files")}
+    assert {("filepath",), ("project_id", "filepath")} <= files
+
+
+def test_project_id_is_resolved_once(Session):
+    services.add_project("cached")
+    services.add_note("a note", "cached")
+    engine = Session.kw["bind"]
+    with query_benchmark._count_queries(engine) as statements:
+        assert [n.content for n in services.get_notes("cached")] == ["a note"]
+    assert len(statements) == 1  # the notes, by the cached project id
+
+
+def test_delete_project_cascades(Session):
+    services.add_project("doomed")
+    services.add_note("a note", "doomed")
+    services.add_files(
+        [
+            FileEntry(
+                filepath="a.txt", content="a", project_ref=ProjectData(name="doomed")
+            )
+        ]
+    )
+    (entry,) = services.list_files("doomed")
+    assert services.get_blob_store().exists(entry.content_hash)
+
+    services.delete_project("doomed")
+    with Session() as session:
+        assert not session.query(File).count() and not session.query(Note).count()
+    assert not services.get_blob_store().exists(entry.content_hash)
+    assert services.list_files("doomed") == []
+
+    services.add_project("doomed")  # the cached id was dropped
+    services.add_note("again", "doomed")
+    assert [n.content for n in services.get_notes("doomed")] == ["again"]
+
+
+def test_benchmark_reports_every_call():
+    rows = query_benchmark.run(projects=5, files=10, repeat=1)
+    assert {row["call"] for row in rows} >= {"list_files", "get_notes"}
+    assert all(row["queries"] <= 2 for row in rows if row["call"] != "delete_project")
@@ -0,0 +1,136 @@
+import threading
+import time
+from typing import Optional
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from pacer.llms import usage
+from pacer.llms.hedging import HedgedChatModel
+from pacer.llms.llm_adapter import LLMSwitch
+from pacer.llms.routing import LatencyTracker, TaskClass
+
+
+class FakeChatModel(BaseChatModel):
+    """Answers its own name after `delay` seconds; times out past `timeout`"""
+
+    reply: str
+    delay: float = 0.0
+    fail: bool = False
+    timeout: Optional[float] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.timeout is not None and self.delay > self.timeout:
+            time.sleep(self.timeout)
+            raise TimeoutError(f"{self.reply} timed out")
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError(f"{self.reply} is down")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(self.reply))])
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """Registers fakes: `big` is selected, `small` is its cheap sibling and
+    `backup` another provider. Returns the factory of fake services."""
+
+    def service(name, **behaviour):
+        def make(**kwargs):
+            return FakeChatModel(reply=name, cache=False, **behaviour, **kwargs)
+
+        return make
+
+    services = {name: service(name) for name in ("big", "small", "backup")}
+    monkeypatch.setattr(LLMSwitch, "_services", services)
+    monkeypatch.setattr(LLMSwitch, "_current", "big")
+    monkeypatch.setattr(
+        LLMSwitch,
+        "routes",
+        {
+            TaskClass.ANSWER: {"big": ["big", "backup"]},
+            TaskClass.AUXILIARY: {"big": ["small", "backup"]},
+        },
+    )
+    monkeypatch.setattr(LLMSwitch, "timeouts", {TaskClass.AUXILIARY: 0.05})
+    monkeypatch.setattr(LLMSwitch, "hedged_tasks", set())
+    monkeypatch.setattr(usage, "record", lambda row: None)
+    return service
+
+
+def test_auxiliary_tasks_use_the_cheap_model(service):
+    assert LLMSwitch.route(TaskClass.ANSWER) == ["big", "backup"]
+    assert LLMSwitch.route(TaskClass.AUXILIARY) == ["small", "backup"]
+    assert LLMSwitch.get_current().invoke("q").content == "big"
+    assert LLMSwitch.get_current(TaskClass.AUXILIARY).invoke("q").content == "small"
+
+    LLMSwitch.set_route(TaskClass.AUXILIARY, "big", ["backup"])
+    assert LLMSwitch.get_current(TaskClass.AUXILIARY).invoke("q").content == "backup"
+    with pytest.raises(ValueError):
+        LLMSwitch.set_route(TaskClass.AUXILIARY, "big", ["unknown"])
+
+    LLMSwitch.switch("small")  # no rule: the selected service is used as-is
+    assert LLMSwitch.route(TaskClass.AUXILIARY) == ["small"]
+
+
+def test_fallback_on_error_and_timeout(service):
+    LLMSwitch._services["big"] = service("big", fail=True)
+    assert LLMSwitch.get_current().invoke("q").content == "backup"
+
+    LLMSwitch._services["small"] = service("small", delay=1.0)
+    start = time.perf_counter()
+    assert LLMSwitch.get_current(TaskClass.AUXILIARY).invoke("q").content == "backup"
+    assert time.perf_counter() - start < 0.5  # the task's timeout, not the delay
+
+    # A service that cannot be built (e.g. no API key) is skipped
+    def broken(**kwargs):
+        raise RuntimeError("missing API key")
+
+    LLMSwitch._services["small"] = broken
+    assert LLMSwitch.get_current(TaskClass.AUXILIARY).invoke("q").content == "backup"
+
+
+def test_latency_report(service):
+    LLMSwitch._services["slow_small"] = service("slow_small", delay=0.02)
+    LLMSwitch._services["failing_small"] = service("failing_small", fail=True)
+    LLMSwitch.set_route(TaskClass.AUXILIARY, "big", ["failing_small", "slow_small"])
+    for _ in range(3):
+        LLMSwitch.get_current(TaskClass.AUXILIARY).invoke("q")
+
+    report = LLMSwitch.latency_report()[TaskClass.AUXILIARY]
+    assert report["slow_small"]["count"] == 3 and report["slow_small"]["errors"] == 0
+    assert report["slow_small"]["p50"] >= 0.02
+    assert report["failing_small"]["count"] == report["failing_small"]["errors"] == 3
+
+
+def test_hedging_is_chosen_per_context(service):
+    def hedged() -> bool:
+        return isinstance(LLMSwitch.get_current().runnable, HedgedChatModel)
+
+    assert not hedged()
+    other_session = []
+    with LLMSwitch.hedging():
+        assert hedged()
+        thread = threading.Thread(target=lambda: other_session.append(hedged()))
+        thread.start()
+        thread.join()
+        with LLMSwitch.hedging(False):
+            assert not hedged()
+    assert not hedged() and other_session == [False]  # nothing global changed
+    assert LLMSwitch.hedged_tasks == set()
+
+
+def test_latency_tracker_aggregates():
+    tracker = LatencyTracker(window=4)
+    for seconds in (5.0, 1.0, 2.0, 3.0, 4.0):  # the first one leaves the window
+        tracker.record("answer", "big", seconds)
+    tracker.record("answer", "backup", 0.5, error=True)
+
+    report = tracker.report()["answer"]
+    assert report["big"] == dict(count=4, errors=0, mean=2.5, p50=2.5, p95=3.85)
+    assert report["backup"] == dict(count=1, errors=1, mean=0.5, p50=0.5, p95=0.5)
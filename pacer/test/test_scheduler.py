@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+from pacer.llms.scheduler import (
+    LLMScheduler,
+    Priority,
+    RateLimited,
+    ServiceLimits,
+    TokenBucket,
+    priority,
+)
+
+
+class FakeProvider:
+    """Local stand-in for an LLM API: answers 429 for the first `fail_first` calls"""
+
+    def __init__(self, fail_first: int = 0, retry_after: float = 0.01):
+        self.fail_first = fail_first
+        self.retry_after = retry_after
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, answer="ok"):
+        with self.lock:
+            self.calls += 1
+            if self.calls <= self.fail_first:
+                raise RateLimited(retry_after=self.retry_after)
+        return answer
+
+
+def test_token_bucket():
+    now = [0.0]
+    bucket = TokenBucket(capacity=10, rate=1, clock=lambda: now[0])
+    assert bucket.wait_time(10) == 0
+    bucket.take(10)
+    assert bucket.wait_time(2) == pytest.approx(2)
+    now[0] += 2
+    assert bucket.wait_time(2) == 0
+    bucket.adjust(5)  # under-estimated: pay back the debt
+    assert bucket.level == pytest.approx(-3)
+
+
+def test_retry_on_429():
+    provider = FakeProvider(fail_first=3)
+    scheduler = LLMScheduler(base_delay=0.001, jitter=0.1)
+
+    assert scheduler.submit("fake", provider) == "ok"
+    assert provider.calls == 4
+    metrics = scheduler.metrics()["fake"]
+    assert metrics["rate_limited"] == metrics["retries"] == 3
+    assert metrics["completed"] == 1
+    assert metrics["queued"] == 0
+
+
+def test_gives_up_after_max_retries():
+    provider = FakeProvider(fail_first=100)
+    scheduler = LLMScheduler(max_retries=2, base_delay=0.001)
+    with pytest.raises(RateLimited):
+        scheduler.submit("fake", provider)
+    assert provider.calls == 3
+    assert scheduler.metrics()["fake"]["failed"] == 1
+
+
+def test_priority_order():
+    scheduler = LLMScheduler()
+    scheduler.configure("fake", ServiceLimits(requests_per_minute=60 * 20))
+    order = []
+    start = threading.Barrier(7)
+
+    def worker(level: Priority, name: str):
+        start.wait()
+        time.sleep(0.01 * level)  # enqueue in a predictable order
+        with priority(level):
+            scheduler.submit("fake", lambda: order.append(name), tokens=1)
+
+    # Drain the request bucket so every worker has to queue
+    scheduler._state("fake").requests.take(scheduler._state("fake").requests.capacity)
+    threads = [
+        threading.Thread(target=worker, args=(Priority.BACKGROUND, f"bg{i}"))
+        for i in range(3)
+    ] + [
+        threading.Thread(target=worker, args=(Priority.INTERACTIVE, f"chat{i}"))
+        for i in range(3)
+    ]
+    for t in threads:
+        t.start()
+    start.wait()
+    for t in threads:
+        t.join(timeout=10)
+
+    assert set(order[:3]) == {"chat0", "chat1", "chat2"}
+    assert set(order[3:]) == {"bg0", "bg1", "bg2"}
+
+
+def test_queue_depth_metrics():
+    scheduler = LLMScheduler()
+    scheduler.configure("fake", ServiceLimits(requests_per_minute=60))  # 1 per second
+    scheduler._state("fake").requests.take(60)
+    done = threading.Event()
+    t = threading.Thread(target=lambda: scheduler.submit("fake", done.set))
+    t.start()
+    time.sleep(0.05)
+    assert scheduler.queue_depth("fake") == 1
+    assert scheduler.metrics()["fake"]["queued_by_priority"]["NORMAL"] == 1
+    t.join(timeout=5)
+    assert done.is_set()
+    assert scheduler.queue_depth() == 0
+
+
+def test_stream_holds_a_slot_until_exhausted():
+    scheduler = LLMScheduler()
+    chunks = scheduler.stream("fake", lambda: iter("abc"))
+    assert next(chunks) == "a"
+    assert scheduler.metrics()["fake"]["in_flight"] == 1
+    assert list(chunks) == ["b", "c"]
+    metrics = scheduler.metrics()["fake"]
+    assert metrics["in_flight"] == 0 and metrics["completed"] == 1
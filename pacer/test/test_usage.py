@@ -0,0 +1,112 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.outputs import LLMResult
+
+from pacer.llms import llm_cache, usage
+from pacer.orm import base
+from pacer.orm.llm_usage_orm import LLMUsage
+
+
+@pytest.fixture
+def Session(tmp_path, monkeypatch):
+    Session = base.make_session(tmp_path / "usage.db")
+    monkeypatch.setattr(usage, "_session", lambda: Session())
+    monkeypatch.setattr(usage, "_pending", [])
+    return Session
+
+
+@pytest.fixture
+def cache_hit(monkeypatch):
+    hit = [False]
+    cache = SimpleNamespace(last_lookup_hit=lambda reset=False: hit[0])
+    monkeypatch.setattr(llm_cache, "get_llm_cache", lambda: cache)
+    return hit
+
+
+def _call(handler, prompt=100, completion=20, error=False):
+    run_id = uuid.uuid4()
+    params = dict(model_name="gpt-4o")
+    handler.on_chat_model_start({}, [[]], run_id=run_id, invocation_params=params)
+    if error:
+        handler.on_llm_error(RuntimeError("boom"), run_id=run_id)
+        return
+    tokens = dict(prompt_tokens=prompt, completion_tokens=completion)
+    result = LLMResult(generations=[[]], llm_output=dict(token_usage=tokens))
+    handler.on_llm_end(result, run_id=run_id)
+
+
+def test_calls_are_recorded_per_operation_and_project(Session, cache_hit):
+    handler = usage.UsageCallbackHandler(service="openai_4o", task="answer")
+
+    @usage.track
+    def create_quiz(project_name: str, errors: int = 0):
+        _call(handler)
+        for _ in range(errors):
+            _call(handler, error=True)
+
+    create_quiz("algebra")
+    create_quiz("algebra", errors=1)
+    create_quiz(project_name="physics")
+    cache_hit[0] = True
+    create_quiz("physics")
+    cache_hit[0] = False
+    _call(handler)  # outside any tracked operation
+
+    totals = {(t["project"], t["operation"]): t for t in usage.project_totals()}
+    assert set(totals) == {
+        ("algebra", "create_quiz"),
+        ("physics", "create_quiz"),
+        (None, "unknown"),
+    }
+    algebra = totals[("algebra", "create_quiz")]
+    assert (algebra["calls"], algebra["prompt_tokens"]) == (3, 200)
+    assert algebra["cost"] == pytest.approx(2 * usage.cost_of("gpt-4o", 100, 20))
+    physics = totals[("physics", "create_quiz")]
+    assert physics["cache_hits"] == 1
+    assert physics["cost"] == pytest.approx(usage.cost_of("gpt-4o", 100, 20))
+    assert [t["operation"] for t in usage.project_totals("physics")] == ["create_quiz"]
+
+    with Session() as session:
+        (errored,) = session.query(LLMUsage).filter(LLMUsage.error.is_(True)).all()
+        assert (errored.project_name, errored.cost, errored.prompt_tokens) == (
+            "algebra",
+            0.0,
+            0,
+        )
+        hit = session.query(LLMUsage).filter(LLMUsage.cache_hit.is_(True)).one()
+        assert hit.cost == 0.0 and hit.prompt_tokens == 100
+
+
+def test_rows_are_written_in_batches(Session, cache_hit, monkeypatch):
+    monkeypatch.setattr(usage, "FLUSH_EVERY", 3600)
+    monkeypatch.setattr(usage, "FLUSH_SIZE", 3)
+    handler = usage.UsageCallbackHandler(service="openai_4o")
+    for _ in range(2):
+        _call(handler)
+    with Session() as session:
+        assert session.query(LLMUsage).count() == 0
+    _call(handler)
+    with Session() as session:
+        assert session.query(LLMUsage).count() == 3
+
+    _call(handler)  # pending, flushed by the reports
+    assert usage.project_totals()[0]["calls"] == 4
+
+
+def test_latency_report(Session, monkeypatch):
+    for operation, latency, error in [
+        ("summarize", 1.0, False),
+        ("summarize", 3.0, False),
+        ("summarize", 60.0, True),  # errored calls are left out
+        ("ask", 0.5, False),
+    ]:
+        usage.record(
+            LLMUsage(operation=operation, latency=latency, error=error, cost=0.0)
+        )
+    report = {r["operation"]: r for r in usage.latency_report()}
+    assert report["summarize"] == dict(
+        operation="summarize", calls=2, p50=2.0, p95=2.9, total=4.0
+    )
+    assert report["ask"]["calls"] == 1 and report["ask"]["p95"] == 0.5
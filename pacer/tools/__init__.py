@@ -1,4 +1,3 @@
-from langchain.globals import set_llm_cache
-from langchain_community.cache import SQLiteCache
+from pacer.llms import llm_cache
 
-set_llm_cache(SQLiteCache(database_path=".langchain.db"))
+llm_cache.install()
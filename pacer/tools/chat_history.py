@@ -0,0 +1,159 @@
+"""A project's chat, persisted in `chat_messages` with a bounded prompt
+A turn sends only the last `window` messages verbatim. The older ones are
+folded into a rolling summary, stored as a `SUMMARY` row that records the
+last position it covers. Once `fold_every` messages have left the window, the
+summary is extended with just those messages, not rewritten from the whole
+chat. Prompt size stays the same however long the chat gets.
+
+Example usage:
+    >>> history = ChatHistory("My Project")
+    >>> history.append(HumanMessage("What is a heap?"))
+    >>> summary, recent = history.context()  # for `rag.context_chat`
+"""
+
+from typing import Callable, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from sqlalchemy import func
+
+from pacer.orm import base
+from pacer.orm.chat_message_orm import ChatMessage, MessageCategory
+from pacer.orm.repository import get_project_repository
+
+WINDOW = 8  # messages (4 turns) sent verbatim
+FOLD_EVERY = 4  # messages out of the window before the summary is extended
+
+_MESSAGE_TYPES = {"human": HumanMessage, "ai": AIMessage, "system": SystemMessage}
+
+Summarize = Callable[[str, list[BaseMessage]], str]  # (summary, new messages)
+
+
+def _to_message(row: ChatMessage) -> BaseMessage:
+    return _MESSAGE_TYPES.get(row.type, HumanMessage)(content=row.content)
+
+
+class ChatHistory:
+    def __init__(
+        self,
+        project_name: str,
+        Session=None,
+        window: int = WINDOW,
+        fold_every: int = FOLD_EVERY,
+        summarize: Summarize = None,
+    ):
+        self.project_name = project_name
+        self.Session = Session or base.make_session()
+        self.window = window
+        self.fold_every = fold_every
+        self.summarize = summarize
+
+    def _messages(self, session, project_id: str):
+        return session.query(ChatMessage).filter(
+            ChatMessage.project_id == project_id,
+            ChatMessage.category.is_(None),
+        )
+
+    def _summary_row(self, session, project_id: str) -> Optional[ChatMessage]:
+        return (
+            session.query(ChatMessage)
+            .filter(
+                ChatMessage.project_id == project_id,
+                ChatMessage.category == MessageCategory.SUMMARY,
+            )
+            .first()
+        )
+
+    def append(self, *messages: BaseMessage) -> None:
+        with self.Session() as session:
+            project_id = get_project_repository().project_id(session, self.project_name)
+            if project_id is None:
+                return
+            last = (
+                session.query(func.max(ChatMessage.position))
+                .filter(ChatMessage.project_id == project_id)
+                .scalar()
+            )
+            start = -1 if last is None else last
+            session.add_all(
+                ChatMessage(
+                    project_id=project_id,
+                    position=start + offset,
+                    type=message.type,
+                    content=message.content,
+                )
+                for offset, message in enumerate(messages, 1)
+            )
+            session.commit()
+
+    def recent(self, n: int = None) -> list[BaseMessage]:
+        """The last `n` (default: `window`) messages, oldest first"""
+        with self.Session() as session:
+            project_id = get_project_repository().project_id(session, self.project_name)
+            rows = (
+                self._messages(session, project_id)
+                .order_by(ChatMessage.position.desc())
+                .limit(n or self.window)
+                .all()
+            )
+            return [_to_message(row) for row in reversed(rows)]
+
+    def context(self) -> tuple[str, list[BaseMessage]]:
+        """(summary of the older messages, the last `window` messages)"""
+        with self.Session() as session:
+            project_id = get_project_repository().project_id(session, self.project_name)
+            rows = (
+                self._messages(session, project_id)
+                .order_by(ChatMessage.position.desc())
+                .limit(self.window + 1)
+                .all()
+            )[::-1]
+            recent = rows[-self.window :] if self.window else []
+            summary_row = self._summary_row(session, project_id)
+            folded = summary_row.position if summary_row else -1
+            summary = summary_row.content if summary_row else ""
+            if len(rows) <= self.window:
+                return summary, [_to_message(row) for row in recent]
+
+            # -1- Fold the messages that left the window (a batch at a time)
+            window_start = recent[0].position if recent else rows[-1].position + 1
+            unfolded = (
+                self._messages(session, project_id)
+                .filter(
+                    ChatMessage.position > folded,
+                    ChatMessage.position < window_start,
+                )
+                .order_by(ChatMessage.position)
+                .all()
+            )
+            if len(unfolded) >= self.fold_every:
+                summary = self._summarize(summary, [_to_message(r) for r in unfolded])
+                if summary_row is None:
+                    summary_row = ChatMessage(
+                        project_id=project_id,
+                        type="system",
+                        category=MessageCategory.SUMMARY,
+                    )
+                    session.add(summary_row)
+                summary_row.content = summary
+                summary_row.position = unfolded[-1].position
+                session.commit()
+                unfolded = []
+
+            # -2- Messages out of the window, not folded yet, stay verbatim
+            messages = [_to_message(row) for row in [*unfolded, *recent]]
+            return summary, messages
+
+    def _summarize(self, summary: str, messages: list[BaseMessage]) -> str:
+        if self.summarize is None:
+            from pacer.tools import rag
+
+            return rag.fold_chat_summary(summary, messages)
+        return self.summarize(summary, messages)
+
+    def clear(self) -> None:
+        with self.Session() as session:
+            project_id = get_project_repository().project_id(session, self.project_name)
+            session.query(ChatMessage).filter(
+                ChatMessage.project_id == project_id
+            ).delete(synchronize_session=False)
+            session.commit()
@@ -0,0 +1,196 @@
+"""Bulk ingestion of files into a project (`pacer-cli ingest`)
+Files under the given paths are parsed and chunked in a process pool (the
+next batch is parsed while the current one is stored), embedded into the
+project's vector store one batch at a time, and stored with one transaction
+per batch. A file's row is only written once its chunks are embedded, so the
+project's rows are the checkpoint: an interrupted run, started again, skips
+the files already stored. `dry_run` only parses, to estimate the embedding
+cost up front.
+
+Example usage:
+    $ pacer-cli ingest "Algorithms" ~/courses/algorithms --dry-run
+    $ pacer-cli ingest "Algorithms" ~/courses/algorithms notes.md --workers 8
+"""
+
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable
+
+from langchain_core.documents.base import Document
+
+from pacer.llms import usage
+from pacer.models.file_model import FileEntry
+from pacer.models.project_model import ProjectData
+from pacer.orm.file_orm import FileType
+
+BATCH_SIZE = 32  # files per embedding call and DB transaction
+EMBEDDING_MODEL = "text-embedding-3-large"
+SUFFIXES = {t.suffix for t in FileType if t.suffix}
+
+
+@dataclass
+class Parsed:
+    path: str
+    data: bytes = b""
+    chunks: list[str] = field(default_factory=list)
+    tokens: int = 0
+    error: str = ""
+
+
+@dataclass
+class IngestStats:
+    files: int = 0
+    chunks: int = 0
+    tokens: int = 0
+    skipped: int = 0  # stored by an earlier run
+    failed: list[str] = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+
+    def throughput(self) -> str:
+        seconds = max(time.perf_counter() - self.started, 1e-9)
+        return (
+            f"{self.files / seconds:.1f} files/s, {self.chunks / seconds:.1f} "
+            f"chunks/s, {self.tokens / seconds:,.0f} tokens/s"
+        )
+
+    def cost(self, model: str = EMBEDDING_MODEL) -> float:
+        return usage.cost_of(model, self.tokens, 0)
+
+
+def _split(docs: list[Document]) -> list[Document]:
+    from pacer.tools import rag
+
+    return rag.split_documents(docs)
+
+
+@lru_cache(1)
+def _encoding():
+    import tiktoken
+
+    return tiktoken.encoding_for_model(EMBEDDING_MODEL)
+
+
+def _count_tokens(text: str) -> int:
+    return len(_encoding().encode(text, disallowed_special=()))
+
+
+def parse(path: str) -> Parsed:
+    """Read and chunk one file (runs in a pool process)"""
+    try:
+        data = Path(path).read_bytes()
+        if FileType.from_suffix(Path(path).suffix) == FileType.PDF:
+            from pacer.tools import rag
+
+            docs = rag.read_pdf(Path(path))
+        else:
+            docs = [Document(page_content=data.decode("utf-8", errors="replace"))]
+        chunks = [doc.page_content for doc in _split(docs) if doc.page_content]
+        tokens = sum(map(_count_tokens, chunks))
+        return Parsed(path=path, data=data, chunks=chunks, tokens=tokens)
+    except Exception as e:  # one broken file must not stop the run
+        return Parsed(path=path, error=f"{type(e).__name__}: {e}")
+
+
+def walk(paths: Iterable[Path]) -> list[str]:
+    """The supported files under `paths` (sorted, as absolute paths)"""
+    found = set()
+    for path in map(Path, paths):
+        candidates = path.rglob("*") if path.is_dir() else [path]
+        for candidate in candidates:
+            if candidate.is_file() and candidate.suffix in SUFFIXES:
+                found.add(str(candidate.resolve()))
+    return sorted(found)
+
+
+class _Inline(Executor):
+    """`workers=0`: parse in this process"""
+
+    def map(self, fn, *iterables, **kwargs):
+        return map(fn, *iterables)
+
+
+def _store(project_name: str, parsed: list[Parsed], embedding_function) -> None:
+    from pacer import services
+    from pacer.tools import rag
+
+    docs = [
+        Document(page_content=chunk, metadata=dict(source=p.path))
+        for p in parsed
+        for chunk in p.chunks
+    ]
+    if docs:  # embedded before the rows are written: rows mark finished files
+        rag.insert_docs(
+            docs, embedding_function=embedding_function, sub_dir=project_name
+        )
+    services.add_files(
+        [
+            FileEntry(
+                filepath=p.path,
+                content=p.data,
+                data=dict(title=Path(p.path).name, chunks=len(p.chunks)),
+                project_ref=ProjectData(name=project_name),
+            )
+            for p in parsed
+        ]
+    )
+
+
+def ingest(
+    project_name: str,
+    paths: Iterable[Path],
+    workers: int = None,
+    batch_size: int = BATCH_SIZE,
+    dry_run: bool = False,
+    embedding_function=None,
+) -> IngestStats:
+    """Ingest the files under `paths` into the project (created if missing)
+
+    Args:
+        workers: parsing processes (default: CPU count, 0: in this process)
+        dry_run: parse and count tokens only, nothing is embedded or stored
+    """
+    from pacer import services
+
+    # -1- What is left to do
+    stats = IngestStats()
+    todo = walk(paths)
+    if project_name in services.list_projects():
+        stored = {f.filepath for f in services.list_files(project_name)}
+        stats.skipped = sum(path in stored for path in todo)
+        todo = [path for path in todo if path not in stored]
+    elif not dry_run:
+        services.add_project(project_name)
+    print(f"[ingest] {len(todo)} files to ingest ({stats.skipped} already stored)")
+
+    # -2- Parse the next batch while this one is embedded and stored
+    batches = [todo[i : i + batch_size] for i in range(0, len(todo), batch_size)]
+    workers = os.cpu_count() if workers is None else workers
+    pool = ProcessPoolExecutor(workers) if workers else _Inline()
+    with pool:
+        pending = pool.map(parse, batches[0]) if batches else iter(())
+        for n in range(len(batches)):
+            parsed = list(pending)
+            if n + 1 < len(batches):
+                pending = pool.map(parse, batches[n + 1])
+            for p in parsed:
+                if p.error:
+                    print(f"[ingest] skipping {p.path}: {p.error}")
+                    stats.failed.append(p.path)
+            parsed = [p for p in parsed if not p.error]
+            if not dry_run:
+                _store(project_name, parsed, embedding_function)
+            stats.files += len(parsed)
+            stats.chunks += sum(len(p.chunks) for p in parsed)
+            stats.tokens += sum(p.tokens for p in parsed)
+            print(
+                f"[ingest] {stats.files}/{len(todo)} files, {stats.chunks} chunks, "
+                f"{stats.tokens:,} tokens | {stats.throughput()}"
+            )
+
+    verb = "would cost" if dry_run else "cost"
+    print(f"[ingest] embedding {stats.tokens:,} tokens {verb} ~${stats.cost():.4f}")
+    return stats
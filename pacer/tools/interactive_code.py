@@ -1,6 +1,5 @@
 import contextlib
 import io
-import re
 import sys
 import time
 from io import StringIO
@@ -10,61 +9,24 @@ import streamlit as st
 from IPython.core.interactiveshell import InteractiveShell
 
 from pacer.models.code_cell_model import Code
+from pacer.tools.kernel_pool import KernelsBusy, SessionLease, get_kernel_pool
+from pacer.tools.output_capture import (
+    ANSI_ESCAPE,
+    LiveOutput,
+    ansi_to_html,
+)
+
+EXECUTION_TIMEOUT = 30  # seconds, the cell is interrupted after that
 
 if "code_actions" not in st.session_state:
     st.session_state.code_actions = {}
 
-# ANSI color mappings
-ANSI_COLORS = {
-    "30": "black",
-    "31": "red",
-    "32": "green",
-    "33": "yellow",
-    "34": "blue",
-    "35": "purple",
-    "36": "cyan",
-    "37": "white",
-    "90": "gray",
-    "91": "#ff5555",  # bright red
-    "92": "#55ff55",  # bright green
-    "93": "#ffff55",  # bright yellow
-    "94": "#5555ff",  # bright blue
-    "95": "#ff55ff",  # bright purple
-    "96": "#55ffff",  # bright cyan
-    "97": "#ffffff",  # bright white
-}
-
 shell = InteractiveShell.instance()
 
 
 def strip_ansi_codes(text: str) -> str:
     """Remove ANSI escape codes from text."""
-    ansi_escape = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
-    return ansi_escape.sub("", text)
-
-
-def ansi_to_html(text: str) -> str:
-    """Convert ANSI color codes to HTML with inline styles."""
-
-    def replace_ansi(match):
-        codes = match.group(0)[2:-1].split(";")
-        style = ""
-        for code in codes:
-            if code in ANSI_COLORS:
-                style += f"color: {ANSI_COLORS[code]};"
-            elif code == "1":
-                style += "font-weight: bold;"
-            elif code == "0":
-                style = ""
-        return f'</span><span style="{style}">' if style else "</span><span>"
-
-    lines = text.split("\n")
-    html_lines = [
-        f"<span>{re.sub(r'\x1B\[[0-?]*[m]', replace_ansi, line)}</span>"
-        for line in lines
-    ]
-    html = "<br>".join(html_lines)
-    return f'<pre style="font-family: monospace; white-space: pre-wrap;">{html}</pre>'
+    return ANSI_ESCAPE.sub("", text)
 
 
 @contextlib.contextmanager
@@ -83,36 +45,48 @@ def stdout_io(stdout=None):
     sys.stdout = old
 
 
-def execute_code(code, cell_id, code_history, output_history):
-    """Executes Python code and captures output, errors, and execution time.
+def session_kernel() -> str:
+    """Kernel lease of the current Streamlit session (its own namespace)"""
+    if "kernel_session" not in st.session_state:
+        st.session_state.kernel_session = SessionLease(get_kernel_pool())
+    return st.session_state.kernel_session.project
+
+
+def execute_code(
+    code,
+    cell_id=None,
+    code_history=None,
+    output_history=None,
+    project="default",
+    on_output=None,
+):
+    """Executes Python code on a pooled kernel (a separate, memory-limited
+    process) and captures output, errors, and execution time.
 
     Args:
         code (str): The Python code to execute.
         cell_id (str):  A unique identifier for the code cell.
         code_history (dict):  Dictionary to store code history (cell_id: code).
         output_history (dict): Dictionary to store output history (cell_id: output).
+        project (str): Cells of the same project share a kernel (and its variables).
+        on_output (callable): Called with (stream name, text) as output arrives.
 
     Returns:
         tuple: (output, error, execution_time).  'output' and 'error' are strings,
                'execution_time' is a float (seconds).  If an error occurs, 'output'
                will contain any output produced *before* the error.
     """
-    start_time = time.time()
-    output_buffer = io.StringIO()
-    error = ""
-
-    try:
-        with stdout_io(stdout=output_buffer):
-            exec(code, globals())  # Execute in the global scope
-    except Exception as e:
-        error = str(e)
-    finally:
-        execution_time = time.time() - start_time
-        output = output_buffer.getvalue()  # Get captured output
+    result = get_kernel_pool().execute(
+        project, code, timeout=EXECUTION_TIMEOUT, on_output=on_output
+    )
+    output = result.stdout + result.stderr + result.result
+    error = "\n".join(result.traceback) or result.error
+    if code_history is not None:
         code_history[cell_id] = code
+    if output_history is not None:
         output_history[cell_id] = output
 
-    return output, error, execution_time
+    return output, error, result.elapsed
 
 
 def interactive_code(code: Code, index: int = 0) -> None:
@@ -131,7 +105,7 @@ def interactive_code(code: Code, index: int = 0) -> None:
             placeholder="Enter your Python code here...",
         )
 
-        st.markdown(ansi_to_html(), unsafe_allow_html=True)
+        live_output = st.empty()
         c1, c2, c3, c4 = st.columns(4)
 
         with c1:
@@ -140,7 +114,22 @@ def interactive_code(code: Code, index: int = 0) -> None:
                     st.session_state.code_actions[code.id]["output"],
                     st.session_state.code_actions[code.id]["error"],
                 ) = ("", "")
-                output, error, execution_time = execute_code(code_input)
+                # Bounded, rendered incrementally, the tail only while running
+                live = LiveOutput(
+                    lambda html: live_output.markdown(html, unsafe_allow_html=True)
+                )
+
+                try:
+                    output, error, execution_time = execute_code(
+                        code_input,
+                        project=session_kernel(),
+                        on_output=lambda _name, text: live.write(text),
+                    )
+                except KernelsBusy:
+                    output, error, execution_time = "", "", 0.0
+                    st.warning("All kernels are busy, please retry in a moment")
+                live.flush()
+                st.session_state.code_actions[code.id]["html"] = live.html()
                 if error:
                     st.session_state.code_actions[code.id][
                         "error"
@@ -168,11 +157,12 @@ def interactive_code(code: Code, index: int = 0) -> None:
                 del st.session_state.code_actions[code.id]
                 st.rerun()
 
-        # Display previous output if available
+        # Display previous output if available (rendered once per execution)
         if st.session_state.code_actions[code.id].get("output"):
             st.subheader("Last Output:")
             st.markdown(
-                ansi_to_html(st.session_state.code_actions[code.id]["output"]),
+                st.session_state.code_actions[code.id].get("html")
+                or ansi_to_html(st.session_state.code_actions[code.id]["output"]),
                 unsafe_allow_html=True,
             )
 
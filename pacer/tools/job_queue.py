@@ -0,0 +1,301 @@
+"""Persistent queue of background jobs (summaries, quizzes, notebooks)
+Jobs are rows of `jobs`, so closing the browser tab loses nothing and a
+restarted app resumes the queued ones. Worker threads claim a job with a
+conditional `UPDATE .. WHERE status = 'queued'` (safe across processes, e.g.
+`pacer-cli worker`), run the handler registered for its kind, and record
+progress, retries (with backoff) and the outcome. Submitting a job whose key
+already has an active job returns the active one.
+
+Example usage:
+    >>> queue = get_job_queue()
+    >>> queue.register(JobKind.QUIZ, lambda job, n_questions: ...)
+    >>> job_id = queue.submit(JobKind.QUIZ, project_name="My Project", n_questions=5)
+    >>> queue.get(job_id).status
+    <JobStatus.RUNNING: 'running'>
+"""
+
+import os
+import socket
+import threading
+import time
+from datetime import datetime as dt
+from datetime import timedelta, timezone
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+from pacer.models.job_model import JobInfo
+from pacer.orm import base
+from pacer.orm.job_orm import ACTIVE, Job, JobKind, JobStatus
+
+WORKERS = 2
+POLL_INTERVAL = 1.0  # seconds between looking for due jobs
+RETRY_DELAY = 5.0  # seconds before the first retry, doubled per attempt
+LEASE_TIMEOUT = 600  # seconds without a heartbeat before a running job is requeued
+HEARTBEAT_INTERVAL = 60.0  # seconds between heartbeats of a running job
+
+Handler = Callable[..., Any]  # handler(job: JobContext, **payload)
+OnUpdate = Callable[[JobInfo], None]
+
+
+def _now() -> dt:
+    return dt.now(timezone.utc)
+
+
+class JobContext:
+    """What a handler gets: its job, and progress reports"""
+
+    def __init__(self, queue: "JobQueue", info: JobInfo):
+        self.queue = queue
+        self.info = info
+
+    def progress(self, fraction: Optional[float] = None, message: str = "") -> None:
+        self.info = self.queue._update(
+            self.info.id, progress=fraction, message=message, heartbeat_at=_now()
+        )
+
+
+class JobQueue:
+    def __init__(
+        self,
+        Session=None,
+        workers: int = WORKERS,
+        poll_interval: float = POLL_INTERVAL,
+        retry_delay: float = RETRY_DELAY,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL,
+    ):
+        self.Session = Session or base.make_session()
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.heartbeat_interval = heartbeat_interval
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._handlers: dict[str, tuple[Handler, Optional[OnUpdate]]] = {}
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def register(
+        self, kind: JobKind, handler: Handler, on_update: OnUpdate = None
+    ) -> None:
+        """`on_update` gets every status and progress change of the kind's jobs"""
+        self._handlers[kind] = (handler, on_update)
+
+    # ---- Submitting and inspecting
+
+    def submit(
+        self,
+        kind: JobKind,
+        key: str = None,
+        project_name: str = None,
+        max_attempts: int = 3,
+        **payload,
+    ) -> str:
+        """Queue a job (or return the active job with the same `key`)"""
+        key = key or f"{kind}:{os.urandom(8).hex()}"
+        with self._lock, self.Session() as session:
+            active = (
+                session.query(Job.id)
+                .filter(Job.key == key, Job.status.in_(ACTIVE))
+                .scalar()
+            )
+            if active is not None:
+                return active
+            job = Job(
+                kind=kind,
+                key=key,
+                project_name=project_name,
+                payload=payload,
+                max_attempts=max_attempts,
+            )
+            session.add(job)
+            session.commit()
+            info = JobInfo.model_validate(job)
+        self._notify(info)
+        self.start()
+        self._wake.set()
+        return info.id
+
+    def get(self, job_id: str) -> Optional[JobInfo]:
+        with self.Session() as session:
+            job = session.get(Job, job_id)
+            return JobInfo.model_validate(job) if job else None
+
+    def latest(self, key: str) -> Optional[JobInfo]:
+        """The last job submitted with `key` (active or finished)"""
+        with self.Session() as session:
+            job = (
+                session.query(Job)
+                .filter(Job.key == key)
+                .order_by(Job.created_at.desc())
+                .first()
+            )
+            return JobInfo.model_validate(job) if job else None
+
+    def jobs(self, project_name: str = None, limit: int = 50) -> list[JobInfo]:
+        with self.Session() as session:
+            query = session.query(Job).order_by(Job.created_at.desc())
+            if project_name is not None:
+                query = query.filter(Job.project_name == project_name)
+            return [JobInfo.model_validate(job) for job in query.limit(limit)]
+
+    def wait(self, job_id: str, timeout: float = None) -> JobInfo:
+        """Block until the job finished (or `timeout`), e.g. in the CLI"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while (info := self.get(job_id)).active:
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            time.sleep(min(self.poll_interval, 0.1))
+        return info
+
+    # ---- Workers
+
+    def start(self) -> "JobQueue":
+        """Start the worker threads (once), requeueing jobs of dead workers"""
+        with self._lock:
+            if self._threads:
+                return self
+            self._stop.clear()
+            self._requeue_stale()
+            self._threads = [
+                threading.Thread(target=self._work, name=f"job-{n}", daemon=True)
+                for n in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout: float = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _requeue_stale(self) -> None:
+        stale = _now() - timedelta(seconds=LEASE_TIMEOUT)
+        with self.Session() as session:
+            requeued = (
+                session.query(Job)
+                .filter(Job.status == JobStatus.RUNNING, Job.heartbeat_at < stale)
+                .update(dict(status=JobStatus.QUEUED), synchronize_session=False)
+            )
+            session.commit()
+        if requeued:
+            print(f"[job_queue] requeued {requeued} jobs of dead workers")
+
+    def _claim(self) -> Optional[JobInfo]:
+        """The next due job of a registered kind, marked as ours"""
+        with self.Session() as session:
+            now = _now()
+            due = (
+                session.query(Job.id)
+                .filter(
+                    Job.status == JobStatus.QUEUED,
+                    Job.run_at <= now,
+                    Job.kind.in_(list(self._handlers)),
+                )
+                .order_by(Job.run_at)
+                .limit(self.workers + 1)
+                .all()
+            )
+            for (job_id,) in due:
+                claimed = (
+                    session.query(Job)
+                    .filter(Job.id == job_id, Job.status == JobStatus.QUEUED)
+                    .update(
+                        dict(
+                            status=JobStatus.RUNNING,
+                            attempts=Job.attempts + 1,
+                            worker=self.name,
+                            heartbeat_at=now,
+                            error=None,
+                        ),
+                        synchronize_session=False,
+                    )
+                )
+                session.commit()
+                if claimed:  # else another worker was first
+                    return JobInfo.model_validate(session.get(Job, job_id))
+        return None
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                info = self._claim()
+            except Exception as e:  # e.g. the database is locked for too long
+                print(f"[job_queue] claiming failed: {e}")
+                info = None
+            if info is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._run(info)
+
+    def _heartbeat(self, job_id: str, done: threading.Event) -> None:
+        """Keep the lease of a running job (handlers may not report progress
+        for longer than `LEASE_TIMEOUT`, e.g. while validating a notebook)"""
+        while not done.wait(self.heartbeat_interval):
+            try:
+                with self.Session() as session:
+                    session.query(Job).filter(
+                        Job.id == job_id, Job.status == JobStatus.RUNNING
+                    ).update(dict(heartbeat_at=_now()), synchronize_session=False)
+                    session.commit()
+            except Exception as e:  # e.g. the database is locked, retried next beat
+                print(f"[job_queue] heartbeat of {job_id} failed: {e}")
+
+    def _run(self, info: JobInfo) -> None:
+        handler, _ = self._handlers[info.kind]
+        self._notify(info)
+        done = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(info.id, done), daemon=True
+        )
+        heartbeat.start()
+        try:
+            handler(JobContext(self, info), **info.payload)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            print(f"[job_queue] {info.kind} {info.key!r} failed: {error}")
+            if info.attempts < info.max_attempts:
+                delay = self.retry_delay * 2 ** (info.attempts - 1)
+                run_at = _now() + timedelta(seconds=delay)
+                self._update(
+                    info.id, status=JobStatus.QUEUED, error=error, run_at=run_at
+                )
+            else:
+                self._update(
+                    info.id, status=JobStatus.FAILED, error=error, finished_at=_now()
+                )
+        else:
+            self._update(
+                info.id, status=JobStatus.SUCCEEDED, progress=1.0, finished_at=_now()
+            )
+        finally:
+            done.set()
+
+    def _update(self, job_id: str, **values) -> JobInfo:
+        with self.Session() as session:
+            session.query(Job).filter(Job.id == job_id).update(
+                values, synchronize_session=False
+            )
+            session.commit()
+            info = JobInfo.model_validate(session.get(Job, job_id))
+        self._notify(info)
+        return info
+
+    def _notify(self, info: JobInfo) -> None:
+        _, on_update = self._handlers.get(info.kind, (None, None))
+        if on_update is None:
+            return
+        try:
+            on_update(info)
+        except Exception as e:  # status write-back must not fail the job
+            print(f"[job_queue] status update of {info.key!r} failed: {e}")
+
+
+@lru_cache(1)
+def get_job_queue() -> JobQueue:
+    """The process-wide queue (its workers start with the first `start`/`submit`)"""
+    return JobQueue()
@@ -1,37 +1,44 @@
-import atexit
 import hashlib
 import re
-import socket
-import subprocess
-import time
-from collections import defaultdict
+from typing import Optional
 
 import nbformat as nbf
 import streamlit as st
 
-from pacer.config.consts import ROOT_DIR
 from pacer.models.code_cell_model import Cell, CellType
+from pacer.tools.notebook_server import NotebookServer, get_server
+from pacer.tools.notebook_store import NotebookStore
+from pacer.tools.notebook_validation import CellReport, validate_cells
 
 
 class JupyterHandler:
-    _port = None
+    """A project's notebook: cells are rows in `jupyter_cells`, the `.ipynb`
+    served by the notebook server is an export written when it is stale"""
 
-    def __init__(self, project: str):
+    def __init__(
+        self, project: str, server: NotebookServer = None, store: NotebookStore = None
+    ):
         self.project = project
         name = self._sanitize(project)
-        self._parent = ROOT_DIR / ".jupyter"
+        self.server = server or get_server()
+        self._parent = self.server.root_dir
         self._parent.mkdir(exist_ok=True)
         self.main_ipynb_path = self._parent / f"{name}.ipynb"
-        self.processes = defaultdict(list)
-        self.port = JupyterHandler._port or self._find_free_port()
-
-        self.url = f"http://localhost:{self.port}/notebooks/{self.main_ipynb_path.name}"
-        atexit.register(self._cleanup)
-        self.cells: list[nbf.NotebookNode] = []
-        if self.main_ipynb_path.exists():
-            with open(self.main_ipynb_path) as fl:
-                nb = nbf.read(fl, as_version=4)
-                self.cells = nb["cells"]
+        self.store = store or NotebookStore(project)
+        self._new: list[nbf.NotebookNode] = []  # not stored yet
+        self._changed: dict[str, nbf.NotebookNode] = {}  # stored, to patch
+        self._exported = self.main_ipynb_path.exists()
+        self._exported_as = None  # (mtime, size) of the `.ipynb` last written or read
+        self.cells: list[nbf.NotebookNode] = self.store.load()
+        self.import_edits()  # or a notebook saved before cells were stored as rows
+
+    @property
+    def port(self) -> int:
+        return self.server.port
+
+    @property
+    def url(self) -> str:
+        return self.server.url(self.main_ipynb_path.name)
 
     def _sanitize(self, project: str):
         sanitized_name = re.sub(r"[^a-zA-Z0-9_-]", "_", project)
@@ -40,42 +47,19 @@ class JupyterHandler:
             return hash_object.hexdigest()
         return sanitized_name
 
-    def _find_free_port(self, start_port: int = 8888, max_attempts: int = 5):
-        """Find an available port starting from start_port."""
-        port = start_port
-        for _ in range(max_attempts):
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                try:
-                    s.bind(("localhost", port))
-                    return port
-                except OSError:
-                    port += 1
-        return port - 1
-        # raise RuntimeError("No available ports found.")
-
-    def _find_streamlit_port(
-        self, start_port: int = 8501, max_attempts: int = 10
-    ) -> int:
-        """Find a port that is currently in use, starting from start_port."""
-        for port in range(start_port, start_port + max_attempts):
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                if s.connect_ex(("localhost", port)) == 0:  # Port is in use
-                    return port
-        raise RuntimeError(
-            f"No used Streamlit ports found in range {start_port} - {start_port + max_attempts - 1}."
-        )
-
     def is_empty(self) -> bool:
         return not any(cell.get("source") for cell in self.cells)
 
     def add_markdown(self, markdown: str):
         markdown_cell = nbf.v4.new_markdown_cell(markdown)
         self.cells.append(markdown_cell)
+        self._new.append(markdown_cell)
         return self
 
     def add_code(self, code: str):
         code_cell = nbf.v4.new_code_cell(code)
         self.cells.append(code_cell)
+        self._new.append(code_cell)
         return self
 
     def add_cell(self, cell: Cell):
@@ -85,68 +69,68 @@ class JupyterHandler:
             return self.add_code(cell.content)
         raise NotImplementedError(f"CellType: {cell.type}")
 
+    def validate(self, **kwargs) -> list[CellReport]:
+        """Run the (new or changed) code cells, keeping their outputs"""
+        reports = validate_cells(self.cells, **kwargs)
+        new = {id(cell) for cell in self._new}
+        for report in reports:
+            cell = self.cells[report.index]
+            if not report.cached and id(cell) not in new:
+                self._changed[cell["id"]] = cell
+        return reports
+
+    def _fingerprint(self) -> Optional[tuple[int, int]]:
+        try:
+            stat = self.main_ipynb_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def import_edits(self) -> bool:
+        """Take the edits made in Jupyter (the `.ipynb` changed since it was
+        last written) into the stored cells, before they are exported again"""
+        fingerprint = self._fingerprint()
+        if fingerprint is None or fingerprint == self._exported_as:
+            return False
+        self.save_changes()  # pending cells go after the edited ones
+        self.cells = self.store.import_ipynb(self.main_ipynb_path)
+        self._exported_as = fingerprint
+        self._exported = False  # cells stored since are not in the file yet
+        return True
+
+    def reload(self):
+        """Take the stored cells (written elsewhere, e.g. by a notebook job),
+        they replace the exported notebook"""
+        self.cells = self.store.load()
+        self._new, self._changed = [], {}
+        self._exported = False
+        self._exported_as = self._fingerprint()
+        return self
+
     def save_changes(self):
-        nb = nbf.v4.new_notebook()
-        nb["cells"] = self.cells
-        with open(self.main_ipynb_path, "w", encoding="utf-8") as fl:
-            nbf.write(nb, fl)
+        """Store the new cells and patch the changed ones (the rest is untouched)"""
+        self.store.append(self._new)
+        self.store.patch(list(self._changed.values()))
+        if self._new or self._changed:
+            self._exported = False
+        self._new, self._changed = [], {}
         return self
 
     def run_jupyter(self):
-
-        # --1-- Create Jupyter file
-        if not self.main_ipynb_path.exists():
+        """Make sure the shared notebook server serves this project's notebook
+        (cheap on reruns: the server is started once per process)"""
+        # --1-- Export the stored cells if the Jupyter file is stale
+        self.import_edits()
+        if not self._exported or not self.main_ipynb_path.exists():
             self.save_changes()
+            self.store.export(self.main_ipynb_path, self.cells)
+            self._exported = True
+            self._exported_as = self._fingerprint()
 
-        # Run Jupyter Notebook in the background
-        print("Running Jupyter on:", self.port)
-        streamlit_port = self._find_streamlit_port()
-        tornado_settings = {
-            "headers": {
-                "Content-Security-Policy": f"frame-ancestors 'self' http://localhost:{streamlit_port}"
-            }
-        }
-        cmd = [
-            "jupyter-notebook",
-            str(self.main_ipynb_path),
-            "--port",
-            str(self.port),
-            "--no-browser",  # Don't open a browser automatically
-            "--NotebookApp.token=''",
-            "--NotebookApp.password=''",
-            f"--NotebookApp.tornado_settings={tornado_settings}",
-        ]
-        print("Running:\n", *cmd)
-        process = subprocess.Popen(
-            cmd,
-            cwd=str(self._parent),  # Set working directory to project folder
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        self.processes[self.port].append(process)
-
-        # Wait briefly to ensure the server starts
-        time.sleep(1)
-        if process.poll() is not None:
-            raise RuntimeError("Failed to start Jupyter Notebook server.")
-
-        if not JupyterHandler._port:
-            JupyterHandler._port = self.port
-
+        # --2-- Shared, supervised server
+        self.server.ensure_running()
         return self
 
-    def _cleanup(self):
-        """Clean up by terminating the Jupyter process."""
-        for port, procs in self.processes.items():
-            for proc in procs:
-                print(f"Jupyter Process killed! port: {port}")
-                if proc and proc.poll() is None:
-                    proc.terminate()
-                try:
-                    proc.wait(timeout=5)  # Wait for clean termination
-                except subprocess.TimeoutExpired:
-                    proc.kill()  # Force kill if it doesn't terminate
-
     def render(self):
         st.write(f"URL: {self.url}")
         # background-color: #f0f0f0; /* Debug visibility */
@@ -0,0 +1,421 @@
+"""Pool of pre-started IPython kernels (`jupyter_client`)
+Kernels are started ahead of time and leased per project (or session), so
+running a cell does not pay the kernel start-up cost. Released kernels are
+reset and recycled, idle leases are evicted and the pool is capped at
+`max_kernels`. Every kernel is a separate process with a memory rlimit, so a
+runaway cell costs only its own kernel, which is replaced on the next lease.
+
+Example usage:
+    >>> pool = get_kernel_pool()
+    >>> pool.execute("My Project", "x = 21\\nprint(x * 2)").stdout
+    '42\\n'
+    >>> pool.execute("My Project", "while True: pass", timeout=1).timed_out
+    True
+"""
+
+import atexit
+import queue
+import threading
+import time
+import weakref
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
+from typing import Callable, Optional
+from uuid import uuid4
+
+from jupyter_client import KernelManager
+
+from pacer.tools.output_capture import OUTPUT_LIMIT, OutputBuffer
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+MEMORY_LIMIT_MB = 2048  # per kernel (RLIMIT_DATA)
+
+OnOutput = Callable[[str, str], None]  # (stream name, text)
+
+
+class KernelsBusy(RuntimeError):
+    """Every kernel of a full pool is running a cell"""
+
+
+def _limit_memory(limit_mb: int) -> None:
+    """Runs in the kernel process before exec (allocations fail beyond it)"""
+    limit = limit_mb * 2**20
+    resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+
+
+@dataclass
+class ExecutionResult:
+    stdout: str = ""
+    stderr: str = ""
+    result: str = ""  # `text/plain` of the last expression / displays
+    error: str = ""
+    traceback: list[str] = field(default_factory=list)
+    elapsed: float = 0.0
+    timed_out: bool = False
+    truncated: int = 0  # characters dropped from the middle of the output
+    buffers: dict[str, OutputBuffer] = field(default_factory=dict, repr=False)
+
+    @property
+    def ok(self) -> bool:
+        return not (self.error or self.timed_out)
+
+    def write(self, name: str, text: str, limit: int = OUTPUT_LIMIT) -> None:
+        """Bounded capture of the `stdout`, `stderr` or `result` text"""
+        if name not in self.buffers:
+            self.buffers[name] = OutputBuffer(limit)
+        self.buffers[name].write(text)
+
+    def finish(self) -> None:
+        for name, buffer in self.buffers.items():
+            setattr(self, name, buffer.text())
+        self.truncated = sum(buffer.dropped for buffer in self.buffers.values())
+
+
+class Kernel:
+    """One started kernel with its client (one execution at a time)"""
+
+    def __init__(
+        self,
+        kernel_name: str = "python3",
+        startup_timeout: float = 60,
+        memory_limit_mb: Optional[int] = MEMORY_LIMIT_MB,
+        output_limit: int = OUTPUT_LIMIT,
+    ):
+        self.output_limit = output_limit
+        self.manager = KernelManager(kernel_name=kernel_name)
+        kwargs = {}
+        if memory_limit_mb and resource is not None:
+            kwargs["preexec_fn"] = partial(_limit_memory, memory_limit_mb)
+        self.manager.start_kernel(**kwargs)
+        self.client = self.manager.client()
+        self.client.start_channels()
+        self.client.wait_for_ready(timeout=startup_timeout)
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+    def alive(self) -> bool:
+        return self.manager.is_alive()
+
+    def _collect(
+        self,
+        msg_id: str,
+        deadline: float,
+        result: ExecutionResult,
+        on_output: OnOutput = None,
+    ) -> bool:
+        """Read iopub messages of `msg_id` until idle, False on timeout"""
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                msg = self.client.get_iopub_msg(timeout=min(remaining, 1.0))
+            except queue.Empty:
+                if not self.alive():  # e.g. killed for exceeding its limits
+                    result.error = "DeadKernelError: the kernel died"
+                    return True
+                continue
+            if msg["parent_header"].get("msg_id") != msg_id:
+                continue
+            content = msg["content"]
+            match msg["msg_type"]:
+                case "stream":
+                    name = "stderr" if content["name"] == "stderr" else "stdout"
+                    result.write(name, content["text"], self.output_limit)
+                    if on_output:
+                        on_output(content["name"], content["text"])
+                case "execute_result" | "display_data":
+                    text = content["data"].get("text/plain", "")
+                    result.write("result", text, self.output_limit)
+                case "error":
+                    result.error = f"{content['ename']}: {content['evalue']}"
+                    result.traceback = content["traceback"]
+                case "status" if content["execution_state"] == "idle":
+                    return True
+
+    def execute(
+        self, code: str, timeout: float = 30, on_output: OnOutput = None
+    ) -> ExecutionResult:
+        """Run `code`, `on_output` gets stdout/stderr as the kernel prints it"""
+        with self.lock:
+            start = time.monotonic()
+            result = ExecutionResult()
+            msg_id = self.client.execute(code, store_history=True)
+            if not self._collect(msg_id, start + timeout, result, on_output):
+                result.timed_out = True
+                result.error = f"TimeoutError: execution exceeded {timeout}s"
+                self.interrupt(msg_id)
+            self._drain_shell()
+            result.finish()
+            result.elapsed = time.monotonic() - start
+            self.last_used = time.monotonic()
+            return result
+
+    def interrupt(self, msg_id: str = None, grace: float = 5) -> None:
+        """Interrupt the running cell, restart the kernel if it does not stop"""
+        self.manager.interrupt_kernel()
+        if msg_id and self._collect(
+            msg_id, time.monotonic() + grace, ExecutionResult()
+        ):
+            return
+        print("[kernel_pool] kernel did not stop, restarting")
+        self.manager.restart_kernel(now=True)
+        self.client.wait_for_ready(timeout=60)
+
+    def _drain_shell(self) -> None:
+        while True:  # execute replies would pile up otherwise
+            try:
+                self.client.get_shell_msg(timeout=0.01)
+            except queue.Empty:
+                return
+
+    def reset(self) -> None:
+        """Forget the user namespace (used before recycling the kernel)"""
+        self.execute("%reset -f", timeout=10)
+
+    def shutdown(self) -> None:
+        self.client.stop_channels()
+        self.manager.shutdown_kernel(now=True)
+
+
+class KernelPool:
+    def __init__(
+        self,
+        warm: int = 2,
+        max_kernels: int = 8,
+        idle_timeout: float = 600,
+        kernel_factory: Callable[[], Kernel] = Kernel,
+    ):
+        """
+        Args:
+            warm: started kernels kept ready for new leases
+            max_kernels: cap on warm + leased kernels
+            idle_timeout: seconds after which an unused lease is recycled
+        """
+        self.warm = warm
+        self.max_kernels = max_kernels
+        self.idle_timeout = idle_timeout
+        self.kernel_factory = kernel_factory
+        self._ready: list[Kernel] = []
+        self._leases: dict[str, Kernel] = {}
+        self._starting = 0  # warm kernels being started
+        self._cold: set[str] = set()  # projects whose kernel is being started
+        self._in_use: Counter[Kernel] = Counter()  # leased for a running `execute`
+        self._lock = threading.Condition()
+        self._starter = ThreadPoolExecutor(2, thread_name_prefix="kernel")
+        self._closed = False
+        self._stats = dict(leases=0, warm_hits=0, cold_starts=0, evictions=0)
+        atexit.register(self.shutdown)
+
+    def _total(self) -> int:
+        return len(self._ready) + len(self._leases) + self._starting + len(self._cold)
+
+    def _full(self) -> bool:
+        return self._total() >= self.max_kernels
+
+    def _busy(self, kernel: Kernel) -> bool:
+        """(under lock) held by an `execute`, even before it takes `kernel.lock`"""
+        return bool(self._in_use[kernel]) or kernel.lock.locked()
+
+    def prewarm(self) -> None:
+        """Start kernels in the background up to `warm` ready ones"""
+        with self._lock:
+            missing = min(
+                self.warm - len(self._ready) - self._starting,
+                self.max_kernels - self._total(),
+            )
+            self._starting += max(0, missing)
+        for _ in range(missing):
+            self._starter.submit(self._start_ready)
+
+    def _start_ready(self) -> None:
+        kernel = None
+        try:
+            kernel = self.kernel_factory()
+        except Exception as e:
+            print(f"[kernel_pool] could not start a kernel: {e}")
+        with self._lock:
+            self._starting -= 1
+            if kernel and not self._closed:
+                self._ready.append(kernel)
+                kernel = None
+            self._lock.notify_all()
+        if kernel:  # pool closed meanwhile
+            kernel.shutdown()
+
+    def _hold(self, kernel: Kernel, hold: bool) -> Kernel:
+        """(under lock) mark the kernel in use until `_unhold`"""
+        if hold:
+            self._in_use[kernel] += 1
+        return kernel
+
+    def _unhold(self, kernel: Kernel) -> None:
+        with self._lock:
+            self._in_use[kernel] -= 1
+            if not self._in_use[kernel]:
+                del self._in_use[kernel]
+
+    def _live_lease(self, project: str) -> Optional[Kernel]:
+        """(under lock) the project's kernel, if it is still alive"""
+        kernel = self._leases.get(project)
+        if kernel and kernel.alive():
+            kernel.last_used = time.monotonic()
+            return kernel
+        if kernel:  # died
+            del self._leases[project]
+            self._starter.submit(kernel.shutdown)  # channels and files
+        return None
+
+    def lease(self, project: str, hold: bool = False) -> Kernel:
+        """The project's kernel (a warm one on first use), `hold` keeps it from
+        being evicted until `_unhold`"""
+        self.evict_idle()
+        kernel, waited = None, False
+        with self._lock:
+            while True:
+                if live := self._live_lease(project):
+                    return self._hold(live, hold)
+                if project in self._cold:  # another caller is starting it
+                    self._lock.wait_for(lambda: project not in self._cold, 120)
+                elif not self._ready and self._starting and not waited:
+                    # a warm one is on its way
+                    self._lock.wait_for(lambda: self._ready or not self._starting, 60)
+                    waited = True
+                elif self._cold and not self._ready and self._full():
+                    self._lock.wait(1)  # evict once a start in flight is leased
+                else:
+                    break
+            self._stats["leases"] += 1
+            if self._ready:
+                self._stats["warm_hits"] += 1
+                kernel = self._leases[project] = self._ready.pop()
+                kernel.last_used = time.monotonic()
+                self._hold(kernel, hold)
+            else:
+                if self._full():
+                    self._evict_lru()
+                self._stats["cold_starts"] += 1
+                self._cold.add(project)  # holds its slot until started
+        if kernel is None:
+            kernel = self._cold_start(project, hold)
+        self.prewarm()
+        return kernel
+
+    def _cold_start(self, project: str, hold: bool = False) -> Kernel:
+        kernel = None
+        try:
+            kernel = self.kernel_factory()
+        finally:
+            with self._lock:
+                self._cold.discard(project)
+                other = self._leases.get(project)
+                if kernel is not None and other is None:
+                    self._leases[project] = kernel
+                    kernel.last_used = time.monotonic()
+                    self._hold(kernel, hold)
+                elif kernel is not None:  # returned instead
+                    self._hold(other, hold)
+                self._lock.notify_all()
+        if other is not None:  # not expected: callers wait for `_cold`
+            self._starter.submit(kernel.shutdown)
+            return other
+        return kernel
+
+    def _evict_lru(self) -> None:
+        """(under lock) shut down the least recently used idle lease"""
+        idle = [(k.last_used, p) for p, k in self._leases.items() if not self._busy(k)]
+        if not idle:
+            raise KernelsBusy(f"All {self.max_kernels} kernels are busy")
+        _, project = min(idle)
+        kernel = self._leases.pop(project)
+        self._stats["evictions"] += 1
+        self._starter.submit(kernel.shutdown)
+
+    def release(self, project: str, recycle: bool = True) -> None:
+        """Give the project's kernel back: reset and keep it warm, or shut it down"""
+        with self._lock:
+            kernel = self._leases.pop(project, None)
+        if kernel is None:
+            return
+        if recycle and kernel.alive():
+            try:
+                kernel.reset()
+            except Exception as e:
+                print(f"[kernel_pool] reset failed, dropping kernel: {e}")
+                recycle = False
+        with self._lock:
+            if recycle and not self._closed and len(self._ready) < self.warm:
+                self._ready.append(kernel)
+                self._lock.notify_all()
+                return
+        kernel.shutdown()
+
+    def evict_idle(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                project
+                for project, kernel in self._leases.items()
+                if now - kernel.last_used > self.idle_timeout and not self._busy(kernel)
+            ]
+            self._stats["evictions"] += len(idle)
+        for project in idle:
+            self.release(project)
+
+    def execute(
+        self, project: str, code: str, timeout: float = 30, on_output: OnOutput = None
+    ) -> ExecutionResult:
+        kernel = self.lease(project, hold=True)
+        try:
+            return kernel.execute(code, timeout=timeout, on_output=on_output)
+        finally:
+            self._unhold(kernel)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self._stats,
+                ready=len(self._ready),
+                leased=len(self._leases),
+                starting=self._starting + len(self._cold),
+            )
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+            kernels = self._ready + list(self._leases.values())
+            self._ready, self._leases = [], {}
+        for kernel in kernels:
+            try:
+                kernel.shutdown()
+            except Exception as e:
+                print(f"[kernel_pool] shutdown failed: {e}")
+
+
+class SessionLease:
+    """Kernel lease of a (GUI) session, released when the lease is collected,
+    e.g. with the session state"""
+
+    def __init__(self, pool: KernelPool):
+        self.project = f"session:{uuid4()}"
+        weakref.finalize(self, _release_later, pool, self.project)
+
+
+def _release_later(pool: KernelPool, project: str) -> None:
+    """Off the collecting thread, the reset runs a cell"""
+    if not pool._closed:
+        pool._starter.submit(pool.release, project)
+
+
+@lru_cache(1)
+def get_kernel_pool() -> KernelPool:
+    """The process-wide kernel pool (pre-warmed on first use)"""
+    pool = KernelPool()
+    pool.prewarm()
+    return pool
@@ -0,0 +1,191 @@
+"""One supervised, long-lived notebook server per process
+Serves every project's notebook from `ROOT_DIR/.jupyter`, waits for
+readiness by polling its HTTP API, and is restarted by a watchdog thread
+when it dies or stops answering.
+
+Example usage:
+    >>> server = get_server().ensure_running()
+    >>> server.url("my_project.ipynb")
+    'http://localhost:8888/notebooks/my_project.ipynb'
+"""
+
+import atexit
+import socket
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Optional
+
+from pacer.config.consts import ROOT_DIR
+
+NOTEBOOK_DIR = ROOT_DIR / ".jupyter"
+
+
+def find_free_port(start_port: int = 8888, max_attempts: int = 50) -> int:
+    """Find an available port starting from start_port."""
+    for port in range(start_port, start_port + max_attempts):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            try:
+                s.bind(("localhost", port))
+                return port
+            except OSError:
+                continue
+    raise RuntimeError(f"No free port in {start_port} - {start_port + max_attempts}")
+
+
+def jupyter_command(port: int) -> list[str]:
+    tornado_settings = {
+        "headers": {
+            # Any local Streamlit port may embed the notebooks
+            "Content-Security-Policy": "frame-ancestors 'self' http://localhost:*"
+        }
+    }
+    return [
+        "jupyter-notebook",
+        "--port",
+        str(port),
+        "--no-browser",  # Don't open a browser automatically
+        "--NotebookApp.token=''",
+        "--NotebookApp.password=''",
+        f"--NotebookApp.tornado_settings={tornado_settings}",
+    ]
+
+
+class NotebookServer:
+    def __init__(
+        self,
+        root_dir: Path = NOTEBOOK_DIR,
+        port: int = None,
+        command: Callable[[int], list[str]] = jupyter_command,
+        health_path: str = "/api",
+        startup_timeout: float = 30.0,
+        health_interval: float = 5.0,
+        watchdog: bool = True,
+    ):
+        self.root_dir = Path(root_dir)
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self.port = port or find_free_port()
+        self.command = command
+        self.health_path = health_path
+        self.startup_timeout = startup_timeout
+        self.health_interval = health_interval
+        self.starts = 0
+
+        self._process: Optional[subprocess.Popen] = None
+        self._log = None
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+        self._stopped = threading.Event()
+        self._watchdog = None
+        if watchdog:
+            self._watchdog = threading.Thread(
+                target=self._watch, name="notebook-watchdog", daemon=True
+            )
+        atexit.register(self.stop)
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self._process.pid if self._process else None
+
+    def url(self, notebook: str = "") -> str:
+        base_url = f"http://localhost:{self.port}"
+        return f"{base_url}/notebooks/{notebook}" if notebook else base_url
+
+    def alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def healthy(self, timeout: float = 1.0) -> bool:
+        if not self.alive():
+            return False
+        try:
+            with urllib.request.urlopen(
+                self.url() + self.health_path, timeout=timeout
+            ) as response:
+                return response.status < 500
+        except (urllib.error.URLError, OSError):
+            return False
+
+    def _start(self) -> None:
+        self._stop_process()
+        self._log = open(self.root_dir / "server.log", "ab")
+        cmd = self.command(self.port)
+        print("Running:\n", *cmd)
+        self._process = subprocess.Popen(
+            cmd,
+            cwd=str(self.root_dir),  # serves every project's notebook
+            stdout=self._log,  # a never-read PIPE would eventually block the server
+            stderr=subprocess.STDOUT,
+        )
+        self.starts += 1
+        self._wait_ready()
+
+    def _wait_ready(self) -> None:
+        """Poll the server until it answers (instead of a fixed sleep)"""
+        deadline = time.monotonic() + self.startup_timeout
+        delay = 0.02
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(
+                    f"Notebook server exited with {self._process.returncode}"
+                    f" (see {self.root_dir / 'server.log'})"
+                )
+            if self.healthy(timeout=0.5):
+                self._checked_at = time.monotonic()
+                print(f"Notebook server ready on: {self.port}")
+                return
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+        raise TimeoutError(f"Notebook server not ready after {self.startup_timeout}s")
+
+    def ensure_running(self, check: bool = False) -> "NotebookServer":
+        """Start the server if needed. A live process is trusted for
+        `health_interval` seconds, so reruns cost a `poll()` only."""
+        with self._lock:
+            if not self.alive():
+                self._start()
+            elif check or time.monotonic() - self._checked_at > self.health_interval:
+                if self.healthy():
+                    self._checked_at = time.monotonic()
+                else:
+                    print(f"Notebook server on {self.port} is unhealthy, restarting")
+                    self._start()
+            if self._watchdog and self._watchdog.ident is None:
+                self._watchdog.start()
+        return self
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.health_interval):
+            try:
+                self.ensure_running(check=True)
+            except Exception as e:
+                print(f"[notebook_server] restart failed: {e}")
+
+    def _stop_process(self) -> None:
+        if self._process and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=5)  # Wait for clean termination
+            except subprocess.TimeoutExpired:
+                self._process.kill()  # Force kill if it doesn't terminate
+                self._process.wait()
+        self._process = None
+        if self._log:
+            self._log.close()
+            self._log = None
+
+    def stop(self) -> None:
+        self._stopped.set()
+        with self._lock:
+            if self._process:
+                print(f"Notebook server stopped! port: {self.port}")
+            self._stop_process()
+
+
+@lru_cache(1)
+def get_server() -> NotebookServer:
+    """The process-wide notebook server (shared by all Streamlit sessions)"""
+    return NotebookServer()
@@ -0,0 +1,166 @@
+"""Notebook cells as ordered `jupyter_cells` rows
+Appending and patching touch only the affected rows; the `.ipynb` file is
+an export, regenerated when the notebook server needs it.
+
+Example usage:
+    >>> store = NotebookStore("My Project")
+    >>> cells = store.load()
+    >>> store.append([nbf.v4.new_code_cell("print(1)")])
+    >>> store.export(path)
+"""
+
+import os
+import uuid
+from pathlib import Path
+from typing import Optional
+
+import nbformat as nbf
+from sqlalchemy import func
+
+from pacer.models.code_cell_model import Cell, CellType
+from pacer.orm import base
+from pacer.orm.jupyter_cell_orm import JupyterCell
+from pacer.orm.repository import get_project_repository
+
+
+def _to_node(row: JupyterCell) -> nbf.NotebookNode:
+    metadata = row.cell_metadata or {}
+    if row.type == CellType.MARKDOWN:
+        return nbf.v4.new_markdown_cell(row.content, id=row.id, metadata=metadata)
+    return nbf.v4.new_code_cell(
+        row.content,
+        id=row.id,
+        metadata=metadata,
+        outputs=[nbf.from_dict(o) for o in row.outputs or []],
+        execution_count=row.execution_count,
+    )
+
+
+def cell_node(cell: Cell) -> nbf.NotebookNode:
+    if cell.type == CellType.MARKDOWN:
+        return nbf.v4.new_markdown_cell(cell.content)
+    return nbf.v4.new_code_cell(cell.content)
+
+
+def _fill_row(row: JupyterCell, node: nbf.NotebookNode) -> None:
+    code = node.cell_type == "code"
+    row.type = CellType.PYTHON if code else CellType.MARKDOWN
+    row.content = node.source
+    row.outputs = node.get("outputs", []) if code else []
+    row.cell_metadata = dict(node.get("metadata", {}))
+    row.execution_count = node.get("execution_count") if code else None
+
+
+class NotebookStore:
+    def __init__(self, project_name: str):
+        self.project_name = project_name
+        self.Session = base.make_session()
+
+    def project_id(self, session) -> Optional[str]:
+        return get_project_repository().project_id(session, self.project_name)
+
+    def load(self) -> list[nbf.NotebookNode]:
+        """The project's cells in order (cell ids are the row ids)"""
+        with self.Session() as session:
+            rows = (
+                session.query(JupyterCell)
+                .filter(JupyterCell.project_id == self.project_id(session))
+                .order_by(JupyterCell.position)
+                .all()
+            )
+            return [_to_node(row) for row in rows]
+
+    def append(self, nodes: list[nbf.NotebookNode]) -> None:
+        """Add cells after the last one (sets `node.id` to the new row id)"""
+        if not nodes:
+            return
+        with self.Session() as session:
+            project_id = self.project_id(session)
+            if project_id is None:  # e.g. a scratch notebook: only exported
+                print(f"[notebook_store] no project {self.project_name!r}, not stored")
+                return
+            last = (
+                session.query(func.max(JupyterCell.position))
+                .filter(JupyterCell.project_id == project_id)
+                .scalar()
+            )
+            start = -1 if last is None else last
+            rows = []
+            for offset, node in enumerate(nodes, 1):
+                row = JupyterCell(project_id=project_id, position=start + offset)
+                _fill_row(row, node)
+                rows.append(row)
+            session.add_all(rows)
+            session.commit()
+            for node, row in zip(nodes, rows):
+                node["id"] = row.id
+
+    def patch(self, nodes: list[nbf.NotebookNode]) -> None:
+        """Write the content, outputs and metadata of existing cells"""
+        if not nodes:
+            return
+        by_id = {node["id"]: node for node in nodes}
+        with self.Session() as session:
+            rows = session.query(JupyterCell).filter(
+                JupyterCell.project_id == self.project_id(session),
+                JupyterCell.id.in_(by_id),
+            )
+            for row in rows:
+                _fill_row(row, by_id[row.id])
+            session.commit()
+
+    def clear(self) -> None:
+        with self.Session() as session:
+            session.query(JupyterCell).filter(
+                JupyterCell.project_id == self.project_id(session)
+            ).delete(synchronize_session=False)
+            session.commit()
+
+    def export(self, path: Path, cells: list[nbf.NotebookNode] = None) -> Path:
+        """Write the `.ipynb` (atomically, the notebook server may be reading).
+        The exported cell ids are kept in its metadata for `import_ipynb`."""
+        nb = nbf.v4.new_notebook()
+        nb["cells"] = self.load() if cells is None else cells
+        nb.metadata["pacer"] = dict(cells=[cell.get("id") for cell in nb["cells"]])
+        tmp = Path(path).with_suffix(".ipynb.tmp")
+        with open(tmp, "w", encoding="utf-8") as fl:
+            nbf.write(nb, fl)
+        os.replace(tmp, path)
+        return Path(path)
+
+    def import_ipynb(self, path: Path) -> list[nbf.NotebookNode]:
+        """Take the cells of an `.ipynb` edited in Jupyter (or saved before cells
+        were stored as rows). They replace the exported cells; cells stored since
+        the export are kept after them. Returns the stored cells."""
+        with open(path, encoding="utf-8") as fl:
+            nb = nbf.read(fl, as_version=4)
+        exported = set(
+            nb.metadata.get("pacer", {}).get("cells")
+            or [node.get("id") for node in nb.cells]
+        )
+        with self.Session() as session:
+            project_id = self.project_id(session)
+            if project_id is None:
+                return nb.cells
+            rows = {
+                row.id: row
+                for row in session.query(JupyterCell)
+                .filter(JupyterCell.project_id == project_id)
+                .order_by(JupyterCell.position)
+            }
+            added = [row for row in rows.values() if row.id not in exported]
+            ordered = []
+            for node in nb.cells:
+                row = rows.pop(node.get("id"), None)
+                if row is None:  # a cell added in Jupyter
+                    row = JupyterCell(id=str(uuid.uuid4()), project_id=project_id)
+                    session.add(row)
+                _fill_row(row, node)
+                ordered.append(row)
+            ordered += [row for row in added if rows.pop(row.id, None)]
+            for row in rows.values():  # deleted in Jupyter
+                session.delete(row)
+            for position, row in enumerate(ordered):
+                row.position = position
+            session.commit()
+        return self.load()
@@ -0,0 +1,274 @@
+"""Validate generated notebooks by running their code cells
+Code cells are grouped by name dependencies (a cell depends on the latest
+earlier cells defining, or changing in place, the names it uses).
+Independent groups run in parallel, each in its own isolated kernel from the
+kernel pool, and cells within a group run in notebook order.
+
+Outputs are memoized by a hash of the cell plus the cells it depends on,
+stored in the cell's metadata next to its outputs (`jupyter_cells`). After
+`update_jupyter_cells`, only new or changed cells, plus the cells they need
+for their state, are executed again.
+
+Example usage:
+    >>> reports = validate_cells(handler.cells)
+    >>> [r.index for r in reports if not r.ok]
+"""
+
+import ast
+import builtins
+import hashlib
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+import nbformat as nbf
+from IPython.core.inputtransformer2 import TransformerManager
+
+from pacer.tools.kernel_pool import ExecutionResult, KernelPool, get_kernel_pool
+
+CELL_TIMEOUT = 60  # seconds per cell
+_BUILTINS = set(dir(builtins))
+_MUTATING_BUILTINS = {"setattr", "delattr", "next", "exec"}
+
+
+@dataclass
+class CellReport:
+    index: int  # position in the notebook
+    ok: bool
+    cached: bool
+    error: str = ""
+
+
+def _root(node: ast.AST) -> Optional[str]:
+    """`x` of `x`, `x.a.b`, `x[0]` or `x.a[0]`"""
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _walk_scope(tree: ast.AST):
+    """`ast.walk` that does not enter the bodies of nested functions
+    (their names are local; what they change is in `_effects`)"""
+    todo = [tree]
+    while todo:
+        node = todo.pop()
+        yield node
+        if node is tree or not isinstance(
+            node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)
+        ):
+            todo.extend(ast.iter_child_nodes(node))
+
+
+def _mutated(tree: ast.AST) -> set[str]:
+    """Names changed in place: `x[0] = ..`, `x.a = ..`, `x.append(..)`,
+    or passed to a (non-builtin) call that may change them"""
+    mutated = set()
+    for node in _walk_scope(tree):
+        match node:
+            case ast.Attribute(ctx=ast.Store() | ast.Del()) | ast.Subscript(
+                ctx=ast.Store() | ast.Del()
+            ):
+                mutated.add(_root(node))
+            case ast.Call(func=func, args=args, keywords=keywords):
+                if isinstance(func, ast.Attribute):  # a method call
+                    mutated.add(_root(func.value))
+                name = func.id if isinstance(func, ast.Name) else None
+                if name not in _BUILTINS or name in _MUTATING_BUILTINS:
+                    values = [*args, *(k.value for k in keywords)]
+                    mutated |= {_root(v) for v in values}
+    return mutated - {None}
+
+
+def _effects(function: ast.FunctionDef | ast.AsyncFunctionDef) -> set[str]:
+    """Outer names a function changes when it is called"""
+    params = {a.arg for a in ast.walk(function.args) if isinstance(a, ast.arg)}
+    declared = {
+        name
+        for node in ast.walk(function)
+        if isinstance(node, (ast.Global, ast.Nonlocal))
+        for name in node.names
+    }
+    return declared | (_mutated(function) - params)
+
+
+def _names(source: str) -> tuple[set[str], set[str], bool, dict[str, set[str]]]:
+    """(defined, used) names of a cell, whether it is opaque (star imports,
+    magics and shell commands may define or install anything), and the outer
+    names changed by the functions it defines. Names changed in place count
+    as defined: the cell's state depends on the cell changing them."""
+    code = TransformerManager().transform_cell(source)
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return set(), set(), False, {}
+    defined, star, effects = set(), "get_ipython()" in code, {}
+    used = {  # including the free names of nested functions
+        node.id
+        for node in ast.walk(tree)
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)
+    } | {
+        _root(node.target) for node in ast.walk(tree) if isinstance(node, ast.AugAssign)
+    }
+    for node in _walk_scope(tree):
+        match node:
+            case ast.Name(id=name, ctx=ast.Store() | ast.Del()):
+                defined.add(name)
+            case ast.FunctionDef(name=name) | ast.AsyncFunctionDef(name=name):
+                defined.add(name)
+                effects[name] = _effects(node)
+            case ast.ClassDef(name=name):
+                defined.add(name)
+            case ast.Import(names=aliases) | ast.ImportFrom(names=aliases):
+                for alias in aliases:
+                    if alias.name == "*":
+                        star = True
+                    else:
+                        defined.add((alias.asname or alias.name).split(".")[0])
+    defined |= _mutated(tree)
+    return defined, used - _BUILTINS - {None}, star, effects
+
+
+def dependencies(sources: list[str]) -> list[set[int]]:
+    """Direct dependencies of every cell (indices into `sources`)"""
+    latest: dict[str, int] = {}  # name -> last cell defining (or changing) it
+    effects: dict[str, set[str]] = {}  # function -> outer names it changes
+    barriers: set[int] = set()  # opaque cells
+    deps = []
+    for i, source in enumerate(sources):
+        defined, used, star, functions = _names(source)
+        changed = {name for n in used for name in effects.get(n, ())}  # by calls
+        used |= changed
+        deps.append({latest[n] for n in used if n in latest} | barriers)
+        effects |= functions
+        defined |= changed
+        latest |= {name: i for name in defined}
+        if star:
+            barriers.add(i)
+    return deps
+
+
+def _closure(deps: list[set[int]], i: int) -> list[int]:
+    todo, seen = [i], set()
+    while todo:
+        for dep in deps[todo.pop()] - seen:
+            seen.add(dep)
+            todo.append(dep)
+    return sorted(seen)
+
+
+def validation_key(sources: list[str], closure: list[int], i: int) -> str:
+    """Hash of the cell and the (ordered) cells it depends on"""
+    raw = "\x00".join(sources[j] for j in [*closure, i])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def to_outputs(result: ExecutionResult, execution_count: int) -> list:
+    """nbformat outputs of an execution"""
+    outputs = []
+    for name in ("stdout", "stderr"):
+        if text := getattr(result, name):
+            outputs.append(nbf.v4.new_output("stream", name=name, text=text))
+    if result.result:
+        outputs.append(
+            nbf.v4.new_output(
+                "execute_result",
+                data={"text/plain": result.result},
+                execution_count=execution_count,
+            )
+        )
+    if result.error:
+        ename, _, evalue = result.error.partition(": ")
+        outputs.append(
+            nbf.v4.new_output(
+                "error", ename=ename, evalue=evalue, traceback=result.traceback
+            )
+        )
+    return outputs
+
+
+def _groups(run_sets: list[set[int]]) -> list[list[int]]:
+    """Merge overlapping run sets (they share kernel state)"""
+    groups: list[set[int]] = []
+    for run_set in run_sets:
+        overlapping = [g for g in groups if g & run_set]
+        for g in overlapping:
+            groups.remove(g)
+            run_set = run_set | g
+        groups.append(run_set)
+    return [sorted(g) for g in groups]
+
+
+def _run_group(
+    pool: KernelPool, cells: list, positions: list[int], group: list[int], timeout
+) -> dict[int, ExecutionResult]:
+    lease = f"validate:{uuid.uuid4()}"
+    results = {}
+    try:
+        for i in group:
+            results[i] = pool.execute(lease, cells[positions[i]].source, timeout)
+    finally:
+        pool.release(lease)  # reset and back to the warm pool
+    return results
+
+
+def validate_cells(
+    cells: list[nbf.NotebookNode],
+    pool: Optional[KernelPool] = None,
+    max_workers: int = 3,
+    timeout: float = CELL_TIMEOUT,
+) -> list[CellReport]:
+    """Run (only) the code cells whose memo key changed, store their outputs
+    and keys on the cells, and report every code cell."""
+    positions = [n for n, cell in enumerate(cells) if cell.cell_type == "code"]
+    sources = [cells[n].source for n in positions]
+    deps = dependencies(sources)
+    closures = [_closure(deps, i) for i in range(len(sources))]
+    keys = [validation_key(sources, closures[i], i) for i in range(len(sources))]
+
+    # -1- Memoized cells are skipped
+    stale = [
+        i
+        for i, key in enumerate(keys)
+        if cells[positions[i]].get("metadata", {}).get("pacer", {}).get("key") != key
+    ]
+    groups = _groups([{*closures[i], i} for i in stale])
+
+    # -2- Independent groups in parallel, each in its own kernel
+    results: dict[int, ExecutionResult] = {}
+    if groups:
+        pool = pool or get_kernel_pool()
+        with ThreadPoolExecutor(max_workers, thread_name_prefix="validate") as ex:
+            for group_results in ex.map(
+                lambda g: _run_group(pool, cells, positions, g, timeout), groups
+            ):
+                results |= group_results
+
+    # -3- Store outputs and keys on the cells
+    reports = []
+    for i, key in enumerate(keys):
+        cell = cells[positions[i]]
+        if i in results:
+            result = results[i]
+            cell["outputs"] = to_outputs(result, execution_count=i + 1)
+            cell["execution_count"] = i + 1
+            meta = cell.setdefault("metadata", {}).setdefault("pacer", {})
+            meta.update(key=key, ok=result.ok)
+        meta = cell.get("metadata", {}).get("pacer", {})
+        error = next(
+            (
+                f"{o.get('ename')}: {o.get('evalue')}"
+                for o in cell.get("outputs", [])
+                if o.get("output_type") == "error"
+            ),
+            "",
+        )
+        reports.append(
+            CellReport(
+                index=positions[i],
+                ok=bool(meta.get("ok")),
+                cached=i not in results,
+                error=error,
+            )
+        )
+    return reports
@@ -0,0 +1,211 @@
+"""Bounded capture of cell output and its incremental ANSI -> HTML rendering
+`OutputBuffer` keeps the first `head` and the last `limit - head` characters
+of the output (a ring of chunks), so a cell printing a million lines costs
+at most `limit` characters. `AnsiHtmlRenderer` converts every chunk once,
+as it arrives, and caches the HTML of the whole buffer per buffer version.
+`LiveOutput` shows a running cell: only the tail, at most every `interval`.
+
+Example usage:
+    >>> buffer, renderer = OutputBuffer(limit=1000), AnsiHtmlRenderer()
+    >>> buffer.write("\\x1b[31merror\\x1b[0m\\n")
+    >>> renderer.render(buffer)
+    '<pre ...><span style="color: red;">error</span>\\n</pre>'
+"""
+
+import html
+import itertools
+import re
+import time
+from collections import deque
+from typing import Callable
+
+OUTPUT_LIMIT = 1_000_000  # characters kept per stream
+HEAD_FRACTION = 0.2  # of the limit, kept from the start of the output
+LIVE_INTERVAL = 0.2  # seconds between updates of a running cell's output
+LIVE_TAIL = 20_000  # characters shown while the cell runs
+
+_PRE = '<pre style="font-family: monospace; white-space: pre-wrap;">{}</pre>'
+
+ANSI_SGR = re.compile(r"\x1B\[([0-9;]*)m")
+ANSI_ESCAPE = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
+_PARTIAL_ESCAPE = re.compile(r"\x1B(?:\[[0-?]*[ -/]*)?$")
+
+# ANSI color mappings
+ANSI_COLORS = {
+    "30": "black",
+    "31": "red",
+    "32": "green",
+    "33": "yellow",
+    "34": "blue",
+    "35": "purple",
+    "36": "cyan",
+    "37": "white",
+    "90": "gray",
+    "91": "#ff5555",  # bright red
+    "92": "#55ff55",  # bright green
+    "93": "#ffff55",  # bright yellow
+    "94": "#5555ff",  # bright blue
+    "95": "#ff55ff",  # bright purple
+    "96": "#55ffff",  # bright cyan
+    "97": "#ffffff",  # bright white
+}
+
+
+class OutputBuffer:
+    def __init__(self, limit: int = OUTPUT_LIMIT, head: int = None):
+        self.limit = limit
+        self.head_limit = int(limit * HEAD_FRACTION) if head is None else head
+        self.tail_limit = limit - self.head_limit
+        self.head: list[tuple[int, str]] = []  # (seq, chunk)
+        self.tail: deque[tuple[int, str]] = deque()
+        self.head_size = self.tail_size = 0
+        self.dropped = 0  # characters between head and tail
+        self.version = 0
+        self._seq = itertools.count()
+
+    def write(self, text: str) -> None:
+        if not text:
+            return
+        self.version += 1
+        if room := self.head_limit - self.head_size:
+            self.head.append((next(self._seq), text[:room]))
+            self.head_size += len(text[:room])
+            text = text[room:]
+        if len(text) > self.tail_limit:  # chunks are only ever dropped whole
+            self.dropped += len(text) - self.tail_limit
+            text = text[len(text) - self.tail_limit :]
+        if not text:
+            return
+        self.tail.append((next(self._seq), text))
+        self.tail_size += len(text)
+        while self.tail_size > self.tail_limit:
+            _, chunk = self.tail.popleft()
+            self.tail_size -= len(chunk)
+            self.dropped += len(chunk)
+
+    def chunks(self) -> list[tuple[int, str]]:
+        return [*self.head, *self.tail]
+
+    def marker(self) -> str:
+        return f"\n... [{self.dropped:,} characters truncated] ...\n"
+
+    def text(self) -> str:
+        head = "".join(chunk for _, chunk in self.head)
+        tail = "".join(chunk for _, chunk in self.tail)
+        return head + (self.marker() if self.dropped else "") + tail
+
+    def __len__(self) -> int:
+        return self.head_size + self.tail_size
+
+
+class AnsiHtmlRenderer:
+    """Renders one `OutputBuffer` (the style carries over between chunks)"""
+
+    def __init__(self):
+        self.style = ""
+        self._pending = ""  # escape sequence split between chunks
+        self._html: dict[int, str] = {}  # seq -> HTML of the chunk
+        self._cache: tuple[int, str] = (-1, "")
+
+    def _apply(self, codes: str) -> None:
+        for code in codes.split(";"):
+            if code in ("", "0"):
+                self.style = ""
+            elif code in ANSI_COLORS:
+                self.style += f"color: {ANSI_COLORS[code]};"
+            elif code == "1":
+                self.style += "font-weight: bold;"
+
+    def _span(self, text: str) -> str:
+        text = html.escape(ANSI_ESCAPE.sub("", text))
+        if not text:
+            return ""
+        return f'<span style="{self.style}">{text}</span>' if self.style else text
+
+    def feed(self, text: str) -> str:
+        """HTML of the next chunk"""
+        text, self._pending = self._pending + text, ""
+        if partial := _PARTIAL_ESCAPE.search(text):
+            text, self._pending = text[: partial.start()], partial.group()
+        parts, position = [], 0
+        for match in ANSI_SGR.finditer(text):
+            parts.append(self._span(text[position : match.start()]))
+            self._apply(match.group(1))
+            position = match.end()
+        parts.append(self._span(text[position:]))
+        return "".join(parts)
+
+    def _convert(self, chunks: list[tuple[int, str]]) -> None:
+        """Convert the chunks not seen yet, forget the dropped ones"""
+        for seq, chunk in chunks:
+            if seq not in self._html:
+                self._html[seq] = self.feed(chunk)
+        alive = {seq for seq, _ in chunks}
+        self._html = {seq: h for seq, h in self._html.items() if seq in alive}
+
+    def render(self, buffer: OutputBuffer) -> str:
+        """HTML of the whole buffer, converting only the chunks not seen yet"""
+        if self._cache[0] == buffer.version:
+            return self._cache[1]
+        self._convert(buffer.chunks())
+        head = "".join(self._html[seq] for seq, _ in buffer.head)
+        tail = "".join(self._html[seq] for seq, _ in buffer.tail)
+        marker = html.escape(buffer.marker()) if buffer.dropped else ""
+        rendered = _PRE.format(f"{head}{marker}{tail}")
+        self._cache = (buffer.version, rendered)
+        return rendered
+
+    def render_tail(self, buffer: OutputBuffer, chars: int = LIVE_TAIL) -> str:
+        """HTML of about the last `chars` characters of the buffer"""
+        chunks = buffer.chunks()
+        self._convert(chunks)
+        parts, room = [], chars
+        for seq, chunk in reversed(chunks):
+            if room <= 0:
+                break
+            if len(chunk) > room:  # only its end (unstyled)
+                parts.append(html.escape(ANSI_ESCAPE.sub("", chunk[-room:])))
+            else:
+                parts.append(self._html[seq])
+            room -= len(chunk)
+        hidden = "...\n" if len(buffer) > chars else ""
+        return _PRE.format(hidden + "".join(reversed(parts)))
+
+
+class LiveOutput:
+    """Output of a running cell, passed to `update` as HTML (the tail only, at
+    most every `interval` seconds), `html()` renders all of it at the end"""
+
+    def __init__(
+        self,
+        update: Callable[[str], None],
+        interval: float = LIVE_INTERVAL,
+        tail: int = LIVE_TAIL,
+        limit: int = OUTPUT_LIMIT,
+    ):
+        self.update = update
+        self.interval = interval
+        self.tail = tail
+        self.buffer, self.renderer = OutputBuffer(limit), AnsiHtmlRenderer()
+        self._shown, self._version = float("-inf"), 0
+
+    def write(self, text: str) -> None:
+        self.buffer.write(text)
+        if time.monotonic() - self._shown >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Show the writes held back by the throttle (e.g. once the cell ended)"""
+        if self._version != self.buffer.version:
+            self.update(self.renderer.render_tail(self.buffer, self.tail))
+            self._shown, self._version = time.monotonic(), self.buffer.version
+
+    def html(self) -> str:
+        return self.renderer.render(self.buffer)
+
+
+def ansi_to_html(text: str) -> str:
+    """Convert ANSI color codes to HTML with inline styles."""
+    buffer = OutputBuffer(limit=max(len(text), 1))
+    buffer.write(text)
+    return AnsiHtmlRenderer().render(buffer)
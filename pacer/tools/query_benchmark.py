@@ -0,0 +1,126 @@
+"""Query count and latency of the project-scoped service calls
+Fills a scratch database with `projects` projects of `files` files each
+(metadata only, payloads are in the blob store) and runs every call against
+it: the first (cold) run, and the median of `repeat` more.
+
+Example usage:
+    $ pacer-cli bench-queries --projects 1000 --files 100
+"""
+
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+from uuid import uuid4
+
+from sqlalchemy import event, insert
+
+from pacer.orm import base
+from pacer.orm.file_orm import File, FileStatus, FileType
+from pacer.orm.note_orm import Note
+from pacer.orm.project_orm import Project
+
+
+def _populate(Session, projects: int, files: int) -> list[str]:
+    names = [f"project-{n:05}" for n in range(projects)]
+    ids = [str(uuid4()) for _ in names]
+    with Session() as session:
+        session.execute(
+            insert(Project), [dict(id=i, name=n, data={}) for i, n in zip(ids, names)]
+        )
+        for p, project_id in enumerate(ids):
+            session.execute(
+                insert(File),
+                [
+                    dict(
+                        id=str(uuid4()),
+                        project_id=project_id,
+                        type=FileType.TEXT,
+                        filepath=f"docs/{n:05}.txt",
+                        size=1024,
+                        content_hash=f"{p:032x}{n:032x}",
+                        status=FileStatus.CREATED,
+                        data={},
+                    )
+                    for n in range(files)
+                ],
+            )
+            session.execute(
+                insert(Note), [dict(project_id=project_id, content="a note")]
+            )
+        session.commit()
+    return names
+
+
+@contextmanager
+def _count_queries(engine):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+
+def _measure(engine, fn: Callable[[], object]) -> tuple[int, float]:
+    with _count_queries(engine) as statements:
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+    return len(statements), elapsed * 1000
+
+
+def run(projects: int = 1000, files: int = 100, repeat: int = 5) -> list[dict]:
+    """One row per service call: queries and latency (ms), cold (the project id
+    not cached yet) and warm"""
+    from pacer import services
+
+    with tempfile.TemporaryDirectory() as tmp:
+        Session = base.make_session(Path(tmp) / "bench.db")
+        engine = Session.kw["bind"]
+        start = time.perf_counter()
+        names = _populate(Session, projects, files)
+        print(
+            f"{projects:,} projects, {projects * files:,} files "
+            f"(populated in {time.perf_counter() - start:.1f}s)"
+        )
+
+        name = names[len(names) // 2]
+        doomed = iter(reversed(names))
+        calls = {
+            "list_projects": lambda: services.list_projects(),
+            "list_files": lambda: services.list_files(name),
+            "list_files (page of 50)": lambda: services.list_files(name, 0, 50),
+            "count_files": lambda: services.count_files(name),
+            "get_notes": lambda: services.get_notes(name),
+            "get_messages": lambda: services.get_messages(name),
+            "get_quiz": lambda: services.get_quiz(name),
+            "add_note": lambda: services.add_note("another note", name),
+            "delete_project": lambda: services.delete_project(next(doomed)),
+        }
+
+        saved, services.SessionLocal = services.SessionLocal, Session
+        rows = []
+        try:
+            for call, fn in calls.items():
+                cold_queries, cold = _measure(engine, fn)
+                warm = [_measure(engine, fn) for _ in range(repeat)]
+                rows.append(
+                    dict(
+                        call=call,
+                        cold_queries=cold_queries,
+                        cold_ms=f"{cold:.2f}",
+                        queries=warm[-1][0],
+                        median_ms=f"{statistics.median(ms for _, ms in warm):.2f}",
+                    )
+                )
+        finally:
+            services.SessionLocal = saved
+            engine.dispose()
+        return rows
@@ -1,10 +1,11 @@
 import base64
+import hashlib
 import logging
 import subprocess
 import tempfile
 import urllib
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 
 import dotenv
 from langchain.chains.summarize import load_summarize_chain
@@ -29,12 +30,16 @@ from langchain_community.document_loaders import (
     WikipediaLoader,
 )
 from langchain_core.documents.base import Document
+from langchain_core.messages import AIMessageChunk
+from langchain_core.utils.json import parse_partial_json
 from langchain_core.vectorstores import VectorStore
 
 # from pacer.config import consts
 from pacer.config import consts
+from pacer.llms import usage
 from pacer.llms.llm_adapter import LLMSwitch
-from pacer.models.code_cell_model import JupyterCells
+from pacer.llms.routing import TaskClass
+from pacer.models.code_cell_model import Cell, JupyterCells, NotebookOutline
 
 assert dotenv.load_dotenv(consts.ENV)
 
@@ -47,6 +52,7 @@ def read_wikipedia(subject: str, load_max_docs: int = 1) -> list[Document]:
     return ret
 
 
+@usage.track
 def ask_wiki(
     subject: str, question: str, llm=None, load_max_docs: int = 1
 ) -> list[Document]:
@@ -168,38 +174,59 @@ def insert_docs_non_persistant(
     return db
 
 
+def chunk_ids(docs: list[Document]) -> list[str]:
+    """Deterministic ids: the source and the chunk's index in it (or the hash
+    of the text, for documents without a source)"""
+    ids, counts = [], {}
+    for doc in docs:
+        source = doc.metadata.get("source")
+        if source is None:
+            ids.append(hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest())
+            continue
+        counts[source] = n = counts.get(source, -1) + 1
+        ids.append(f"{source}:{n}")
+    return ids
+
+
 def insert_docs(
     docs: list[Document],
     embedding_function=None,
     sub_dir: str = None,
     vectorsore: VectorStore = Chroma,
+    ids: list[str] = None,
 ) -> VectorStore:
-    """Inserting previously split documents into a persistant Vector DB"""
+    """Inserting previously split documents into a persistant Vector DB
+    (documents whose ids, see `chunk_ids`, are stored already are skipped)"""
     embedding_function = embedding_function or consts.DEFAULT_EMBEDDING
 
     persist_directory = consts.ROOT_DIR / f".chroma_persist"
     if sub_dir:
         persist_directory /= sub_dir
 
+    by_id = dict(zip(ids or chunk_ids(docs), docs))  # also drops repeated chunks
     if persist_directory.exists():
         db = vectorsore(
             embedding_function=embedding_function,
             persist_directory=str(persist_directory),
         )
 
-        existing_docs = db.get().get("documents", {})  # TODO: may not be generic enough
-        new_docs = [doc for doc in docs if doc.page_content not in existing_docs]
-        if new_docs:
-            db.add_documents(new_docs)
+        existing = set(db.get(ids=list(by_id), include=[])["ids"]) if by_id else ()
+        new_ids = [id_ for id_ in by_id if id_ not in existing]
+        if new_ids:
+            db.add_documents([by_id[id_] for id_ in new_ids], ids=new_ids)
 
         return db
     db = vectorsore.from_documents(
-        docs, embedding_function, persist_directory=str(persist_directory)
+        list(by_id.values()),
+        embedding_function,
+        ids=list(by_id),
+        persist_directory=str(persist_directory),
     )
 
     return db
 
 
+@usage.track
 def create_summary(split_docs: list[Document], chain_type="refine", llm=None) -> str:
     """Create a summary based on split documents
     See: https://python.langchain.com/docs/tutorials/summarization/
@@ -208,7 +235,7 @@ def create_summary(split_docs: list[Document], chain_type="refine", llm=None) ->
         >>> ss = split_documents(pages)
         >>> print(create_summary(ss))
     """
-    llm = llm or LLMSwitch.get_current()
+    llm = llm or LLMSwitch.get_current(task=TaskClass.AUXILIARY)
     if len(split_docs) == 1:
         doc = split_docs[0].page_content
         try:
@@ -231,6 +258,7 @@ def create_summary(split_docs: list[Document], chain_type="refine", llm=None) ->
     return ret["output_text"]
 
 
+@usage.track
 def get_multi_query(question, db, llm=None) -> list[Document]:
     """Creating langchain MultiQuery
         More info here: https://arxiv.org/abs/2305.13245
@@ -246,7 +274,7 @@ def get_multi_query(question, db, llm=None) -> list[Document]:
     logger.setLevel(logging.INFO)
     # -- -- --
 
-    llm = llm or LLMSwitch.get_current()
+    llm = llm or LLMSwitch.get_current(task=TaskClass.AUXILIARY)
     retriever_from_llm = MultiQueryRetriever.from_llm(
         retriever=db.as_retriever(), llm=llm
     )
@@ -254,9 +282,10 @@ def get_multi_query(question, db, llm=None) -> list[Document]:
     return docs
 
 
+@usage.track
 def compress_and_ask(question: str, db, llm=None) -> list[Document]:
     """See: https://python.langchain.com/docs/how_to/contextual_compression/"""
-    llm = llm or LLMSwitch.get_current()
+    llm = llm or LLMSwitch.get_current(task=TaskClass.AUXILIARY)
 
     # --1-- Compress docs
 
@@ -283,18 +312,38 @@ Base the Notebook on the following context from multiple documents:
 )
 
 
-def create_jupyter_cells(
-    db, llm=None, prompt_template: Optional[ChatPromptTemplate] = None
-) -> JupyterCells:
-    prompt = prompt_template or _code_cell_prompt
-
-    if isinstance(prompt, str):
-        prompt = ChatPromptTemplate.from_template(prompt)
+DIGEST_CHUNKS = 30  # chunks of a project digest (at least one per source)
+
+
+def project_digest(db, n_chunks: int = DIGEST_CHUNKS) -> list[Document]:
+    """Chunks sampled evenly across every source of the project, and evenly
+    within each source (so a large project is covered from start to end)"""
+    # --1-- Chunk ids by source (without loading the texts)
+    stored = db.get(include=["metadatas"])
+    by_source: dict[str, list[str]] = {}
+    for id_, metadata in zip(stored["ids"], stored["metadatas"]):
+        by_source.setdefault((metadata or {}).get("source", ""), []).append(id_)
+
+    # --2-- Evenly spaced chunks of every source
+    per_source = max(1, n_chunks // max(1, len(by_source)))
+    ids = []
+    for source_ids in by_source.values():
+        n = min(per_source, len(source_ids))
+        ids += [source_ids[i * len(source_ids) // n] for i in range(n)]
+    if not ids:
+        return []
+    picked = db.get(ids=ids, include=["documents", "metadatas"])
+    docs = {
+        id_: Document(page_content=text, metadata=metadata or {})
+        for id_, text, metadata in zip(
+            picked["ids"], picked["documents"], picked["metadatas"]
+        )
+    }
+    return [docs[id_] for id_ in ids if id_ in docs]
 
-    llm = llm or LLMSwitch.get_current()
 
-    retriever = db.as_retriever(search_kwargs={"k": 30})
-    context_docs = retriever.invoke("")
+def _notebook_context(db) -> str:
+    context_docs = project_digest(db)
     context = "\n----\n".join(doc.page_content for doc in context_docs)
     context = context.replace("\n\n", "\n")
     context = "\n".join(ln for ln in context.splitlines() if len(ln) > 2)
@@ -302,14 +351,160 @@ def create_jupyter_cells(
         len(context) > 128_000
     ):  # TODO: find a better way to determine context limit of LLM
         context = create_summary(context_docs)
+    return context
+
+
+@usage.track
+def create_jupyter_cells(
+    db, llm=None, prompt_template: Optional[ChatPromptTemplate] = None
+) -> JupyterCells:
+    prompt = prompt_template or _code_cell_prompt
 
+    if isinstance(prompt, str):
+        prompt = ChatPromptTemplate.from_template(prompt)
+
+    llm = llm or LLMSwitch.get_current()
+
+    context = _notebook_context(db)
     chain = prompt | llm.with_structured_output(JupyterCells, method="function_calling")
-    # import IPython
-    # IPython.embed(colosr="Neutral")
     result = chain.invoke({"context": context})
     return result
 
 
+def _partial_tool_args(message) -> dict:
+    """Arguments of the first tool call, parsed from the chunks received so far"""
+    if isinstance(message, AIMessageChunk):
+        chunks = message.tool_call_chunks
+        return (chunks and parse_partial_json(chunks[0]["args"] or "")) or {}
+    return message.tool_calls[0]["args"] if message.tool_calls else {}
+
+
+@usage.track
+def stream_jupyter_cells(
+    db, llm=None, prompt_template: Optional[ChatPromptTemplate] = None
+) -> Iterator[Cell]:
+    """Like `create_jupyter_cells`, but yields every cell as soon as it is complete
+    Example usage:
+        >>> for cell in stream_jupyter_cells(db):
+        ...     handler.add_cell(cell)
+    """
+    prompt = prompt_template or _code_cell_prompt
+
+    if isinstance(prompt, str):
+        prompt = ChatPromptTemplate.from_template(prompt)
+
+    llm = llm or LLMSwitch.get_current()
+
+    context = _notebook_context(db)
+    chain = prompt | llm.bind_tools([JupyterCells], tool_choice=JupyterCells.__name__)
+    done = 0
+    cells = []
+    message = None
+    for chunk in chain.stream({"context": context}):
+        message = chunk if message is None else message + chunk
+        cells = _partial_tool_args(message).get("cells") or []
+        # A cell is complete once the next one has started
+        for raw in cells[done : len(cells) - 1]:
+            yield Cell.model_validate(raw)
+        done = max(done, len(cells) - 1)
+    for raw in cells[done:]:
+        yield Cell.model_validate(raw)
+
+
+NOTEBOOK_SECTIONS = 8  # max sections of an outline
+SECTION_K = 8  # chunks retrieved per section
+SECTION_CONCURRENCY = 4
+
+_outline_prompt = ChatPromptTemplate.from_template(
+    """
+Outline a Jupyter Notebook that can help practice coding.
+Split the subjects of the following project digest into at most {n} sections,
+ordered so that every section builds on the previous ones.
+Project digest:
+{digest}
+"""
+)
+
+_section_prompt = ChatPromptTemplate.from_template(
+    """
+Create the cells of one section of a Jupyter Notebook that can help practice coding.
+Start with a Markdown cell titled "{title}".
+Utilize Markdown Cells to explain the code instead of relying on code comments.
+Add theory and linked sources to the markdown cells.
+The section covers: {description}
+Do not repeat the other sections of the Notebook:
+{outline}
+Base the section on the following context from multiple documents:
+{context}
+"""
+)
+
+
+@usage.track
+def create_notebook_outline(
+    db, llm=None, max_sections: int = NOTEBOOK_SECTIONS
+) -> NotebookOutline:
+    llm = llm or LLMSwitch.get_current()
+    chain = _outline_prompt | llm.with_structured_output(
+        NotebookOutline, method="function_calling"
+    )
+    outline = chain.invoke({"digest": _notebook_context(db), "n": max_sections})
+    outline.sections = outline.sections[:max_sections]
+    return outline
+
+
+@usage.track
+def stream_sectioned_cells(
+    db,
+    llm=None,
+    outline: Optional[NotebookOutline] = None,
+    max_concurrency: int = SECTION_CONCURRENCY,
+    section_k: int = SECTION_K,
+) -> Iterator[Cell]:
+    """Outline-first notebook: every section is generated concurrently from its
+    own retrieval, and the sections' cells are yielded in outline order
+    (as soon as a section and all sections before it are done).
+    Example usage:
+        >>> cells = list(stream_sectioned_cells(db))
+    """
+    llm = llm or LLMSwitch.get_current()
+
+    # --1-- Outline from a digest of the whole project
+    outline = outline or create_notebook_outline(db, llm=llm)
+    titles = "\n".join(f"{n}. {s.title}" for n, s in enumerate(outline.sections, 1))
+
+    # --2-- Section-specific retrieval
+    retriever = db.as_retriever(search_kwargs={"k": section_k})
+    inputs = [
+        {
+            "title": section.title,
+            "description": section.description,
+            "outline": titles,
+            "context": "\n----\n".join(
+                doc.page_content for doc in retriever.invoke(section.query)
+            ),
+        }
+        for section in outline.sections
+    ]
+
+    # --3-- Sections concurrently, stitched in order
+    chain = _section_prompt | llm.with_structured_output(
+        JupyterCells, method="function_calling"
+    )
+    done: dict[int, list[Cell]] = {}
+    next_section = 0
+    for i, result in chain.batch_as_completed(
+        inputs, config={"max_concurrency": max_concurrency}, return_exceptions=True
+    ):
+        if isinstance(result, Exception):
+            print(f"[notebook] section {outline.sections[i].title!r} failed: {result}")
+            result = JupyterCells(cells=[])
+        done[i] = result.cells
+        while next_section in done:
+            yield from done.pop(next_section)
+            next_section += 1
+
+
 _update_code_cell_prompt = ChatPromptTemplate.from_template(
     """
 You are tasked with adding cells to following Jupyter Notebook:
@@ -324,14 +519,17 @@ The Notebook is based on the following context from multiple documents:
 )
 
 
+def update_prompt(user_message: str, notebook_cells: JupyterCells):
+    assert isinstance(user_message, str), f"{type(user_message)}\n{dir(user_message)}"
+    notebook_cells.model_dump_json(include=["type", "content"], indent=2)
+    return _update_code_cell_prompt.partial(cells=notebook_cells, changes=user_message)
+
+
+@usage.track
 def update_jupyter_cells(
     db, user_message: str, notebook_cells: JupyterCells, llm=None, *args, **kwargs
 ) -> JupyterCells:
-    assert isinstance(user_message, str), f"{type(user_message)}\n{dir(user_message)}"
-    notebook_cells.model_dump_json(include=["type", "content"], indent=2)
-    prompt = _update_code_cell_prompt.partial(
-        cells=notebook_cells, changes=user_message
-    )
+    prompt = update_prompt(user_message, notebook_cells)
 
     return create_jupyter_cells(db=db, llm=llm, prompt_template=prompt, *args, **kwargs)
 
@@ -343,6 +541,9 @@ Please provide a clear and concise response to the following query based on the
 
 Query: {query}
 
+Summary of the earlier conversation:
+{summary}
+
 Conversation History:
 {history}
 
@@ -352,12 +553,16 @@ Context:
 )
 
 
+@usage.track
 def context_chat(
     db,
     messages: list = None,
     llm=None,
     prompt_template: Optional[ChatPromptTemplate] = None,
+    summary: str = "",
 ):
+    """Answer the last of `messages`; `summary` folds the turns before them
+    (see `pacer.tools.chat_history`)"""
     prompt = prompt_template or _context_message_prompt
     llm = llm or LLMSwitch.get_current()
 
@@ -371,11 +576,55 @@ def context_chat(
         context = create_summary(context_docs)
 
     chain = prompt | llm
-    *history, query = [m.content for m in messages]
-    result = chain.invoke({"context": context, "query": query, "history": history})
+    *history, query = messages
+    result = chain.invoke(
+        {
+            "context": context,
+            "query": query.content,
+            "summary": summary or "(none)",
+            "history": transcript(history),
+        }
+    )
     return result
 
 
+def transcript(messages: list) -> str:
+    return "\n".join(f"{m.type}: {m.content}" for m in messages)
+
+
+_fold_chat_prompt = ChatPromptTemplate.from_template(
+    """
+Below is the summary of a conversation so far, followed by its next messages.
+Rewrite the summary so it also covers the new messages. Keep the facts, questions
+and conclusions a later answer may need, drop pleasantries, and stay under
+{max_words} words.
+
+Summary so far:
+{summary}
+
+New messages:
+{messages}
+"""
+)
+
+
+@usage.track
+def fold_chat_summary(
+    summary: str, messages: list, llm=None, max_words: int = 250
+) -> str:
+    """The rolling `summary` of a chat, extended with `messages`"""
+    llm = llm or LLMSwitch.get_current(task=TaskClass.AUXILIARY)
+    chain = _fold_chat_prompt | llm
+    result = chain.invoke(
+        {
+            "summary": summary or "(none)",
+            "messages": transcript(messages),
+            "max_words": max_words,
+        }
+    )
+    return result.content
+
+
 if __name__ == "__main__":
     import IPython
 